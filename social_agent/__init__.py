@@ -1,4 +1,16 @@
 # Social Agent — gestione e pubblicazione contenuti sui social media
-from .agent import SocialAgent
+from .settings import load_settings
+
+load_settings()
 
 __all__ = ["SocialAgent"]
+
+
+def __getattr__(name: str):
+    # Imported on first use: SocialAgent pulls in the Anthropic SDK, which a
+    # publish-only script (MetaClient) never needs
+    if name == "SocialAgent":
+        from .agent import SocialAgent
+
+        return SocialAgent
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,21 +1,68 @@
 import json
 import os
-from typing import Any, Optional
-
-import anthropic
-from dotenv import load_dotenv
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from types import SimpleNamespace
+from typing import TYPE_CHECKING, Any, Optional
 
+from .approval_queue import ApprovalQueue, get_approval_queue, resolve_approval_mode
+from .artifact_store import get_artifact_store
+from .clients import get_anthropic_client
+from .coded_pipeline import MAX_PIPELINE_STEPS, CodedPipeline, PipelineStep, resolve_pipeline_mode
+from .compaction import compact_history, estimate_tokens
+from .job_store import JobStore, get_job_store
+from .llm import cached_system, cached_tools, create_message, with_conversation_breakpoint
 from .meta_client import MetaClient
-from .models import ContentReview, Platform, PostDraft, SpielbiergReview, VideoConcept, VideoGenerationResult
+from .models import (
+    ContentReview,
+    Platform,
+    PostDraft,
+    PublishResult,
+    RecentPost,
+    SpielbiergReview,
+    VideoConcept,
+    VideoGenerationResult,
+)
 from .prompts import SYSTEM_PROMPT
-from .smcc_agent import SMCCAgent
-from .spielbierg_agent import SpielbiergAgent
-from .vc_agent import VCAgent
-from .video_generator_agent import VideoGeneratorAgent
+from .speculative import SpeculativeVideoRunner
+from .tracing import run_in_context, set_attributes, span
+from .usage import PostAccount, PostBudget, get_usage_ledger, post_scope, resolve_budget, tool_scope
+from .video_generator_agent import RUNWAY_CLIP_SECONDS, VideoGeneratorAgent
 
-load_dotenv()
+if TYPE_CHECKING:
+    import anthropic
 
 MAX_LOOP_ITERATIONS = 20
+MAX_PARALLEL_TOOLS = 4
+# Default estimated input tokens above which completed post cycles are compacted
+COMPACTION_THRESHOLD_TOKENS = 30000
+
+# Tools that never run alongside other calls of the same turn. Approval blocks on
+# the terminal and publishes are side effects on the live pages; the video pipeline
+# tools read the concept/URL written by the previous step, so their order matters too.
+_EXCLUSIVE_TOOLS = frozenset({
+    "generate_video_with_runway",
+    "review_video_with_spielbierg",
+    "review_with_smcc",
+    "request_approval",
+    "publish_instagram_post",
+    "publish_facebook_post",
+})
+_PUBLISH_TOOLS = frozenset({"publish_instagram_post", "publish_facebook_post"})
+
+
+def resolve_pipelined_review(enabled: Optional[bool] = None) -> bool:
+    """Explicit value, then SOCIAL_AGENT_PIPELINED_REVIEW (on/off), then off."""
+    if enabled is not None:
+        return enabled
+    return (os.getenv("SOCIAL_AGENT_PIPELINED_REVIEW") or "off").lower() in ("on", "1", "true")
+
+
+def resolve_compaction_threshold(tokens: Optional[int] = None) -> int:
+    """Explicit value, then SOCIAL_AGENT_COMPACTION_TOKENS, then COMPACTION_THRESHOLD_TOKENS."""
+    if tokens is not None:
+        return tokens
+    return int(os.getenv("SOCIAL_AGENT_COMPACTION_TOKENS") or COMPACTION_THRESHOLD_TOKENS)
 
 
 class ApprovalDeniedError(Exception):
@@ -26,6 +73,14 @@ class ApprovalDeniedError(Exception):
         self.feedback = feedback
 
 
+class ApprovalPendingError(Exception):
+    """Raised in queue mode when a draft was submitted for review: the job is parked until a decision."""
+
+    def __init__(self, approval_id: str):
+        super().__init__(approval_id)
+        self.approval_id = approval_id
+
+
 # ── Tool definitions (JSON schema for Claude) ──────────────────────────────────
 
 TOOLS: list[dict] = [
@@ -73,6 +128,15 @@ TOOLS: list[dict] = [
                     "type": "string",
                     "description": "Testo della bozza del post per cui creare il video.",
                 },
+                "hashtags": {
+                    "type": "array",
+                    "items": {"type": "string"},
+                    "description": (
+                        "Hashtag della bozza (senza #), gli stessi da passare poi a review_with_smcc: "
+                        "permettono di avviare la revisione SMCC mentre Runway genera il video."
+                    ),
+                    "default": [],
+                },
                 "content_theme": {
                     "type": "string",
                     "description": (
@@ -244,48 +308,121 @@ TOOLS: list[dict] = [
 ]
 
 
+_CACHED_SYSTEM = cached_system(SYSTEM_PROMPT)
+_CACHED_TOOLS = cached_tools(TOOLS)
+
+
+def _plan_tool_groups(tool_uses: list) -> list[list]:
+    """
+    Split the tool_use blocks of one turn into groups that run one after another.
+    Consecutive independent tools share a group (run concurrently); every
+    exclusive tool gets a group of its own, keeping the order Claude asked for.
+    """
+    groups: list[list] = []
+    for block in tool_uses:
+        if block.name in _EXCLUSIVE_TOOLS or not groups or groups[-1][0].name in _EXCLUSIVE_TOOLS:
+            groups.append([block])
+        else:
+            groups[-1].append(block)
+    return groups
+
+
 class SocialAgent:
-    def __init__(self):
-        self.client = anthropic.Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY", ""))
-        self.meta = MetaClient()
+    def __init__(
+        self,
+        concurrent_tools: bool = False,
+        client: Optional["anthropic.Anthropic"] = None,
+        meta: Optional[MetaClient] = None,
+        video_candidates: int = 1,
+        jobs: Optional[JobStore] = None,
+        approval_mode: Optional[str] = None,
+        approvals: Optional[ApprovalQueue] = None,
+        budget: Optional[PostBudget] = None,
+        pipeline_mode: Optional[str] = None,
+        pipelined_review: Optional[bool] = None,
+        compaction_threshold: Optional[int] = None,
+    ):
+        self.concurrent_tools = concurrent_tools
+        # > 1 enables speculative best-of-N Runway generation with Spielbierg selection
+        self.video_candidates = video_candidates
+        self.turn_timings: list[dict] = []
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self.client = client or get_anthropic_client()
+        self.meta = meta or MetaClient()
+        # Checkpoints of this run (None when SOCIAL_AGENT_JOB_STORE=off)
+        self.jobs = jobs if jobs is not None else get_job_store()
+        self.job_id: Optional[str] = None
+        self._replay: dict[str, dict] = {}
+        # "terminal" asks on stdin; "queue" submits drafts and parks the job (see approval_queue)
+        self.approval_mode = resolve_approval_mode(approval_mode)
+        self.approvals = approvals or (get_approval_queue() if self.approval_mode == "queue" else None)
+        self.awaiting_approval: Optional[str] = None
+        # Token/cost accounting of this post (see usage); opened with the job
+        self.budget = budget or resolve_budget()
+        self.usage: Optional[PostAccount] = None
+        # "agentic": the orchestrator picks every tool; "coded": fixed order (see coded_pipeline)
+        self.pipeline_mode = resolve_pipeline_mode(pipeline_mode)
+        self._pipeline = CodedPipeline()
+        # Start the SMCC text review with the concept, while Runway renders (see _start_smcc_prefetch)
+        self.pipelined_review = resolve_pipelined_review(pipelined_review)
+        self._smcc_prefetch: Optional[tuple[tuple, Future]] = None
+        # Estimated input tokens past which completed post cycles are folded (see compaction)
+        self.compaction_threshold = resolve_compaction_threshold(compaction_threshold)
+        self._video_prompt_notes: Optional[str] = None
         self._approved_draft: Optional[PostDraft] = None
         self._current_video_concept: Optional[VideoConcept] = None
         self._current_video_url: Optional[str] = None
+        self._current_video_path: Optional[str] = None
+        # The artifact-store path this agent holds pinned (see _hold_video)
+        self._held_video_path: Optional[str] = None
         self._current_review: Optional[ContentReview] = None
         self._current_spielbierg_review: Optional[SpielbiergReview] = None
         self._spielbierg_attempts: int = 0
+        self._current_caption: Optional[str] = None
+        self._current_hashtags: list[str] = []
+        self._reviewed_video_url: Optional[str] = None
+        self._pending_runway_task: Optional[str] = None
+        # (task_id, prompt) of the best-of-N candidates in flight, for the same reason
+        self._pending_speculative_tasks: list[tuple[str, str]] = []
 
     # ── Tool handlers ──────────────────────────────────────────────────────────
 
     def _handle_get_recent_posts(self, platforms: list[str], limit: int = 5) -> str:
-        results: list[dict] = []
-        for p in platforms:
-            if p == "instagram":
-                posts = self.meta.instagram_get_recent_posts(limit=limit)
-            else:
-                posts = self.meta.facebook_get_recent_posts(limit=limit)
-            for post in posts:
-                results.append(post.model_dump())
-        if not results:
+        # One batched Graph API request for every platform that needs a sync
+        posts = self.meta.get_recent_posts(platforms, limit=limit)
+        return self._recent_posts_payload(posts)
+
+    @staticmethod
+    def _recent_posts_payload(posts: list[RecentPost]) -> str:
+        if not posts:
             return json.dumps({"posts": [], "note": "Nessun post recente trovato (o errore API)."})
-        return json.dumps({"posts": results})
+        return json.dumps({"posts": [post.model_dump() for post in posts]})
 
     def _handle_create_video_concept_with_vc(
         self,
         platform: str,
         caption: str,
         content_theme: str,
+        hashtags: Optional[list[str]] = None,
     ) -> str:
+        self._discard_smcc_prefetch()
         try:
             print("\n  [VC] Generazione concept video CGI in corso...")
-            agent = VCAgent()
+            from .vc_agent import VCAgent
+
+            agent = VCAgent(client=self.client)
             concept = agent.create_concept(
                 platform=platform,
                 caption=caption,
                 content_theme=content_theme,
             )
             self._current_video_concept = concept
+            self._current_caption = caption
+            self._current_hashtags = hashtags or []
+            self._video_prompt_notes = None
             print(f"  [VC] Concept '{concept.title}' generato ({concept.total_duration_seconds}s).")
+            if self.pipelined_review:
+                self._start_smcc_prefetch(platform, caption, hashtags or [])
             return json.dumps({
                 "status": "ok",
                 "title": concept.title,
@@ -311,13 +448,79 @@ class SocialAgent:
     ) -> str:
         if self._current_video_concept is None:
             return json.dumps({"status": "skipped", "reason": "Nessun video concept disponibile."})
+        blocked = self._runway_budget_payload()
+        if blocked:
+            return blocked
+        self._video_prompt_notes = additional_prompt_notes or None
+        if self.video_candidates > 1:
+            return self._generate_speculative(platform, additional_prompt_notes)
         result = VideoGeneratorAgent().generate(
             self._current_video_concept,
             platform,
             additional_notes=additional_prompt_notes,
+            task_id=self._pending_runway_task,
+            on_task_created=self._checkpoint_runway_task,
+        )
+        return self._video_result_payload(result)
+
+    def _runway_budget_payload(self) -> Optional[str]:
+        """Skipped-generation result when a new Runway task would break the post budget."""
+        if self._pending_runway_task or self._pending_speculative_tasks or self.usage is None:
+            return None     # re-attaching to a task already paid for
+        reason = self.usage.runway_blocked(RUNWAY_CLIP_SECONDS * self.video_candidates)
+        if reason is None:
+            return None
+        print(f"  [Budget] Generazione Runway saltata: {reason}")
+        return json.dumps({
+            "status": "skipped",
+            "reason": f"Budget: {reason}.",
+            "note": (
+                "Non rigenerare: prosegui con il video attuale."
+                if self._current_video_url else
+                "Continua il flusso senza video (graceful degradation)."
+            ),
+        })
+
+    def _generate_speculative(self, platform: str, additional_prompt_notes: Optional[str]) -> str:
+        """Best-of-N generation: the returned video has already been reviewed by Spielbierg."""
+        from .spielbierg_agent import SpielbiergAgent
+
+        runner = SpeculativeVideoRunner(
+            candidates=self.video_candidates,
+            reviewer=SpielbiergAgent(client=self.client),
+        )
+        outcome = runner.run(
+            self._current_video_concept,
+            platform,
+            caption=self._current_caption or "",
+            hashtags=self._current_hashtags,
+            additional_notes=additional_prompt_notes,
+            tasks=self._pending_speculative_tasks,
+            on_tasks_created=self._checkpoint_speculative_tasks,
         )
+        payload = json.loads(self._video_result_payload(outcome.result))
+        if outcome.review is not None:
+            self._spielbierg_attempts += 1
+            self._current_spielbierg_review = outcome.review
+            self._reviewed_video_url = outcome.result.video_url
+            payload["speculative"] = {
+                "candidates_submitted": outcome.candidates_submitted,
+                "candidates_reviewed": outcome.candidates_reviewed,
+                "cancelled": outcome.cancelled,
+                "note": (
+                    "Miglior candidato già selezionato da Spielbierg: "
+                    "review_video_with_spielbierg restituirà subito la sua revisione."
+                ),
+            }
+        return json.dumps(payload)
+
+    def _video_result_payload(self, result: VideoGenerationResult) -> str:
+        self._pending_runway_task = None
+        self._pending_speculative_tasks = []
         if result.status == "succeeded":
             self._current_video_url = result.video_url
+            self._current_video_path = result.local_path
+            self._hold_video(result.local_path)
             return json.dumps({
                 "status": "succeeded",
                 "video_url": result.video_url,
@@ -327,6 +530,8 @@ class SocialAgent:
             })
         else:
             self._current_video_url = None
+            self._current_video_path = None
+            self._hold_video(None)
             return json.dumps({
                 "status": "failed",
                 "error": result.error,
@@ -341,16 +546,24 @@ class SocialAgent:
         if not self._current_video_url:
             return json.dumps({"status": "skipped", "reason": "Nessun video URL disponibile."})
 
-        self._spielbierg_attempts += 1
-        print(f"\n  [Spielbierg] Analisi video (tentativo {self._spielbierg_attempts}/3)...")
+        if self._current_spielbierg_review and self._reviewed_video_url == self._current_video_url:
+            # Already reviewed while selecting the speculative candidate
+            review = self._current_spielbierg_review
+        else:
+            self._spielbierg_attempts += 1
+            print(f"\n  [Spielbierg] Analisi video (tentativo {self._spielbierg_attempts}/3)...")
+            # Imported here: Spielbierg brings in OpenCV and NumPy for frame extraction
+            from .spielbierg_agent import SpielbiergAgent
 
-        review = SpielbiergAgent().review_video(
-            video_url=self._current_video_url,
-            concept=self._current_video_concept,
-            caption=caption,
-            hashtags=hashtags or [],
-        )
-        self._current_spielbierg_review = review
+            review = SpielbiergAgent(client=self.client).review_video(
+                video_url=self._current_video_url,
+                concept=self._current_video_concept,
+                caption=caption,
+                hashtags=hashtags or [],
+                local_path=self._current_video_path,
+            )
+            self._current_spielbierg_review = review
+            self._reviewed_video_url = self._current_video_url
 
         status = "approved" if review.approved else "rejected"
         print(
@@ -388,38 +601,17 @@ class SocialAgent:
         hashtags: Optional[list[str]] = None,
     ) -> str:
         try:
-            print("\n  [SMCC] Revisione contenuto in corso...")
-            agent = SMCCAgent()
-
-            # Build a text summary of the video concept if available
-            video_concept_text: Optional[str] = None
-            if self._current_video_concept:
-                vc = self._current_video_concept
-                scenes_text = "\n".join(
-                    f"  Scena {s.scene_number} ({s.duration_seconds}s): {s.description} "
-                    f"[camera: {s.camera_movement}]"
-                    + (f" — Dettagli: {s.visual_details}" if s.visual_details else "")
-                    for s in vc.scenes
-                )
-                video_concept_text = (
-                    f"Titolo: {vc.title}\n"
-                    f"Formato: {vc.platform_format}\n"
-                    f"Stile: {vc.visual_style}\n"
-                    f"Hook: {vc.hook_description}\n"
-                    f"Scene:\n{scenes_text}\n"
-                    f"Musica: {vc.music_mood}\n"
-                    f"Palette: {', '.join(vc.color_palette)}\n"
-                    f"Cinematografia: {vc.cinematography_notes}"
-                )
-                if self._current_video_url:
-                    video_concept_text += f"\nVideo URL (Runway): {self._current_video_url}"
+            review = self._prefetched_smcc_review(platform, caption, hashtags or [])
+            if review is None:
+                print("\n  [SMCC] Revisione contenuto in corso...")
+                from .smcc_agent import SMCCAgent
 
-            review = agent.review(
-                platform=platform,
-                caption=caption,
-                hashtags=hashtags or [],
-                video_concept=video_concept_text,
-            )
+                review = SMCCAgent(client=self.client).review(
+                    platform=platform,
+                    caption=caption,
+                    hashtags=hashtags or [],
+                    video_concept=self._video_concept_text(with_video_url=True),
+                )
             self._current_review = review
             print(f"  [SMCC] Revisione completata. Score engagement: {review.engagement_score}/10.")
             return json.dumps({
@@ -437,6 +629,126 @@ class SocialAgent:
             print(f"  [SMCC] Errore: {error_msg}")
             return json.dumps({"error": error_msg})
 
+    def _video_concept_text(self, with_video_url: bool) -> Optional[str]:
+        """Text summary of the current video concept for SMCC (None without a concept)."""
+        if self._current_video_concept is None:
+            return None
+        vc = self._current_video_concept
+        scenes_text = "\n".join(
+            f"  Scena {s.scene_number} ({s.duration_seconds}s): {s.description} "
+            f"[camera: {s.camera_movement}]"
+            + (f" — Dettagli: {s.visual_details}" if s.visual_details else "")
+            for s in vc.scenes
+        )
+        text = (
+            f"Titolo: {vc.title}\n"
+            f"Formato: {vc.platform_format}\n"
+            f"Stile: {vc.visual_style}\n"
+            f"Hook: {vc.hook_description}\n"
+            f"Scene:\n{scenes_text}\n"
+            f"Musica: {vc.music_mood}\n"
+            f"Palette: {', '.join(vc.color_palette)}\n"
+            f"Cinematografia: {vc.cinematography_notes}"
+        )
+        if with_video_url and self._current_video_url:
+            text += f"\nVideo URL (Runway): {self._current_video_url}"
+        return text
+
+    # ── Pipelined SMCC review ──────────────────────────────────────────────────
+
+    @staticmethod
+    def _smcc_key(platform: str, caption: str, hashtags: list[str]) -> tuple:
+        return platform, caption.strip(), tuple(tag.lstrip("#") for tag in hashtags)
+
+    def _start_smcc_prefetch(self, platform: str, caption: str, hashtags: list[str]) -> None:
+        """
+        Start the SMCC review on caption + concept text in the background. Tone and
+        hashtags don't depend on the rendered video, so this runs alongside Runway
+        and the Spielbierg loop instead of after them.
+        """
+        from .smcc_agent import SMCCAgent
+
+        concept_text = self._video_concept_text(with_video_url=False)
+
+        def review() -> ContentReview:
+            with span("smcc.prefetch", platform=platform), tool_scope("review_with_smcc"):
+                return SMCCAgent(client=self.client).review(
+                    platform=platform, caption=caption, hashtags=hashtags, video_concept=concept_text,
+                )
+
+        print("  [SMCC] Revisione del testo avviata in parallelo al video")
+        future = self._background_executor().submit(run_in_context(review))
+        self._smcc_prefetch = (self._smcc_key(platform, caption, hashtags), future)
+
+    def _prefetched_smcc_review(self, platform: str, caption: str, hashtags: list[str]) -> Optional[ContentReview]:
+        """
+        The background review if it was made on this same draft, followed by a short
+        alignment pass when the final video departs from the concept; None otherwise.
+        """
+        prefetch, self._smcc_prefetch = self._smcc_prefetch, None
+        if prefetch is None:
+            return None
+        key, future = prefetch
+        if key != self._smcc_key(platform, caption, hashtags):
+            future.cancel()
+            print("  [SMCC] Bozza cambiata dopo il concept: revisione anticipata scartata")
+            return None
+        start = time.perf_counter()
+        try:
+            review = future.result()
+        except Exception as exc:
+            print(f"  [SMCC] Revisione anticipata fallita ({exc}), nuova revisione")
+            return None
+        print(f"  [SMCC] Revisione anticipata pronta (attesa {time.perf_counter() - start:.1f}s)")
+
+        changes = self._video_changes()
+        if changes is None:
+            return review
+        print("\n  [SMCC] Il video finale differisce dal concept: allineamento della revisione...")
+        from .smcc_agent import SMCCAgent
+
+        return SMCCAgent(client=self.client).align_with_video(platform, review, changes)
+
+    def _video_changes(self) -> Optional[str]:
+        """How the final video departs from the concept the background review saw, or None."""
+        if not self._current_video_url:
+            return "Nessun video: il post verrà pubblicato senza il video descritto nel concept."
+        changes: list[str] = []
+        if self._video_prompt_notes:
+            changes.append(f"Video rigenerato con queste correzioni al prompt: {self._video_prompt_notes}")
+        sp = self._current_spielbierg_review
+        if sp is not None and not sp.approved:
+            issues = "; ".join(sp.issues) or "nessun dettaglio"
+            changes.append(f"Video finale non approvato da Spielbierg ({sp.verdict}). Problemi: {issues}")
+        return "\n".join(changes) or None
+
+    def _discard_smcc_prefetch(self) -> None:
+        if self._smcc_prefetch is not None:
+            self._smcc_prefetch[1].cancel()
+            self._smcc_prefetch = None
+
+    def _background_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=MAX_PARALLEL_TOOLS, thread_name_prefix="social-tool")
+        return self._executor
+
+    def close(self) -> None:
+        """Stop the background threads; queued work is cancelled. Called at the end of every run."""
+        self._discard_smcc_prefetch()
+        self._hold_video(None)
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def _hold_video(self, path: Optional[str]) -> None:
+        """
+        Take over the pin of a freshly stored video (None: nothing) and release the
+        previous one: the current video stays in the artifact store until the post
+        is published, the video is regenerated or the run ends.
+        """
+        get_artifact_store().release(self._held_video_path)
+        self._held_video_path = path
+
     def _handle_request_approval(
         self,
         platform: str,
@@ -444,82 +756,107 @@ class SocialAgent:
         hashtags: Optional[list[str]] = None,
         image_url: Optional[str] = None,
     ) -> str:
-        hashtags = hashtags or []
         draft = PostDraft(
             caption=caption,
-            hashtags=hashtags,
+            hashtags=hashtags or [],
             platform=Platform(platform),
             image_url=image_url,
         )
+        if self.approval_mode == "queue":
+            return self._queued_approval(draft)
+
+        print(self._render_draft(draft))
+
+        while True:
+            answer = input("\nApprovi questo post? [Y/n/feedback]: ").strip()
+            if answer.lower() in ("y", "yes", "s", "si", "sì", ""):
+                self._approved_draft = draft
+                return json.dumps({"status": "approved", "platform": platform})
+            elif answer.lower() in ("n", "no"):
+                feedback = input("Inserisci il tuo feedback per migliorare il post: ").strip()
+                if not feedback:
+                    feedback = "Post rifiutato senza feedback specifico."
+                raise ApprovalDeniedError(feedback)
+            else:
+                # The user typed feedback directly
+                raise ApprovalDeniedError(answer)
 
+    def _queued_approval(self, draft: PostDraft) -> str:
+        """
+        Queue mode: pick up the reviewer's decision if it has arrived, otherwise
+        submit the draft and park the job (ApprovalPendingError ends the run).
+        """
+        if self.job_id is None:
+            raise RuntimeError("Approvazione in coda senza job store (SOCIAL_AGENT_JOB_STORE=off).")
+        decision = self.approvals.take_decision(self.job_id)
+        if decision is None:
+            approval_id = self.approvals.submit(self.job_id, draft, self._render_draft(draft))
+            raise ApprovalPendingError(approval_id)
+        if decision.status == "approved":
+            print(f"  [Approvazione] Bozza {decision.id} approvata dal revisore")
+            self._approved_draft = decision.draft
+            return json.dumps({"status": "approved", "platform": decision.draft.platform.value})
+        print(f"  [Approvazione] Bozza {decision.id} rifiutata dal revisore")
+        raise ApprovalDeniedError(decision.feedback or "Post rifiutato senza feedback specifico.")
+
+    def _render_draft(self, draft: PostDraft) -> str:
+        """The draft as shown to the reviewer: post text, Spielbierg/SMCC notes, video concept."""
+        lines: list[str] = []
         separator = "─" * 60
         review = self._current_review
         vc = self._current_video_concept
 
         # ── Header ──────────────────────────────────────────────────────────────
-        print(f"\n{separator}")
+        lines.append(f"\n{separator}")
         score_str = f" · score engagement: {review.engagement_score}/10" if review else ""
         smcc_str = " (revisionata da SMCC" + score_str + ")" if review else ""
-        print(f"  BOZZA POST — {platform.upper()}{smcc_str}")
-        print(separator)
-        print(draft.full_text)
-        if image_url:
-            print(f"\n  Immagine: {image_url}")
+        lines.append(f"  BOZZA POST — {draft.platform.value.upper()}{smcc_str}")
+        lines.append(separator)
+        lines.append(draft.full_text)
+        if draft.image_url:
+            lines.append(f"\n  Immagine: {draft.image_url}")
         if self._current_video_url:
-            print(f"\n  VIDEO URL (Runway): {self._current_video_url}")
+            lines.append(f"\n  VIDEO URL (Runway): {self._current_video_url}")
 
         # ── Spielbierg verdict (compact) ─────────────────────────────────────
         sp = self._current_spielbierg_review
         if sp and sp.realism_score > 0:
             sp_status = "APPROVED" if sp.approved else "REJECTED"
-            print(
+            lines.append(
                 f"\n  Spielbierg: {sp_status} — "
                 f"Realism {sp.realism_score}/10 · Adherence {sp.adherence_score}/10 "
                 f"(tentativi: {self._spielbierg_attempts})"
             )
-            print(f"  Verdetto: {sp.verdict}")
+            lines.append(f"  Verdetto: {sp.verdict}")
 
         # ── SMCC notes (compact) ─────────────────────────────────────────────
         if review and review.changes_summary:
-            print(f"\n  Modifiche SMCC:")
+            lines.append(f"\n  Modifiche SMCC:")
             for change in review.changes_summary:
-                print(f"    • {change}")
+                lines.append(f"    • {change}")
 
         # ── Video concept section ─────────────────────────────────────────────
         if vc:
-            print(f"\n{separator}")
-            print(f"  VIDEO CONCEPT (VC) — \"{vc.title}\"")
-            print(f"  Formato: {vc.platform_format}  ·  Stile: {vc.visual_style}")
-            print(f"\n  Hook (0-3s): {vc.hook_description}")
-            print(f"\n  Scene:")
+            lines.append(f"\n{separator}")
+            lines.append(f"  VIDEO CONCEPT (VC) — \"{vc.title}\"")
+            lines.append(f"  Formato: {vc.platform_format}  ·  Stile: {vc.visual_style}")
+            lines.append(f"\n  Hook (0-3s): {vc.hook_description}")
+            lines.append(f"\n  Scene:")
             for scene in vc.scenes:
                 overlay = f" | testo: {scene.text_overlay}" if scene.text_overlay else ""
                 cgi = f" | Dettagli: {scene.visual_details}" if scene.visual_details else ""
-                print(
+                lines.append(
                     f"    {scene.scene_number}. [{scene.duration_seconds}s] {scene.description}"
                     f"\n       Camera: {scene.camera_movement}{overlay}{cgi}"
                 )
-            print(f"\n  Musica: {vc.music_mood}")
-            print(f"  Palette: {', '.join(vc.color_palette)}")
-            print(f"  Cinematografia: {vc.cinematography_notes}")
+            lines.append(f"\n  Musica: {vc.music_mood}")
+            lines.append(f"  Palette: {', '.join(vc.color_palette)}")
+            lines.append(f"  Cinematografia: {vc.cinematography_notes}")
             if vc.production_notes:
-                print(f"  Note produzione: {vc.production_notes}")
+                lines.append(f"  Note produzione: {vc.production_notes}")
 
-        print(separator)
-
-        while True:
-            answer = input("\nApprovi questo post? [Y/n/feedback]: ").strip()
-            if answer.lower() in ("y", "yes", "s", "si", "sì", ""):
-                self._approved_draft = draft
-                return json.dumps({"status": "approved", "platform": platform})
-            elif answer.lower() in ("n", "no"):
-                feedback = input("Inserisci il tuo feedback per migliorare il post: ").strip()
-                if not feedback:
-                    feedback = "Post rifiutato senza feedback specifico."
-                raise ApprovalDeniedError(feedback)
-            else:
-                # The user typed feedback directly
-                raise ApprovalDeniedError(answer)
+        lines.append(separator)
+        return "\n".join(lines)
 
     def _handle_publish_instagram_post(
         self,
@@ -527,32 +864,38 @@ class SocialAgent:
         image_url: Optional[str] = None,
     ) -> str:
         if self._approved_draft is None:
-            return json.dumps({
-                "success": False,
-                "error": "Pubblicazione bloccata: nessuna bozza approvata. Usa prima request_approval.",
-            })
+            return self._publish_blocked_payload()
         result = self.meta.instagram_publish(caption=caption, image_url=image_url)
-        self._approved_draft = None
-        self._current_video_concept = None
-        self._current_video_url = None
-        self._current_review = None
-        self._current_spielbierg_review = None
-        self._spielbierg_attempts = 0
-        return json.dumps(result.model_dump())
+        return self._publish_payload(result)
 
     def _handle_publish_facebook_post(self, message: str) -> str:
         if self._approved_draft is None:
-            return json.dumps({
-                "success": False,
-                "error": "Pubblicazione bloccata: nessuna bozza approvata. Usa prima request_approval.",
-            })
+            return self._publish_blocked_payload()
         result = self.meta.facebook_publish(message=message)
+        return self._publish_payload(result)
+
+    @staticmethod
+    def _publish_blocked_payload() -> str:
+        return json.dumps({
+            "success": False,
+            "error": "Pubblicazione bloccata: nessuna bozza approvata. Usa prima request_approval.",
+        })
+
+    def _publish_payload(self, result: PublishResult) -> str:
+        """Serialize a publish result and reset the per-post state for the next post."""
         self._approved_draft = None
+        self._discard_smcc_prefetch()
+        self._video_prompt_notes = None
         self._current_video_concept = None
         self._current_video_url = None
+        self._current_video_path = None
+        self._hold_video(None)
         self._current_review = None
         self._current_spielbierg_review = None
         self._spielbierg_attempts = 0
+        self._current_caption = None
+        self._current_hashtags = []
+        self._reviewed_video_url = None
         return json.dumps(result.model_dump())
 
     # ── Dispatcher ─────────────────────────────────────────────────────────────
@@ -574,6 +917,7 @@ class SocialAgent:
                     platform=tool_input["platform"],
                     caption=tool_input["caption"],
                     content_theme=tool_input["content_theme"],
+                    hashtags=tool_input.get("hashtags"),
                 )
             elif tool_name == "generate_video_with_runway":
                 content = self._handle_generate_video_with_runway(
@@ -629,6 +973,69 @@ class SocialAgent:
                 "is_error": True,
             }
 
+    def _timed_dispatch(self, tool_block: Any) -> tuple[dict, float]:
+        start = time.perf_counter()
+        with span(f"tool.{tool_block.name}", tool=tool_block.name, tool_use_id=tool_block.id) as traced, \
+                tool_scope(tool_block.name):
+            result = self._replayed_result(tool_block)
+            replayed = result is not None
+            if result is None:
+                self._start_step(tool_block)
+                result = self._dispatch_tool(tool_block.name, tool_block.input)
+                self._finish_step(tool_block, result)
+            if traced is not None:
+                traced.set(replayed=replayed, is_error=result.get("is_error", False))
+        return result, time.perf_counter() - start
+
+    def _execute_tools(self, tool_uses: list) -> list[dict]:
+        """
+        Execute all tool_use blocks of a turn and return their tool_result blocks
+        in the same order as the tool_use blocks.
+        In concurrent mode independent tools run on a thread pool; the wall time
+        saved versus serial execution is printed and recorded in turn_timings.
+        """
+        results: dict[str, dict] = {}
+        durations: list[float] = []
+        turn_start = time.perf_counter()
+
+        groups = _plan_tool_groups(tool_uses) if self.concurrent_tools else [[b] for b in tool_uses]
+        for group in groups:
+            if len(group) == 1:
+                outcomes = [self._timed_dispatch(group[0])]
+            else:
+                # Worker threads inherit the turn's tracing span
+                outcomes = list(self._background_executor().map(run_in_context(self._timed_dispatch), group))
+            for tool_block, (result, elapsed) in zip(group, outcomes):
+                durations.append(elapsed)
+                results[tool_block.id] = self._tool_result_block(tool_block, result)
+
+        self._record_turn_timing(tool_uses, time.perf_counter() - turn_start, durations)
+        return [results[b.id] for b in tool_uses]
+
+    @staticmethod
+    def _tool_result_block(tool_block: Any, result: dict) -> dict:
+        return {
+            "type": "tool_result",
+            "tool_use_id": tool_block.id,
+            "content": result["content"],
+            "is_error": result.get("is_error", False),
+        }
+
+    def _record_turn_timing(self, tool_uses: list, wall: float, durations: list[float]) -> None:
+        serial = sum(durations)
+        saved = max(serial - wall, 0.0)
+        self.turn_timings.append({
+            "tools": [b.name for b in tool_uses],
+            "wall_seconds": round(wall, 3),
+            "serial_seconds": round(serial, 3),
+            "saved_seconds": round(saved, 3),
+        })
+        if self.concurrent_tools and len(tool_uses) > 1:
+            print(
+                f"\n  [Tools] {len(tool_uses)} tool in {wall:.1f}s "
+                f"(in serie: {serial:.1f}s, risparmiati {saved:.1f}s)"
+            )
+
     # ── Agentic loop ───────────────────────────────────────────────────────────
 
     def run(self, user_request: str) -> str:
@@ -636,50 +1043,292 @@ class SocialAgent:
         Run the social agent with the given user request.
         Returns the final text response from Claude.
         """
-        messages: list[dict] = [{"role": "user", "content": user_request}]
+        return self._run_loop(self._start_job(user_request))
+
+    def resume(self, job_id: str, force: bool = False) -> str:
+        """
+        Continue an interrupted job from its last checkpoint (see job_store).
+        force: take over a job that still looks live in another process.
+        """
+        return self._run_loop(self._load_job(job_id, force))
+
+    def _run_loop(self, messages: list[dict]) -> str:
+        with span("agent.run", job_id=self.job_id, approval_mode=self.approval_mode, pipeline=self.pipeline_mode), \
+                post_scope(self.usage):
+            try:
+                if self.pipeline_mode == "coded":
+                    result = self._run_coded(messages)
+                else:
+                    result = self._run_turns(messages)
+            except ApprovalPendingError as exc:
+                set_attributes(awaiting_approval=exc.approval_id)
+                result = self._park_job(exc.approval_id)
+            finally:
+                self.close()
+            set_attributes(cost_usd=round(self.usage.total.cost_usd, 4))
+        self.usage.print_summary()
+        return result
 
+    def _run_turns(self, messages: list[dict]) -> str:
         for iteration in range(MAX_LOOP_ITERATIONS):
-            response = self.client.messages.create(
-                model="claude-opus-4-6",
-                max_tokens=16000,
-                thinking={"type": "adaptive", "budget_tokens": 8000},
-                system=SYSTEM_PROMPT,
-                tools=TOOLS,
-                messages=messages,
+            with span("agent.turn", iteration=iteration):
+                pending = self._pending_tool_uses(messages)
+                if pending:
+                    # Resumed in the middle of a turn: finish its tool calls first
+                    set_attributes(resumed=True, tools=[b.name for b in pending])
+                    messages = self._complete_turn(messages, self._execute_tools(pending))
+                    continue
+
+                if self.usage.exhausted():
+                    return self._budget_stop()
+                response = create_message(self.client, "Orchestrator", **self._request_kwargs(messages))
+
+                text_parts, tool_uses = self._split_response(response)
+                set_attributes(stop_reason=response.stop_reason, tools=[b.name for b in tool_uses])
+
+                if response.stop_reason == "end_turn":
+                    return self._finish_job("\n".join(text_parts) if text_parts else "(nessuna risposta testuale)")
+
+                if response.stop_reason == "tool_use" and tool_uses:
+                    # Append Claude's full response (including thinking blocks) to messages
+                    messages.append({"role": "assistant", "content": response.content})
+                    self._checkpoint(messages)
+
+                    # Execute all tools and collect results (ordered by tool_use_id)
+                    tool_results = self._execute_tools(tool_uses)
+
+                    messages = self._complete_turn(messages, tool_results)
+                    continue
+
+                # Unexpected stop reason
+                break
+
+        return self._finish_job("Limite massimo di iterazioni raggiunto.", status="stopped")
+
+    def _run_coded(self, messages: list[dict]) -> str:
+        """The same 9 steps without the orchestrator: coded_pipeline picks each tool call."""
+        for iteration in range(MAX_PIPELINE_STEPS):
+            with span("agent.turn", iteration=iteration, pipeline="coded"):
+                pending = self._pending_tool_uses(messages)
+                if pending:
+                    set_attributes(resumed=True, tools=[b.name for b in pending])
+                    messages = self._complete_turn(messages, self._execute_tools(pending))
+                    continue
+
+                if self.usage.exhausted():
+                    return self._budget_stop()
+                step = self._next_coded_step(messages)
+                if step.kind == "done":
+                    return self._finish_job(step.text)
+                if step.kind == "llm":
+                    with tool_scope(step.label.lower()):     # accounted as "draft"/"revise", not orchestrator
+                        self._pipeline.apply(step, create_message(self.client, step.label, **step.request))
+                    self._checkpoint(messages)
+                    continue
+
+                messages.append({"role": "assistant", "content": [step.block]})
+                self._checkpoint(messages)
+                tool_results = self._execute_tools(self._pending_tool_uses(messages))
+                messages = self._complete_turn(messages, tool_results)
+
+        return self._finish_job("Limite massimo di step della pipeline raggiunto.", status="stopped")
+
+    def _next_coded_step(self, messages: list[dict]) -> PipelineStep:
+        step = self._pipeline.next_step(messages, self._approved_draft, self._spielbierg_attempts)
+        set_attributes(step=step.label or (step.block or {}).get("name") or step.kind)
+        return step
+
+    def _complete_turn(self, messages: list[dict], tool_results: list[dict]) -> list[dict]:
+        messages.append({"role": "user", "content": tool_results})
+        messages = self._compact(messages)
+        self._replay = {}
+        self._checkpoint(messages)
+        return messages
+
+    # ── Checkpointing ──────────────────────────────────────────────────────────
+
+    def _snapshot_state(self) -> dict[str, Any]:
+        """Per-post state as JSON, checkpointed alongside the conversation."""
+        def dump(model: Any) -> Optional[dict]:
+            return model.model_dump(mode="json") if model is not None else None
+
+        return {
+            "approved_draft": dump(self._approved_draft),
+            "video_concept": dump(self._current_video_concept),
+            "video_url": self._current_video_url,
+            "video_path": self._current_video_path,
+            "review": dump(self._current_review),
+            "spielbierg_review": dump(self._current_spielbierg_review),
+            "spielbierg_attempts": self._spielbierg_attempts,
+            "caption": self._current_caption,
+            "hashtags": self._current_hashtags,
+            "reviewed_video_url": self._reviewed_video_url,
+            "runway_task_id": self._pending_runway_task,
+            "speculative_tasks": self._pending_speculative_tasks,
+            "pipeline": self.pipeline_mode,
+            "plan": self._pipeline.plan,
+            "usage": self.usage.snapshot() if self.usage is not None else None,
+        }
+
+    def _restore_state(self, state: dict[str, Any]) -> None:
+        def load(model: Any, key: str) -> Any:
+            return model(**state[key]) if state.get(key) else None
+
+        self._approved_draft = load(PostDraft, "approved_draft")
+        self._current_video_concept = load(VideoConcept, "video_concept")
+        self._current_video_url = state.get("video_url")
+        self._current_video_path = state.get("video_path")
+        self._current_review = load(ContentReview, "review")
+        self._current_spielbierg_review = load(SpielbiergReview, "spielbierg_review")
+        self._spielbierg_attempts = state.get("spielbierg_attempts", 0)
+        self._current_caption = state.get("caption")
+        self._current_hashtags = state.get("hashtags") or []
+        self._reviewed_video_url = state.get("reviewed_video_url")
+        self._pending_runway_task = state.get("runway_task_id")
+        self._pending_speculative_tasks = [tuple(task) for task in state.get("speculative_tasks") or []]
+        # A job keeps the mode it started with: the two conversations are not interchangeable
+        self.pipeline_mode = state.get("pipeline", "agentic")
+        self._pipeline = CodedPipeline(state.get("plan"))
+
+    def _start_job(self, user_request: str) -> list[dict]:
+        messages: list[dict] = [{"role": "user", "content": user_request}]
+        if self.jobs is not None:
+            self.job_id = self.jobs.create(user_request, messages, self._snapshot_state())
+            print(f"  [Jobs] Job {self.job_id} avviato")
+        self.usage = get_usage_ledger().open_post(self.job_id, self.budget)
+        return messages
+
+    def _load_job(self, job_id: str, force: bool = False) -> list[dict]:
+        if self.jobs is None:
+            raise RuntimeError("Job store disattivato (SOCIAL_AGENT_JOB_STORE=off).")
+        # Refuses jobs that are finished or still live in another process
+        job = self.jobs.claim(job_id, force=force)
+        self.job_id = job_id
+        self._restore_state(job.state)
+        # The post's spend so far counts against its budget
+        self.usage = get_usage_ledger().open_post(job_id, self.budget, job.state.get("usage"))
+        self._replay = self.jobs.steps(job_id)
+        print(f"  [Jobs] Ripresa del job {job_id} ({len(job.messages)} messaggi)")
+        return job.messages
+
+    def _checkpoint(self, messages: list[dict]) -> None:
+        if self.job_id is not None:
+            self.jobs.checkpoint(self.job_id, messages, self._snapshot_state())
+
+    def _checkpoint_runway_task(self, task_id: str) -> None:
+        """Persist a new Runway task ID immediately, so a resumed run re-attaches instead of regenerating."""
+        self._pending_runway_task = task_id
+        if self.job_id is not None:
+            self.jobs.save_state(self.job_id, self._snapshot_state())
+
+    def _checkpoint_speculative_tasks(self, tasks: list[tuple[str, str]]) -> None:
+        """Persist the best-of-N Runway tasks as soon as they exist (see _checkpoint_runway_task)."""
+        self._pending_speculative_tasks = list(tasks)
+        if self.job_id is not None:
+            self.jobs.save_state(self.job_id, self._snapshot_state())
+
+    def _park_job(self, approval_id: str) -> str:
+        """Queue mode: stop here; the reviewer's decision resumes the job from this checkpoint."""
+        self.awaiting_approval = approval_id
+        self.jobs.set_status(self.job_id, "awaiting_approval")
+        print(f"  [Approvazione] Bozza {approval_id} in coda — job {self.job_id} in attesa della revisione")
+        return (
+            f"Bozza {approval_id} in attesa di approvazione: il job {self.job_id} riprenderà "
+            f"dopo la decisione (python -m social_agent.approve)."
+        )
+
+    def _budget_stop(self) -> str:
+        spent = f"${self.usage.total.cost_usd:.2f} su ${self.budget.max_cost_usd:.2f}"
+        print(f"  [Budget] Post {self.usage.post_id}: {spent} — esecuzione interrotta")
+        return self._finish_job(f"Esecuzione interrotta: budget del post superato ({spent}).", status="stopped")
+
+    def _finish_job(self, text: str, status: str = "done") -> str:
+        if self.job_id is not None:
+            self.jobs.finish(self.job_id, status, text)
+        return text
+
+    def _start_step(self, tool_block: Any) -> None:
+        if self.job_id is not None:
+            self.jobs.start_step(self.job_id, tool_block.id, tool_block.name)
+
+    def _finish_step(self, tool_block: Any, result: dict) -> None:
+        if self.job_id is not None:
+            self.jobs.finish_step(self.job_id, tool_block.id, result, self._snapshot_state())
+
+    @staticmethod
+    def _pending_tool_uses(messages: list[dict]) -> list:
+        """tool_use blocks of a checkpointed assistant turn whose results were never recorded."""
+        if not messages or messages[-1]["role"] != "assistant":
+            return []
+        content = messages[-1]["content"]
+        return [
+            SimpleNamespace(**block) if isinstance(block, dict) else block
+            for block in content
+            if (block.get("type") if isinstance(block, dict) else block.type) == "tool_use"
+        ]
+
+    def _replayed_result(self, tool_block: Any) -> Optional[dict]:
+        """
+        Result of a tool call that already ran before the job was interrupted.
+        A publish that started but never reported back may or may not have gone
+        out: Claude is asked to check instead of publishing a second time.
+        """
+        step = self._replay.get(tool_block.id)
+        if step is None:
+            return None
+        if step["status"] == "done":
+            print(f"  [Jobs] {tool_block.name}: risultato ripreso dal checkpoint")
+            return step["result"]
+        if tool_block.name in _PUBLISH_TOOLS:
+            return {
+                "type": "tool_result",
+                "content": json.dumps({
+                    "success": False,
+                    "status": "unknown",
+                    "error": (
+                        "Pubblicazione interrotta prima della risposta: il post potrebbe essere già online. "
+                        "Verifica con get_recent_posts prima di ripubblicare."
+                    ),
+                }),
+                "is_error": True,
+            }
+        return None
+
+    def _compact(self, messages: list[dict]) -> list[dict]:
+        """Keep the per-turn input roughly flat however many posts the run produces."""
+        compacted = compact_history(messages, self.compaction_threshold)
+        if compacted is not messages:
+            print(
+                f"\n  [Compaction] Cronologia compattata: "
+                f"~{estimate_tokens(messages)} → ~{estimate_tokens(compacted)} token"
             )
+        return compacted
+
+    def _request_kwargs(self, messages: list[dict]) -> dict:
+        """
+        Arguments of the orchestrator messages.create call for the current turn.
+        Cache breakpoints sit on the tool schemas, the system prompt and the end of
+        the conversation, so every turn only pays full price for the newest messages.
+        """
+        return {
+            "model": "claude-opus-4-6",
+            "max_tokens": 16000,
+            "thinking": {"type": "adaptive", "budget_tokens": 8000},
+            "system": _CACHED_SYSTEM,
+            "tools": _CACHED_TOOLS,
+            "messages": with_conversation_breakpoint(messages),
+        }
+
+    @staticmethod
+    def _split_response(response: Any) -> tuple[list[str], list]:
+        """Collect text from the response (may be mixed with thinking/tool_use blocks)."""
+        text_parts: list[str] = []
+        tool_uses: list = []
+
+        for block in response.content:
+            if block.type == "text":
+                text_parts.append(block.text)
+            elif block.type == "tool_use":
+                tool_uses.append(block)
 
-            # Collect text from the response (may be mixed with thinking/tool_use blocks)
-            text_parts: list[str] = []
-            tool_uses: list[dict] = []
-
-            for block in response.content:
-                if block.type == "text":
-                    text_parts.append(block.text)
-                elif block.type == "tool_use":
-                    tool_uses.append(block)
-
-            if response.stop_reason == "end_turn":
-                return "\n".join(text_parts) if text_parts else "(nessuna risposta testuale)"
-
-            if response.stop_reason == "tool_use" and tool_uses:
-                # Append Claude's full response (including thinking blocks) to messages
-                messages.append({"role": "assistant", "content": response.content})
-
-                # Execute all tools and collect results
-                tool_results: list[dict] = []
-                for tool_block in tool_uses:
-                    result = self._dispatch_tool(tool_block.name, tool_block.input)
-                    tool_results.append({
-                        "type": "tool_result",
-                        "tool_use_id": tool_block.id,
-                        "content": result["content"],
-                        "is_error": result.get("is_error", False),
-                    })
-
-                messages.append({"role": "user", "content": tool_results})
-                continue
-
-            # Unexpected stop reason
-            break
-
-        return "Limite massimo di iterazioni raggiunto."
+        return text_parts, tool_uses
@@ -0,0 +1,144 @@
+"""
+Asynchronous approval queue.
+
+With SOCIAL_AGENT_APPROVAL=queue (or approval_mode="queue"), request_approval
+no longer waits on input(): the draft is submitted here and the job is parked
+("awaiting_approval" in the job store) while the process moves on to other
+posts. A reviewer decides later, one draft at a time or many at once, with
+`python -m social_agent.approve`. Each decision resumes the job that
+submitted the draft, from its checkpoint: an approval goes on to publish, a
+rejection hands the feedback back to Claude for a new draft.
+
+Drafts live in a local SQLite file, one row per submission.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+from .models import PostDraft
+
+CACHE_DIR = Path(__file__).parent.parent / "cache"
+APPROVAL_MODES = ("terminal", "queue")
+
+
+@dataclass
+class ApprovalRequest:
+    id: str
+    job_id: str
+    draft: PostDraft
+    summary: str                    # the text the terminal approval would have shown
+    status: str                     # "pending" | "approved" | "rejected"
+    feedback: Optional[str]
+    created_at: float
+    decided_at: Optional[float]
+
+
+class ApprovalQueue:
+    def __init__(self, path: Path = CACHE_DIR / "approvals.sqlite3"):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # One connection shared by the worker threads, serialized by _lock
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS approvals ("
+            " id TEXT PRIMARY KEY, job_id TEXT NOT NULL, draft TEXT NOT NULL, summary TEXT NOT NULL,"
+            " status TEXT NOT NULL, feedback TEXT, consumed INTEGER NOT NULL DEFAULT 0,"
+            " created_at REAL NOT NULL, decided_at REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS approvals_job ON approvals (job_id, status)")
+
+    _COLUMNS = "id, job_id, draft, summary, status, feedback, created_at, decided_at"
+
+    @staticmethod
+    def _row(row: tuple) -> ApprovalRequest:
+        approval_id, job_id, draft, summary, status, feedback, created_at, decided_at = row
+        return ApprovalRequest(
+            approval_id, job_id, PostDraft(**json.loads(draft)), summary, status, feedback, created_at, decided_at
+        )
+
+    # ── Pipeline side ──────────────────────────────────────────────────────────
+
+    def submit(self, job_id: str, draft: PostDraft, summary: str) -> str:
+        """Queue a draft for review. A job re-submitting while still pending keeps its existing entry."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id FROM approvals WHERE job_id = ? AND status = 'pending'", (job_id,)
+            ).fetchone()
+            if row is not None:
+                return row[0]
+            approval_id = uuid.uuid4().hex[:8]
+            self._conn.execute(
+                "INSERT INTO approvals (id, job_id, draft, summary, status, created_at)"
+                " VALUES (?, ?, ?, ?, 'pending', ?)",
+                (approval_id, job_id, draft.model_dump_json(), summary, time.time()),
+            )
+        return approval_id
+
+    def take_decision(self, job_id: str) -> Optional[ApprovalRequest]:
+        """The job's decided, not yet consumed draft (marking it consumed), or None."""
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {self._COLUMNS} FROM approvals"
+                " WHERE job_id = ? AND status != 'pending' AND consumed = 0"
+                " ORDER BY decided_at LIMIT 1", (job_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute("UPDATE approvals SET consumed = 1 WHERE id = ?", (row[0],))
+        return self._row(row)
+
+    # ── Reviewer side ──────────────────────────────────────────────────────────
+
+    def pending(self) -> list[ApprovalRequest]:
+        """Drafts awaiting a decision, oldest first."""
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {self._COLUMNS} FROM approvals WHERE status = 'pending' ORDER BY created_at"
+            ).fetchall()
+        return [self._row(row) for row in rows]
+
+    def decide(self, approval_id: str, approved: bool, feedback: Optional[str] = None) -> bool:
+        """Record a decision; False if the draft does not exist or was already decided."""
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE approvals SET status = ?, feedback = ?, decided_at = ? WHERE id = ? AND status = 'pending'",
+                ("approved" if approved else "rejected", feedback, time.time(), approval_id),
+            )
+        return cursor.rowcount == 1
+
+    def decided_jobs(self) -> list[str]:
+        """Jobs with a decision waiting to be picked up, in decision order."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT job_id FROM approvals WHERE status != 'pending' AND consumed = 0 ORDER BY decided_at"
+            ).fetchall()
+        return list(dict.fromkeys(row[0] for row in rows))
+
+
+def resolve_approval_mode(mode: Optional[str] = None) -> str:
+    """Explicit value, then SOCIAL_AGENT_APPROVAL, then "terminal"."""
+    mode = (mode or os.getenv("SOCIAL_AGENT_APPROVAL") or "terminal").lower()
+    if mode not in APPROVAL_MODES:
+        raise ValueError(f"Modalità di approvazione sconosciuta: {mode}")
+    return mode
+
+
+_default_queue: Optional[ApprovalQueue] = None
+_default_lock = threading.Lock()
+
+
+def get_approval_queue() -> ApprovalQueue:
+    """The process-wide approval queue."""
+    global _default_queue
+    with _default_lock:
+        if _default_queue is None:
+            _default_queue = ApprovalQueue()
+        return _default_queue
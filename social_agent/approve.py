@@ -0,0 +1,127 @@
+"""
+Reviewer CLI for the approval queue (SOCIAL_AGENT_APPROVAL=queue).
+
+    python -m social_agent.approve                      # rivede le bozze in coda una per una
+    python -m social_agent.approve --list               # elenca le bozze in attesa
+    python -m social_agent.approve --all                # approva tutte le bozze in coda
+    python -m social_agent.approve --reject ID --feedback "..."
+    python -m social_agent.approve --watch 30           # riprende i job man mano che arrivano decisioni
+
+After the decisions, the jobs that submitted the drafts are resumed from their
+checkpoint (approved → publish, rejected → new draft with the feedback),
+unless --no-resume is given.
+"""
+import argparse
+import sys
+import time
+from typing import Optional
+
+from .agent import SocialAgent
+from .approval_queue import ApprovalQueue, get_approval_queue
+from .job_store import get_job_store
+
+
+def _print_pending(queue: ApprovalQueue) -> None:
+    pending = queue.pending()
+    if not pending:
+        print("Nessuna bozza in attesa di approvazione.")
+        return
+    for request in pending:
+        queued = time.strftime("%Y-%m-%d %H:%M", time.localtime(request.created_at))
+        caption = request.draft.caption.replace("\n", " ")[:60]
+        print(f"  {request.id}  {request.draft.platform.value:<9} job {request.job_id}  {queued}  {caption}")
+
+
+def review_interactively(queue: ApprovalQueue) -> int:
+    """One session over every queued draft: Y approves, n/feedback rejects, p skips, q stops."""
+    pending = queue.pending()
+    decided = 0
+    for index, request in enumerate(pending, start=1):
+        print(f"\n  [{index}/{len(pending)}] Bozza {request.id} — job {request.job_id}")
+        print(request.summary)
+        answer = input("\nApprovi questo post? [Y/n/feedback, p=passa, q=esci]: ").strip()
+        if answer.lower() == "q":
+            break
+        if answer.lower() == "p":
+            continue
+        if answer.lower() in ("y", "yes", "s", "si", "sì", ""):
+            queue.decide(request.id, approved=True)
+        else:
+            feedback = answer
+            if answer.lower() in ("n", "no"):
+                feedback = input("Inserisci il tuo feedback per migliorare il post: ").strip()
+            queue.decide(request.id, approved=False, feedback=feedback or "Post rifiutato senza feedback specifico.")
+        decided += 1
+    print(f"\n  [Approvazione] {decided} decisioni registrate")
+    return decided
+
+
+def resume_decided(queue: ApprovalQueue) -> int:
+    """Resume every job whose draft has been decided. Returns the number of jobs resumed."""
+    store = get_job_store()
+    if store is None:
+        print("Job store disattivato (SOCIAL_AGENT_JOB_STORE=off): impossibile riprendere i job.", file=sys.stderr)
+        return 0
+    job_ids = queue.decided_jobs()
+    for job_id in job_ids:
+        try:
+            result = SocialAgent(jobs=store, approval_mode="queue", approvals=queue).resume(job_id)
+        except (ValueError, RuntimeError) as exc:
+            print(f"  [Jobs] {exc}", file=sys.stderr)
+            continue
+        except Exception as exc:
+            # One broken job must not stop the others (or the --watch loop)
+            print(f"  [Jobs] {job_id}: ripresa fallita — {type(exc).__name__}: {exc}", file=sys.stderr)
+            continue
+        print(f"\n[{job_id}] {result}")
+    return len(job_ids)
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Revisione delle bozze social in coda di approvazione.")
+    parser.add_argument("--list", action="store_true", help="Elenca le bozze in attesa.")
+    parser.add_argument("--all", action="store_true", help="Approva tutte le bozze in coda.")
+    parser.add_argument("--approve", nargs="+", metavar="ID", default=[], help="Approva le bozze indicate.")
+    parser.add_argument("--reject", nargs="+", metavar="ID", default=[], help="Rifiuta le bozze indicate.")
+    parser.add_argument("--feedback", help="Feedback per le bozze rifiutate con --reject.")
+    parser.add_argument("--no-resume", action="store_true", help="Registra le decisioni senza riprendere i job.")
+    parser.add_argument("--watch", type=float, metavar="SECONDI",
+                        help="Resta in ascolto e riprende i job appena arriva una decisione.")
+    args = parser.parse_args(argv)
+
+    queue = get_approval_queue()
+    if args.list:
+        _print_pending(queue)
+        return 0
+
+    if args.watch:
+        print(f"  [Approvazione] In ascolto di nuove decisioni (ogni {args.watch:.0f}s, Ctrl+C per uscire)")
+        try:
+            while True:
+                try:
+                    resume_decided(queue)
+                except Exception as exc:
+                    print(f"  [Approvazione] Ciclo di ripresa fallito — {type(exc).__name__}: {exc}", file=sys.stderr)
+                time.sleep(args.watch)
+        except KeyboardInterrupt:
+            return 0
+
+    approve = [r.id for r in queue.pending()] if args.all else args.approve
+    if approve or args.reject:
+        for approval_id in approve:
+            if not queue.decide(approval_id, approved=True):
+                print(f"  [Approvazione] {approval_id}: bozza inesistente o già decisa", file=sys.stderr)
+        for approval_id in args.reject:
+            feedback = args.feedback or "Post rifiutato senza feedback specifico."
+            if not queue.decide(approval_id, approved=False, feedback=feedback):
+                print(f"  [Approvazione] {approval_id}: bozza inesistente o già decisa", file=sys.stderr)
+    else:
+        review_interactively(queue)
+
+    if not args.no_resume:
+        resume_decided(queue)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,216 @@
+"""
+Content-addressed local store for generated videos.
+
+Every Runway output is downloaded once into videos/, named by its SHA-256 and
+indexed in videos/manifest.json by content hash, Runway task ID and source URL.
+VideoGeneratorAgent and SpielbiergAgent both read from here, and the store
+evicts least-recently-used entries once its size cap is exceeded. Every path
+returned by get() / fetch() is pinned, and safe from eviction, until the caller
+hands it back with release().
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Optional, Union
+
+from .clients import session_for
+
+VIDEOS_DIR = Path(__file__).parent.parent / "videos"
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+_MANIFEST_NAME = "manifest.json"
+_CHUNK_SIZE = 64 * 1024
+
+
+class VideoArtifactStore:
+    def __init__(self, root: Path = VIDEOS_DIR, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # One lock per source key so concurrent callers wait for a single download;
+        # (lock, callers holding or waiting for it), removed when the last one leaves
+        self._key_locks: dict[str, tuple[threading.Lock, int]] = {}
+        # Content hash → paths handed out and not released yet; pinned entries are never evicted
+        self._pins: dict[str, int] = {}
+        self._entries: dict[str, dict[str, Any]] = self._load_manifest()
+
+    # ── Manifest ───────────────────────────────────────────────────────────────
+
+    @property
+    def _manifest_path(self) -> Path:
+        return self.root / _MANIFEST_NAME
+
+    def _load_manifest(self) -> dict[str, dict[str, Any]]:
+        try:
+            entries = json.loads(self._manifest_path.read_text(encoding="utf-8"))["entries"]
+        except (OSError, ValueError, KeyError):
+            return {}
+        # Drop entries whose file was removed by hand
+        return {sha: e for sha, e in entries.items() if (self.root / e["file"]).exists()}
+
+    def _save_manifest(self) -> None:
+        self.root.mkdir(exist_ok=True)
+        tmp = self._manifest_path.with_suffix(".json.tmp")
+        tmp.write_text(json.dumps({"entries": self._entries}, indent=2), encoding="utf-8")
+        os.replace(tmp, self._manifest_path)
+
+    # ── Lookups ────────────────────────────────────────────────────────────────
+
+    def _find(self, task_id: Optional[str], url: Optional[str]) -> Optional[str]:
+        for sha, entry in self._entries.items():
+            if (task_id and task_id in entry["task_ids"]) or (url and url in entry["urls"]):
+                return sha
+        return None
+
+    def get(self, task_id: Optional[str] = None, url: Optional[str] = None) -> Optional[Path]:
+        """Local path of a stored video by Runway task ID or source URL, or None."""
+        with self._lock:
+            sha = self._find(task_id, url)
+            if sha is None:
+                return None
+            self._entries[sha]["last_access"] = time.time()
+            self._pin(sha)
+            self._save_manifest()
+            return self.root / self._entries[sha]["file"]
+
+    def release(self, path: Optional[Union[str, Path]]) -> None:
+        """Hand back a path from get() / fetch(); it may be evicted once nobody holds it."""
+        if not path:
+            return
+        name = Path(path).name
+        with self._lock:
+            sha = next((sha for sha, entry in self._entries.items() if entry["file"] == name), None)
+            if sha is None or sha not in self._pins:
+                return
+            self._pins[sha] -= 1
+            if self._pins[sha] <= 0:
+                del self._pins[sha]
+                if self._evict():
+                    self._save_manifest()
+
+    def _pin(self, sha: str) -> None:
+        self._pins[sha] = self._pins.get(sha, 0) + 1
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "total_bytes": sum(e["size"] for e in self._entries.values()),
+                "max_bytes": self.max_bytes,
+            }
+
+    # ── Download / insert ──────────────────────────────────────────────────────
+
+    def fetch(self, url: str, task_id: Optional[str] = None) -> Path:
+        """
+        Return the local path of the video at `url`, downloading it only if neither
+        the task ID nor the URL is known yet. Raises on download errors.
+        """
+        key = task_id or url
+        key_lock = self._acquire_key(key)
+        try:
+            with key_lock:
+                with self._lock:
+                    sha = self._find(task_id, url)
+                    if sha is not None:
+                        entry = self._entries[sha]
+                        if task_id and task_id not in entry["task_ids"]:
+                            entry["task_ids"].append(task_id)
+                        if url not in entry["urls"]:
+                            entry["urls"].append(url)
+                        entry["last_access"] = time.time()
+                        self._pin(sha)
+                        self._save_manifest()
+                        return self.root / entry["file"]
+
+                return self._download(url, task_id)
+        finally:
+            self._release_key(key)
+
+    def _acquire_key(self, key: str) -> threading.Lock:
+        with self._lock:
+            key_lock, users = self._key_locks.get(key) or (threading.Lock(), 0)
+            self._key_locks[key] = (key_lock, users + 1)
+            return key_lock
+
+    def _release_key(self, key: str) -> None:
+        with self._lock:
+            key_lock, users = self._key_locks[key]
+            if users <= 1:
+                del self._key_locks[key]
+            else:
+                self._key_locks[key] = (key_lock, users - 1)
+
+    def _download(self, url: str, task_id: Optional[str]) -> Path:
+        self.root.mkdir(exist_ok=True)
+        tmp_path = self.root / f".{uuid.uuid4().hex}.part"
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            response = session_for(url).get(url, timeout=120, stream=True)
+            response.raise_for_status()
+            with open(tmp_path, "wb") as f:
+                for chunk in response.iter_content(chunk_size=_CHUNK_SIZE):
+                    digest.update(chunk)
+                    size += len(chunk)
+                    f.write(chunk)
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+
+        sha = digest.hexdigest()
+        filename = f"{sha[:16]}.mp4"
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(sha)
+            if entry is None:
+                os.replace(tmp_path, self.root / filename)
+                entry = self._entries[sha] = {
+                    "file": filename,
+                    "size": size,
+                    "task_ids": [],
+                    "urls": [],
+                    "created_at": now,
+                }
+            else:
+                tmp_path.unlink(missing_ok=True)  # same bytes under a new URL/task
+            if task_id and task_id not in entry["task_ids"]:
+                entry["task_ids"].append(task_id)
+            if url not in entry["urls"]:
+                entry["urls"].append(url)
+            entry["last_access"] = now
+            self._pin(sha)
+            self._evict()
+            self._save_manifest()
+            return self.root / entry["file"]
+
+    def _evict(self) -> bool:
+        """Remove least-recently-used videos until the store fits max_bytes, sparing pinned ones."""
+        total = sum(e["size"] for e in self._entries.values())
+        evicted = False
+        for sha in sorted(self._entries, key=lambda s: self._entries[s]["last_access"]):
+            if total <= self.max_bytes:
+                break
+            if sha in self._pins:
+                continue
+            entry = self._entries.pop(sha)
+            (self.root / entry["file"]).unlink(missing_ok=True)
+            total -= entry["size"]
+            evicted = True
+        return evicted
+
+
+_store: Optional[VideoArtifactStore] = None
+_store_lock = threading.Lock()
+
+
+def get_artifact_store() -> VideoArtifactStore:
+    """The process-wide video store shared by generator and reviewer."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = VideoArtifactStore()
+        return _store
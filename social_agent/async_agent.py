@@ -0,0 +1,244 @@
+import asyncio
+import time
+from typing import Any, Optional
+
+from . import agent as _agent
+from .agent import ApprovalPendingError, SocialAgent, _plan_tool_groups
+from .clients import get_async_anthropic_client
+from .llm import acreate_message
+from .meta_client import AsyncMetaClient
+from .tracing import set_attributes, span
+from .usage import PostBudget, post_scope, tool_scope
+from .video_generator_agent import AsyncVideoGeneratorAgent
+
+
+class AsyncSocialAgent(SocialAgent):
+    """
+    asyncio variant of SocialAgent for running many pipelines in one process.
+
+    Must be created inside a running event loop (the async clients are per loop).
+    The orchestrator loop uses the async Anthropic client; recent posts, Runway
+    generation/polling and Meta publishes use async HTTP. The VC, SMCC and
+    Spielbierg sub-agents (one blocking call each, Spielbierg also CPU-bound on
+    frame extraction) run in worker threads via asyncio.to_thread.
+    """
+
+    def __init__(
+        self,
+        concurrent_tools: bool = False,
+        approval_lock: Optional[asyncio.Lock] = None,
+        video_candidates: int = 1,
+        approval_mode: Optional[str] = None,
+        budget: Optional[PostBudget] = None,
+        pipeline_mode: Optional[str] = None,
+        pipelined_review: Optional[bool] = None,
+        compaction_threshold: Optional[int] = None,
+    ):
+        super().__init__(
+            concurrent_tools=concurrent_tools,
+            video_candidates=video_candidates,
+            approval_mode=approval_mode,
+            budget=budget,
+            pipeline_mode=pipeline_mode,
+            pipelined_review=pipelined_review,
+            compaction_threshold=compaction_threshold,
+        )
+        self.aclient = get_async_anthropic_client()
+        self.ameta = AsyncMetaClient()
+        self.avideo = AsyncVideoGeneratorAgent()
+        # Shared between pipelines of a batch so terminal approvals never interleave
+        self._approval_lock = approval_lock or asyncio.Lock()
+
+    # ── Async tool handlers ────────────────────────────────────────────────────
+
+    async def _ahandle_get_recent_posts(self, platforms: list[str], limit: int = 5) -> str:
+        posts = await self.ameta.get_recent_posts(platforms, limit=limit)
+        return self._recent_posts_payload(posts)
+
+    async def _ahandle_generate_video_with_runway(
+        self,
+        platform: str,
+        additional_prompt_notes: Optional[str] = None,
+    ) -> str:
+        if self._current_video_concept is None or self.video_candidates > 1:
+            return await asyncio.to_thread(
+                self._handle_generate_video_with_runway, platform, additional_prompt_notes
+            )
+        blocked = self._runway_budget_payload()
+        if blocked:
+            return blocked
+        self._video_prompt_notes = additional_prompt_notes or None
+        result = await self.avideo.generate(
+            self._current_video_concept,
+            platform,
+            additional_notes=additional_prompt_notes,
+            task_id=self._pending_runway_task,
+            on_task_created=self._checkpoint_runway_task,
+        )
+        return self._video_result_payload(result)
+
+    async def _ahandle_publish_instagram_post(
+        self,
+        caption: str,
+        image_url: Optional[str] = None,
+    ) -> str:
+        if self._approved_draft is None:
+            return self._publish_blocked_payload()
+        result = await self.ameta.instagram_publish(caption=caption, image_url=image_url)
+        return self._publish_payload(result)
+
+    async def _ahandle_publish_facebook_post(self, message: str) -> str:
+        if self._approved_draft is None:
+            return self._publish_blocked_payload()
+        result = await self.ameta.facebook_publish(message=message)
+        return self._publish_payload(result)
+
+    # ── Dispatcher ─────────────────────────────────────────────────────────────
+
+    async def _adispatch_tool(self, tool_name: str, tool_input: dict[str, Any]) -> dict:
+        """Async counterpart of _dispatch_tool; blocking tools run in a worker thread."""
+        if tool_name == "get_recent_posts":
+            content = await self._ahandle_get_recent_posts(
+                platforms=tool_input.get("platforms", ["instagram", "facebook"]),
+                limit=tool_input.get("limit", 5),
+            )
+        elif tool_name == "generate_video_with_runway":
+            content = await self._ahandle_generate_video_with_runway(
+                platform=tool_input["platform"],
+                additional_prompt_notes=tool_input.get("additional_prompt_notes"),
+            )
+        elif tool_name == "publish_instagram_post":
+            content = await self._ahandle_publish_instagram_post(
+                caption=tool_input["caption"],
+                image_url=tool_input.get("image_url"),
+            )
+        elif tool_name == "publish_facebook_post":
+            content = await self._ahandle_publish_facebook_post(
+                message=tool_input["message"],
+            )
+        elif tool_name == "request_approval":
+            async with self._approval_lock:
+                return await asyncio.to_thread(self._dispatch_tool, tool_name, tool_input)
+        else:
+            return await asyncio.to_thread(self._dispatch_tool, tool_name, tool_input)
+
+        return {"type": "tool_result", "content": content, "is_error": False}
+
+    async def _atimed_dispatch(self, tool_block: Any) -> tuple[dict, float]:
+        start = time.perf_counter()
+        with span(f"tool.{tool_block.name}", tool=tool_block.name, tool_use_id=tool_block.id) as traced, \
+                tool_scope(tool_block.name):
+            result = self._replayed_result(tool_block)
+            replayed = result is not None
+            if result is None:
+                self._start_step(tool_block)
+                result = await self._adispatch_tool(tool_block.name, tool_block.input)
+                self._finish_step(tool_block, result)
+            if traced is not None:
+                traced.set(replayed=replayed, is_error=result.get("is_error", False))
+        return result, time.perf_counter() - start
+
+    async def _aexecute_tools(self, tool_uses: list) -> list[dict]:
+        """Async counterpart of _execute_tools, with asyncio.gather instead of a thread pool."""
+        results: dict[str, dict] = {}
+        durations: list[float] = []
+        turn_start = time.perf_counter()
+
+        groups = _plan_tool_groups(tool_uses) if self.concurrent_tools else [[b] for b in tool_uses]
+        for group in groups:
+            outcomes = await asyncio.gather(*(self._atimed_dispatch(b) for b in group))
+            for tool_block, (result, elapsed) in zip(group, outcomes):
+                durations.append(elapsed)
+                results[tool_block.id] = self._tool_result_block(tool_block, result)
+
+        self._record_turn_timing(tool_uses, time.perf_counter() - turn_start, durations)
+        return [results[b.id] for b in tool_uses]
+
+    # ── Agentic loop ───────────────────────────────────────────────────────────
+
+    async def run(self, user_request: str) -> str:
+        """
+        Run the social agent with the given user request.
+        Returns the final text response from Claude.
+        """
+        return await self._arun_loop(self._start_job(user_request))
+
+    async def resume(self, job_id: str, force: bool = False) -> str:
+        """Continue an interrupted job from its last checkpoint (see SocialAgent.resume)."""
+        return await self._arun_loop(self._load_job(job_id, force))
+
+    async def _arun_loop(self, messages: list[dict]) -> str:
+        with span("agent.run", job_id=self.job_id, approval_mode=self.approval_mode, pipeline=self.pipeline_mode), \
+                post_scope(self.usage):
+            try:
+                if self.pipeline_mode == "coded":
+                    result = await self._arun_coded(messages)
+                else:
+                    result = await self._arun_turns(messages)
+            except ApprovalPendingError as exc:
+                set_attributes(awaiting_approval=exc.approval_id)
+                result = self._park_job(exc.approval_id)
+            finally:
+                self.close()
+            set_attributes(cost_usd=round(self.usage.total.cost_usd, 4))
+        self.usage.print_summary()
+        return result
+
+    async def _arun_turns(self, messages: list[dict]) -> str:
+        for iteration in range(_agent.MAX_LOOP_ITERATIONS):
+            with span("agent.turn", iteration=iteration):
+                pending = self._pending_tool_uses(messages)
+                if pending:
+                    set_attributes(resumed=True, tools=[b.name for b in pending])
+                    messages = self._complete_turn(messages, await self._aexecute_tools(pending))
+                    continue
+
+                if self.usage.exhausted():
+                    return self._budget_stop()
+                response = await acreate_message(self.aclient, "Orchestrator", **self._request_kwargs(messages))
+
+                text_parts, tool_uses = self._split_response(response)
+                set_attributes(stop_reason=response.stop_reason, tools=[b.name for b in tool_uses])
+
+                if response.stop_reason == "end_turn":
+                    return self._finish_job("\n".join(text_parts) if text_parts else "(nessuna risposta testuale)")
+
+                if response.stop_reason == "tool_use" and tool_uses:
+                    messages.append({"role": "assistant", "content": response.content})
+                    self._checkpoint(messages)
+                    tool_results = await self._aexecute_tools(tool_uses)
+                    messages = self._complete_turn(messages, tool_results)
+                    continue
+
+                # Unexpected stop reason
+                break
+
+        return self._finish_job("Limite massimo di iterazioni raggiunto.", status="stopped")
+
+    async def _arun_coded(self, messages: list[dict]) -> str:
+        """Async counterpart of _run_coded."""
+        for iteration in range(_agent.MAX_PIPELINE_STEPS):
+            with span("agent.turn", iteration=iteration, pipeline="coded"):
+                pending = self._pending_tool_uses(messages)
+                if pending:
+                    set_attributes(resumed=True, tools=[b.name for b in pending])
+                    messages = self._complete_turn(messages, await self._aexecute_tools(pending))
+                    continue
+
+                if self.usage.exhausted():
+                    return self._budget_stop()
+                step = self._next_coded_step(messages)
+                if step.kind == "done":
+                    return self._finish_job(step.text)
+                if step.kind == "llm":
+                    with tool_scope(step.label.lower()):
+                        self._pipeline.apply(step, await acreate_message(self.aclient, step.label, **step.request))
+                    self._checkpoint(messages)
+                    continue
+
+                messages.append({"role": "assistant", "content": [step.block]})
+                self._checkpoint(messages)
+                tool_results = await self._aexecute_tools(self._pending_tool_uses(messages))
+                messages = self._complete_turn(messages, tool_results)
+
+        return self._finish_job("Limite massimo di step della pipeline raggiunto.", status="stopped")
@@ -0,0 +1,194 @@
+"""
+Batch runner — esegue molti brief con AsyncSocialAgent sotto un limite di concorrenza.
+
+Input: file JSONL, una riga per brief: {"id": "...", "brief": "..."} (id opzionale).
+Output: una riga JSONL per brief, scritta appena la pipeline termina.
+
+    python -m social_agent.batch briefs.jsonl --concurrency 4 --output results.jsonl
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import sys
+import time
+from typing import Optional, TextIO
+
+from .async_agent import AsyncSocialAgent
+from .clients import aclose_async_clients, print_connection_stats
+from .coded_pipeline import PIPELINE_MODES
+from .meta_rate_limit import get_meta_rate_limiter, print_rate_limit_budget
+from .resilience import print_resilience_stats
+from .usage import PostBudget, print_usage_report, resolve_budget
+from .video_generator_agent import print_runway_poller_stats
+
+DEFAULT_CONCURRENCY = 4
+# Graph API calls a pipeline makes (recent posts + publish): a pipeline starts only
+# once the app-wide budget has room for them, instead of failing at publish time
+PIPELINE_META_CALLS = 4
+
+
+def load_briefs(path: str) -> list[dict]:
+    """Read briefs from a JSONL file; blank lines are skipped, missing ids become the line number."""
+    briefs: list[dict] = []
+    with open(path, encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            item = json.loads(line)
+            if isinstance(item, str):
+                item = {"brief": item}
+            if "brief" not in item:
+                raise ValueError(f"{path}:{line_no}: campo 'brief' mancante")
+            item.setdefault("id", str(line_no))
+            briefs.append(item)
+    return briefs
+
+
+async def _run_one(
+    item: dict,
+    semaphore: asyncio.Semaphore,
+    approval_lock: asyncio.Lock,
+    concurrent_tools: bool,
+    video_candidates: int,
+    approval_mode: Optional[str] = None,
+    budget: Optional[PostBudget] = None,
+    pipeline_mode: Optional[str] = None,
+    pipelined_review: Optional[bool] = None,
+) -> dict:
+    async with semaphore:
+        wait = get_meta_rate_limiter().time_until_available(["app"], calls=PIPELINE_META_CALLS)
+        if wait > 0:
+            print(f"  [Batch] {item['id']}: budget Meta esaurito, avvio tra {wait:.0f}s")
+            await asyncio.sleep(wait)
+        start = time.perf_counter()
+        agent = None
+        try:
+            agent = AsyncSocialAgent(
+                concurrent_tools=concurrent_tools,
+                approval_lock=approval_lock,
+                video_candidates=video_candidates,
+                approval_mode=approval_mode,
+                budget=budget,
+                pipeline_mode=pipeline_mode,
+                pipelined_review=pipelined_review,
+            )
+            result = await agent.run(item["brief"])
+            status = "awaiting_approval" if agent.awaiting_approval else "ok"
+            record = {"id": item["id"], "status": status, "result": result}
+            if agent.awaiting_approval:
+                record["approval_id"] = agent.awaiting_approval
+        except Exception as exc:
+            record = {"id": item["id"], "status": "error", "error": f"{type(exc).__name__}: {exc}"}
+        # Unfinished jobs can be continued with `python -m social_agent.resume <job_id>`
+        record["job_id"] = agent.job_id if agent is not None else None
+        if agent is not None and agent.usage is not None:
+            record["usage"] = agent.usage.total.as_dict()
+        record["elapsed_seconds"] = round(time.perf_counter() - start, 2)
+        return record
+
+
+async def run_batch(
+    briefs: list[dict],
+    concurrency: int = DEFAULT_CONCURRENCY,
+    out: Optional[TextIO] = None,
+    concurrent_tools: bool = False,
+    video_candidates: int = 1,
+    approval_mode: Optional[str] = None,
+    budget: Optional[PostBudget] = None,
+    pipeline_mode: Optional[str] = None,
+    pipelined_review: Optional[bool] = None,
+) -> list[dict]:
+    """
+    Run every brief through its own AsyncSocialAgent, at most `concurrency` at a time.
+    Each result is written to `out` as one JSONL line as soon as its pipeline finishes.
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    approval_lock = asyncio.Lock()
+    tasks = [
+        asyncio.create_task(
+            _run_one(
+                item, semaphore, approval_lock, concurrent_tools, video_candidates, approval_mode, budget,
+                pipeline_mode, pipelined_review,
+            )
+        )
+        for item in briefs
+    ]
+
+    records: list[dict] = []
+    try:
+        for finished in asyncio.as_completed(tasks):
+            record = await finished
+            records.append(record)
+            if out is not None:
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                out.flush()
+    finally:
+        await aclose_async_clients()
+    return records
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Esegue un batch di brief social in parallelo.")
+    parser.add_argument("briefs", help="File JSONL con un brief per riga.")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY,
+                        help=f"Pipeline eseguite in parallelo (default {DEFAULT_CONCURRENCY}).")
+    parser.add_argument("--output", help="File JSONL dei risultati (default: stdout; i log vanno su stderr).")
+    parser.add_argument("--concurrent-tools", action="store_true",
+                        help="Esegue in parallelo i tool indipendenti di ogni turno.")
+    parser.add_argument("--video-candidates", type=int, default=1,
+                        help="Varianti Runway generate in parallelo per post (best-of-N, default 1).")
+    parser.add_argument("--approval", choices=("terminal", "queue"),
+                        help="terminal: approvazione interattiva; queue: bozze in coda, "
+                             "da rivedere con python -m social_agent.approve (default: SOCIAL_AGENT_APPROVAL).")
+    parser.add_argument("--pipeline", choices=PIPELINE_MODES,
+                        help="agentic: l'orchestratore sceglie ogni tool; coded: ordine fisso, Claude solo "
+                             "per bozza e feedback (default: SOCIAL_AGENT_PIPELINE).")
+    parser.add_argument("--pipelined-review", action="store_true", default=None,
+                        help="Avvia la revisione SMCC del testo appena c'è il concept, in parallelo a Runway "
+                             "(default: SOCIAL_AGENT_PIPELINED_REVIEW).")
+    parser.add_argument("--budget-usd", type=float,
+                        help="Budget per post in dollari (default: SOCIAL_AGENT_POST_BUDGET_USD).")
+    parser.add_argument("--runway-seconds", type=float,
+                        help="Secondi Runway generabili per post (default: SOCIAL_AGENT_POST_RUNWAY_SECONDS).")
+    args = parser.parse_args(argv)
+
+    budget = resolve_budget()
+    if args.budget_usd is not None:
+        budget.max_cost_usd = args.budget_usd
+    if args.runway_seconds is not None:
+        budget.max_runway_seconds = args.runway_seconds
+
+    briefs = load_briefs(args.briefs)
+    out = open(args.output, "a", encoding="utf-8") if args.output else sys.stdout
+    # With results on stdout, progress and stats go to stderr so the JSONL stays parseable
+    logs = contextlib.nullcontext() if args.output else contextlib.redirect_stdout(sys.stderr)
+    with logs:
+        try:
+            records = asyncio.run(
+                run_batch(
+                    briefs,
+                    args.concurrency,
+                    out,
+                    concurrent_tools=args.concurrent_tools,
+                    video_candidates=args.video_candidates,
+                    approval_mode=args.approval,
+                    budget=budget,
+                    pipeline_mode=args.pipeline,
+                    pipelined_review=args.pipelined_review,
+                )
+            )
+        finally:
+            if args.output:
+                out.close()
+        print_connection_stats()
+        print_rate_limit_budget()
+        print_resilience_stats()
+        print_runway_poller_stats()
+        print_usage_report()
+    return 0 if all(r["status"] in ("ok", "awaiting_approval") for r in records) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
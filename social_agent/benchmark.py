@@ -0,0 +1,598 @@
+"""
+Offline benchmark: the whole pipeline against local fake upstreams.
+
+    python -m social_agent.benchmark                               # every scenario, "fast" profile
+    python -m social_agent.benchmark --scenario pipeline --iterations 20 --output bench.json
+    python -m social_agent.benchmark --baseline bench.json         # exit 1 on a p50 regression
+    python -m social_agent.benchmark --import-time                 # exit 1 past the cold-start budgets
+
+FakeAnthropic, FakeRunway and FakeGraph (fake_upstreams.py) stand in for the
+real APIs, so a run costs nothing, needs no keys and is repeatable (--seed).
+Jobs, videos and post history go to a temporary directory, and approvals are
+given automatically.
+
+The report is JSON, one entry per scenario, with latency p50/p95/mean/max,
+throughput, peak RSS, the tokens accounted by usage.py and a per-stage
+breakdown built from the tracing spans (times are inclusive: a tool span
+contains the HTTP spans under it). Scenarios with a baseline (the coded
+pipeline against the agentic loop) also get latency/token ratios under
+"comparisons".
+
+--import-time instead measures the cold start of the package entry points
+with `python -X importtime` in fresh interpreters, and fails when one goes
+over its budget or loads a heavy dependency it should only import lazily.
+"""
+import argparse
+import asyncio
+import builtins
+import contextlib
+import io
+import json
+import math
+import os
+import platform
+import re
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field, fields
+from pathlib import Path
+from typing import Any, Callable, Iterator, Optional
+
+from . import (
+    artifact_store,
+    clients,
+    job_store,
+    meta_client,
+    post_history,
+    runway_poller,
+    video_generator_agent,
+)
+from .agent import SocialAgent
+from .artifact_store import VideoArtifactStore
+from .batch import run_batch
+from .fake_upstreams import (
+    DEFAULT_SCRIPT,
+    AnthropicProfile,
+    FakeAnthropic,
+    FakeGraph,
+    FakeRunway,
+    RunwayProfile,
+    UpstreamProfile,
+    sample_concept,
+)
+from .job_store import JobStore
+from .models import VideoConcept
+from .post_history import PostHistoryStore
+from .smcc_agent import SMCCAgent
+from .spielbierg_agent import SpielbiergAgent
+from .tracing import Span, add_listener, remove_listener, span
+from .usage import Usage, get_usage_ledger
+from .vc_agent import VCAgent
+
+DEFAULT_ITERATIONS = 5
+DEFAULT_CONCURRENCY = 1
+
+BRIEF = (
+    'Genera un post Instagram per il brand "Beet It!": una ricetta veloce con barbabietola. '
+    "Tono fresco e ironico, con video."
+)
+
+
+# ── Profiles ───────────────────────────────────────────────────────────────────
+
+@dataclass
+class BenchmarkProfile:
+    anthropic: AnthropicProfile
+    runway: RunwayProfile
+    graph: UpstreamProfile
+    poll_scale: float               # multiplies the Runway poll schedule (runway_poller)
+
+
+PROFILES: dict[str, Callable[[], BenchmarkProfile]] = {
+    # Overhead of our own code: upstreams answer almost at once
+    "fast": lambda: BenchmarkProfile(AnthropicProfile(), RunwayProfile(), UpstreamProfile(), poll_scale=0.05),
+    # Production-like timings (Opus generation speed, ~45s Runway tasks): slow, for end-to-end shape
+    "realistic": lambda: BenchmarkProfile(
+        AnthropicProfile(latency_ms=1200, jitter_ms=300, ms_per_output_token=20),
+        RunwayProfile(latency_ms=250, jitter_ms=50, pending_seconds=5, task_seconds=45),
+        UpstreamProfile(latency_ms=300, jitter_ms=100),
+        poll_scale=1.0,
+    ),
+    # Fast, but 10% of requests fail with 503/429 + Retry-After and 10% of Runway tasks fail
+    "flaky": lambda: BenchmarkProfile(
+        AnthropicProfile(error_rate=0.1, error_status=529),
+        RunwayProfile(error_rate=0.1, failure_rate=0.1),
+        UpstreamProfile(error_rate=0.1, error_status=429),
+        poll_scale=0.05,
+    ),
+}
+
+
+# ── Environment ────────────────────────────────────────────────────────────────
+
+class OfflineUpstreams:
+    """
+    Starts the fake servers and points the pipeline at them: API keys and base
+    URLs, the module-level Runway/Graph endpoints, and fresh stores in `workdir`.
+    Everything is restored on exit.
+    """
+
+    def __init__(self, profile: BenchmarkProfile, workdir: Path, seed: int = 0):
+        self.profile = profile
+        self.workdir = Path(workdir)
+        self.anthropic = FakeAnthropic(profile.anthropic, seed=seed)
+        self.runway = FakeRunway(profile.runway, seed=seed + 1)
+        self.graph = FakeGraph(profile.graph, seed=seed + 2)
+        self._saved_env: dict[str, Optional[str]] = {}
+        self._saved_attrs: list[tuple[Any, str, Any]] = []
+
+    def _setenv(self, name: str, value: str) -> None:
+        self._saved_env.setdefault(name, os.environ.get(name))
+        os.environ[name] = value
+
+    def _setattr(self, target: Any, name: str, value: Any) -> None:
+        self._saved_attrs.append((target, name, getattr(target, name)))
+        setattr(target, name, value)
+
+    def __enter__(self) -> "OfflineUpstreams":
+        for server in (self.anthropic, self.runway, self.graph):
+            server.start()
+        for name, value in {
+            "ANTHROPIC_BASE_URL": self.anthropic.base_url,
+            "ANTHROPIC_API_KEY": "bench",
+            "RUNWAYML_API_SECRET": "bench",
+            "INSTAGRAM_ACCESS_TOKEN": "bench",
+            "INSTAGRAM_BUSINESS_ACCOUNT_ID": "1784000000000000",
+            "FACEBOOK_PAGE_ID": "100000000000000",
+            "FACEBOOK_PAGE_ACCESS_TOKEN": "bench",
+            "SOCIAL_AGENT_RESPONSE_CACHE": "off",   # every iteration pays for its calls
+            "SOCIAL_AGENT_APPROVAL": "terminal",
+            "SOCIAL_AGENT_POST_BUDGET_USD": "",      # no model fallback halfway through a run
+            "SOCIAL_AGENT_POST_RUNWAY_SECONDS": "",
+        }.items():
+            self._setenv(name, value)
+
+        # Read at call time, so rebinding them is enough
+        self._setattr(video_generator_agent, "RUNWAY_API_BASE", self.runway.api_base)
+        self._setattr(meta_client, "GRAPH_API_BASE", self.graph.api_base)
+        for name in ("_FIRST_POLL_SECONDS", "_MIN_INTERVAL_SECONDS", "_MAX_INTERVAL_SECONDS"):
+            self._setattr(runway_poller, name, getattr(runway_poller, name) * self.profile.poll_scale)
+
+        # Fresh process-wide singletons: the Anthropic client picks up the fake base URL
+        self._setattr(clients, "_anthropic_client", None)
+        self._setattr(artifact_store, "_store", VideoArtifactStore(self.workdir / "videos"))
+        self._setattr(post_history, "_history", PostHistoryStore(self.workdir / "post_history.json"))
+        self._setattr(job_store, "_default_store", JobStore(self.workdir / "jobs.sqlite3"))
+        self._setattr(builtins, "input", lambda prompt="": "y")
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        for target, name, value in reversed(self._saved_attrs):
+            setattr(target, name, value)
+        for name, value in self._saved_env.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+        for server in (self.anthropic, self.runway, self.graph):
+            server.shutdown()
+            server.server_close()
+
+    def upstream_of(self, url: str) -> Optional[str]:
+        for name, server in (("anthropic", self.anthropic), ("runway", self.runway), ("graph", self.graph)):
+            if url.startswith(server.base_url):
+                return name
+        return None
+
+    def stats(self) -> dict[str, Any]:
+        return {"anthropic": self.anthropic.stats(), "runway": self.runway.stats(), "graph": self.graph.stats()}
+
+
+# ── Scenarios ──────────────────────────────────────────────────────────────────
+
+@dataclass
+class Scenario:
+    name: str
+    description: str
+    run: Callable[[OfflineUpstreams, int], Any]         # one iteration, given its index
+    script: tuple[str, ...] = DEFAULT_SCRIPT
+    spielbierg_rejections: int = 0
+    baseline: Optional[str] = None      # scenario it is compared against when both run
+
+
+def _pipeline(upstreams: OfflineUpstreams, iteration: int) -> None:
+    SocialAgent(pipeline_mode="agentic").run(BRIEF)
+
+
+def _pipeline_coded(upstreams: OfflineUpstreams, iteration: int) -> None:
+    SocialAgent(pipeline_mode="coded").run(BRIEF)
+
+
+def _pipeline_overlap(upstreams: OfflineUpstreams, iteration: int) -> None:
+    SocialAgent(pipeline_mode="coded", pipelined_review=True).run(BRIEF)
+
+
+def _concept() -> VideoConcept:
+    return VideoConcept(**sample_concept())
+
+
+def _vc(upstreams: OfflineUpstreams, iteration: int) -> None:
+    VCAgent().create_concept("instagram", BRIEF, "ricetta veloce")
+
+
+def _smcc(upstreams: OfflineUpstreams, iteration: int) -> None:
+    SMCCAgent().review("instagram", BRIEF, ["plantbased"], _concept().title)
+
+
+def _runway(upstreams: OfflineUpstreams, iteration: int) -> None:
+    result = video_generator_agent.VideoGeneratorAgent().generate(_concept(), "instagram")
+    if result.status != "succeeded":
+        raise RuntimeError(result.error or result.status)
+    artifact_store.get_artifact_store().release(result.local_path)
+
+
+def _spielbierg(upstreams: OfflineUpstreams, iteration: int) -> None:
+    # A new URL per iteration, so every review downloads and decodes the clip
+    video_url = f"{upstreams.runway.base_url}/videos/bench-{iteration}.mp4"
+    SpielbiergAgent().review_video(video_url, _concept(), BRIEF, ["plantbased"])
+
+
+_REGENERATION_SCRIPT = DEFAULT_SCRIPT[:4] + (
+    "generate_video_with_runway", "review_video_with_spielbierg",
+) + DEFAULT_SCRIPT[4:]
+
+SCENARIOS: dict[str, Scenario] = {s.name: s for s in (
+    Scenario("pipeline", "SocialAgent.run, un ciclo completo", _pipeline),
+    Scenario(
+        "pipeline_regeneration", "SocialAgent.run con un video rifiutato da Spielbierg e rigenerato",
+        _pipeline, script=_REGENERATION_SCRIPT, spielbierg_rejections=1,
+    ),
+    Scenario(
+        "pipeline_coded", "SocialAgent.run in modalità coded: stesso ciclo senza orchestratore",
+        _pipeline_coded, baseline="pipeline",
+    ),
+    Scenario(
+        "pipeline_coded_regeneration", "Modalità coded con un video rifiutato da Spielbierg e rigenerato",
+        _pipeline_coded, spielbierg_rejections=1, baseline="pipeline_regeneration",
+    ),
+    Scenario(
+        "pipeline_overlap", "Modalità coded con la revisione SMCC in parallelo a Runway",
+        _pipeline_overlap, baseline="pipeline_coded",
+    ),
+    Scenario(
+        "pipeline_overlap_regeneration",
+        "Revisione SMCC in parallelo, video rigenerato: passata di allineamento SMCC",
+        _pipeline_overlap, spielbierg_rejections=1, baseline="pipeline_coded_regeneration",
+    ),
+    Scenario("batch", "run_batch: --concurrency pipeline async in parallelo per iterazione", _pipeline),
+    Scenario("vc", "VCAgent.create_concept", _vc),
+    Scenario("smcc", "SMCCAgent.review", _smcc),
+    Scenario("runway", "VideoGeneratorAgent.generate: task, polling e download", _runway),
+    Scenario("spielbierg", "SpielbiergAgent.review_video: download, frame e review", _spielbierg),
+)}
+
+
+# ── Measurement ────────────────────────────────────────────────────────────────
+
+def percentile(values: list[float], q: float) -> float:
+    """Nearest-rank percentile (q in 0..100)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(math.ceil(q / 100 * len(ordered)) - 1, 0)]
+
+
+def _latency(seconds: list[float]) -> dict[str, float]:
+    return {
+        "p50_ms": round(percentile(seconds, 50) * 1000, 1),
+        "p95_ms": round(percentile(seconds, 95) * 1000, 1),
+        "mean_ms": round(sum(seconds) / len(seconds) * 1000, 1) if seconds else 0.0,
+        "max_ms": round(max(seconds, default=0.0) * 1000, 1),
+    }
+
+
+def _peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 ** 2 if sys.platform == "darwin" else 1024), 1)
+
+
+def _usage_delta(before: Usage, after: Usage) -> dict[str, Any]:
+    delta = Usage(**{f.name: getattr(after, f.name) - getattr(before, f.name) for f in fields(Usage)})
+    return delta.as_dict()
+
+
+@dataclass
+class _SpanCollector:
+    upstreams: OfflineUpstreams
+    spans: list[Span] = field(default_factory=list)
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+    def __call__(self, spans: list[Span]) -> None:
+        with self.lock:
+            self.spans.extend(spans)
+
+    def stage(self, s: Span) -> str:
+        if s.name.startswith("http "):
+            upstream = self.upstreams.upstream_of(str(s.attributes.get("http.url", "")))
+            return f"http {s.attributes.get('http.method', '')} {upstream or 'other'}"
+        return s.name
+
+    def breakdown(self) -> dict[str, dict[str, Any]]:
+        durations: dict[str, list[float]] = {}
+        with self.lock:
+            for s in self.spans:
+                if s.name != "benchmark.iteration":
+                    durations.setdefault(self.stage(s), []).append((s.end_ns - s.start_ns) / 1e9)
+        return {
+            name: {
+                "count": len(values),
+                "total_s": round(sum(values), 3),
+                **{k: v for k, v in _latency(values).items() if k in ("mean_ms", "p95_ms")},
+            }
+            for name, values in sorted(durations.items(), key=lambda item: -sum(item[1]))
+        }
+
+
+@contextlib.contextmanager
+def _quiet(enabled: bool) -> Iterator[None]:
+    """Pipeline logs go to stderr (stdout is reserved for the JSON report), or nowhere."""
+    with contextlib.redirect_stdout(io.StringIO() if enabled else sys.stderr):
+        yield
+
+
+def _run_iterations(scenario: Scenario, upstreams: OfflineUpstreams, iterations: int, concurrency: int):
+    def one(i: int) -> tuple[float, Optional[str]]:
+        start = time.perf_counter()
+        try:
+            with span("benchmark.iteration", scenario=scenario.name, iteration=i):
+                scenario.run(upstreams, i)
+            return time.perf_counter() - start, None
+        except Exception as exc:
+            return time.perf_counter() - start, f"{type(exc).__name__}: {exc}"
+
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        return list(pool.map(one, range(iterations)))
+
+
+def _run_batch(upstreams: OfflineUpstreams, iterations: int, concurrency: int):
+    briefs = [{"id": str(i), "brief": BRIEF} for i in range(iterations)]
+    records = asyncio.run(run_batch(briefs, concurrency))
+    return [
+        (r["elapsed_seconds"], None if r["status"] in ("ok", "awaiting_approval") else r.get("error", r["status"]))
+        for r in records
+    ]
+
+
+def run_scenario(
+    scenario: Scenario,
+    upstreams: OfflineUpstreams,
+    iterations: int,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    quiet: bool = False,
+) -> dict[str, Any]:
+    upstreams.anthropic.reset(scenario.script, scenario.spielbierg_rejections)
+    collector = _SpanCollector(upstreams)
+    ledger = get_usage_ledger()
+    usage_before = Usage.from_dict(ledger.total.as_dict())
+    add_listener(collector)
+    start = time.perf_counter()
+    try:
+        with _quiet(quiet):
+            if scenario.name == "batch":
+                samples = _run_batch(upstreams, iterations, concurrency)
+            else:
+                samples = _run_iterations(scenario, upstreams, iterations, concurrency)
+    finally:
+        remove_listener(collector)
+    wall = time.perf_counter() - start
+
+    latencies = [seconds for seconds, _ in samples]
+    errors = [error for _, error in samples if error]
+    return {
+        "scenario": scenario.name,
+        "description": scenario.description,
+        "iterations": len(samples),
+        "concurrency": concurrency,
+        "errors": len(errors),
+        "error_samples": sorted(set(errors))[:5],
+        "wall_seconds": round(wall, 3),
+        "throughput_per_second": round(len(samples) / wall, 3) if wall else 0.0,
+        "latency": _latency(latencies),
+        "peak_rss_mb": _peak_rss_mb(),
+        "usage": _usage_delta(usage_before, ledger.total),
+        "stages": collector.breakdown(),
+    }
+
+
+def _comparisons(results: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    """Latency and token ratios of each scenario against its baseline scenario, when both ran."""
+    by_name = {entry["scenario"]: entry for entry in results}
+    comparisons = []
+    for entry in results:
+        baseline = by_name.get(SCENARIOS[entry["scenario"]].baseline or "")
+        if baseline is None:
+            continue
+
+        def ratio(metric: Callable[[dict[str, Any]], float]) -> Optional[float]:
+            return round(metric(entry) / metric(baseline), 3) if metric(baseline) else None
+
+        comparisons.append({
+            "scenario": entry["scenario"],
+            "baseline": baseline["scenario"],
+            "p50_ratio": ratio(lambda e: e["latency"]["p50_ms"]),
+            "p95_ratio": ratio(lambda e: e["latency"]["p95_ms"]),
+            "input_tokens_ratio": ratio(lambda e: e["usage"]["input_tokens"] + e["usage"]["cache_read_tokens"]),
+            "output_tokens_ratio": ratio(lambda e: e["usage"]["output_tokens"]),
+            "cost_ratio": ratio(lambda e: e["usage"]["cost_usd"]),
+            "claude_calls": {entry["scenario"]: entry["usage"]["calls"], baseline["scenario"]: baseline["usage"]["calls"]},
+        })
+    return comparisons
+
+
+def run_benchmark(
+    scenarios: list[str],
+    iterations: int = DEFAULT_ITERATIONS,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    profile: str = "fast",
+    seed: int = 0,
+    quiet: bool = False,
+) -> dict[str, Any]:
+    """Run the named scenarios against fresh fake upstreams; returns the JSON report."""
+    with tempfile.TemporaryDirectory(prefix="social-agent-bench-") as workdir:
+        with OfflineUpstreams(PROFILES[profile](), Path(workdir), seed) as upstreams:
+            results = []
+            for name in scenarios:
+                print(f"  [Bench] {name}: {iterations} iterazioni…", file=sys.stderr)
+                results.append(run_scenario(SCENARIOS[name], upstreams, iterations, concurrency, quiet))
+            return {
+                "profile": profile,
+                "seed": seed,
+                "python": platform.python_version(),
+                "started_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                "scenarios": results,
+                "comparisons": _comparisons(results),
+                "upstreams": upstreams.stats(),
+            }
+
+
+# ── Import time ────────────────────────────────────────────────────────────────
+
+# Cold-start budget (ms) per entry point, and the heavy dependencies it must not load
+IMPORT_BUDGETS: dict[str, tuple[float, tuple[str, ...]]] = {
+    "social_agent": (100, ("anthropic", "cv2", "numpy", "requests", "httpx")),
+    "social_agent.meta_client": (800, ("anthropic", "cv2", "numpy")),
+    "social_agent.agent": (1000, ("anthropic", "cv2", "numpy")),
+}
+
+_IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)$")
+
+
+def _import_profile(module: str) -> tuple[float, list[tuple[str, float]], set[str]]:
+    """(cumulative ms, direct imports with their ms, every module loaded) for one cold import."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=Path(__file__).parent.parent, capture_output=True, text=True, check=True,
+    )
+    total, children, loaded = 0.0, [], set()
+    pending: list[tuple[str, float]] = []
+    for line in result.stderr.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        cumulative_ms, depth, name = int(match.group(2)) / 1000, len(match.group(3)) // 2, match.group(4)
+        loaded.add(name)
+        if depth == 1:
+            pending.append((name, cumulative_ms))
+        elif depth == 0:
+            if name == module:
+                total, children = cumulative_ms, pending
+            pending = []
+    return total, children, loaded
+
+
+def check_import_time(runs: int = 5) -> list[dict[str, Any]]:
+    """Median cold-start time of each IMPORT_BUDGETS entry point, after a warm-up run."""
+    results = []
+    for module, (budget_ms, forbidden) in IMPORT_BUDGETS.items():
+        _import_profile(module)
+        profiles = [_import_profile(module) for _ in range(max(1, runs))]
+        median_ms = statistics.median(total for total, _, _ in profiles)
+        _, children, loaded = profiles[-1]
+        forbidden_loaded = sorted(name for name in forbidden if name in loaded)
+        results.append({
+            "module": module,
+            "median_ms": round(median_ms, 1),
+            "budget_ms": budget_ms,
+            "forbidden_loaded": forbidden_loaded,
+            "heaviest": [{"module": name, "ms": round(ms, 1)} for name, ms in sorted(children, key=lambda c: -c[1])[:5]],
+            "ok": median_ms <= budget_ms and not forbidden_loaded,
+        })
+    return results
+
+
+def compare(report: dict[str, Any], baseline: dict[str, Any], tolerance: float) -> list[str]:
+    """Scenarios whose p50 latency is more than `tolerance` (0.2 = 20%) above the baseline's."""
+    previous = {entry["scenario"]: entry for entry in baseline.get("scenarios", [])}
+    regressions = []
+    for entry in report["scenarios"]:
+        old = previous.get(entry["scenario"])
+        if old is None or not old["latency"]["p50_ms"]:
+            continue
+        ratio = entry["latency"]["p50_ms"] / old["latency"]["p50_ms"]
+        if ratio > 1 + tolerance:
+            regressions.append(
+                f"{entry['scenario']}: p50 {old['latency']['p50_ms']}ms → {entry['latency']['p50_ms']}ms "
+                f"(+{(ratio - 1) * 100:.0f}%)"
+            )
+    return regressions
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Benchmark offline della pipeline contro finti Anthropic, Runway e Graph API."
+    )
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS),
+                        help="Scenario da eseguire, ripetibile (default: tutti).")
+    parser.add_argument("--iterations", type=int, default=DEFAULT_ITERATIONS,
+                        help=f"Iterazioni per scenario (default {DEFAULT_ITERATIONS}).")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY,
+                        help="Iterazioni in parallelo; per 'batch' è la concurrency di run_batch "
+                             f"(default {DEFAULT_CONCURRENCY}).")
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="fast",
+                        help="Latenze ed errori dei finti upstream (default fast).")
+    parser.add_argument("--seed", type=int, default=0, help="Seed di jitter ed errori (default 0).")
+    parser.add_argument("--output", help="File JSON del report (default: stdout).")
+    parser.add_argument("--quiet", action="store_true", help="Nasconde i log della pipeline (altrimenti su stderr).")
+    parser.add_argument("--baseline", help="Report precedente: esce con 1 se un p50 peggiora oltre --tolerance.")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="Peggioramento massimo del p50 rispetto al baseline (default 0.2 = 20%%).")
+    parser.add_argument("--import-time", action="store_true",
+                        help="Misura solo il tempo di import a freddo (python -X importtime) contro i budget.")
+    args = parser.parse_args(argv)
+
+    if args.import_time:
+        results = check_import_time(runs=args.iterations)
+        for entry in results:
+            if not entry["ok"]:
+                loaded = ", ".join(entry["forbidden_loaded"])
+                print(f"  [Bench] Import {entry['module']}: {entry['median_ms']}ms (budget {entry['budget_ms']}ms)"
+                      + (f", carica {loaded}" if loaded else ""), file=sys.stderr)
+        text = json.dumps({"python": platform.python_version(), "imports": results}, ensure_ascii=False, indent=2)
+        if args.output:
+            Path(args.output).write_text(text + "\n", encoding="utf-8")
+        else:
+            print(text)
+        return 0 if all(entry["ok"] for entry in results) else 1
+
+    report = run_benchmark(
+        args.scenario or list(SCENARIOS),
+        iterations=max(1, args.iterations),
+        concurrency=args.concurrency,
+        profile=args.profile,
+        seed=args.seed,
+        quiet=args.quiet,
+    )
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        Path(args.output).write_text(text + "\n", encoding="utf-8")
+        print(f"  [Bench] Report scritto in {args.output}", file=sys.stderr)
+    else:
+        print(text)
+
+    if args.baseline:
+        regressions = compare(report, json.loads(Path(args.baseline).read_text(encoding="utf-8")), args.tolerance)
+        for line in regressions:
+            print(f"  [Bench] Regressione: {line}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0 if all(entry["errors"] == 0 for entry in report["scenarios"]) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
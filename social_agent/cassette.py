@@ -0,0 +1,412 @@
+"""
+Record/replay of all upstream traffic, at the transport level.
+
+With SOCIAL_AGENT_CASSETTE=record every Anthropic, Runway and Meta exchange
+(video downloads included) goes to the network as usual and is also written
+to a cassette, a zip file in CASSETTE_DIR:
+
+    interactions.jsonl      one line per exchange: request, status, headers, timing
+    bodies/<sha256>         response bodies, deduplicated (videos stored, the rest deflated)
+
+With SOCIAL_AGENT_CASSETTE=replay nothing leaves the machine: every request is
+answered from the cassette, after its recorded duration divided by
+SOCIAL_AGENT_CASSETTE_SPEED (1 = original timing, 10 = ten times faster,
+0 = no waiting; the Runway poll schedule is compressed by the same factor).
+
+Requests are matched on method and URL path, preferring the recorded exchange
+with the same query and body, then the same body, the same forced tool
+(tool_choice), the same query, and finally the oldest one. Once a path's
+exchanges are used up its last response is served again, so a replay that
+polls a Runway task more often than the recording still converges.
+
+Authorization headers and access tokens are never written to the cassette.
+"""
+import argparse
+import asyncio
+import atexit
+import hashlib
+import io
+import json
+import os
+import re
+import sys
+import threading
+import time
+import zipfile
+from dataclasses import asdict, dataclass
+from http.client import responses as _REASONS
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+import httpx
+import requests
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+from . import runway_poller
+
+CASSETTE_DIR = Path(__file__).parent.parent / "cassettes"
+CASSETTE_MODES = ("record", "replay")
+
+_INDEX_NAME = "interactions.jsonl"
+_SECRET = re.compile(r"""(access_token["']?\s*[:=]\s*["']?)[^&"'\s]+""")
+# Stored bodies are decoded, so the transfer headers no longer apply
+_DROPPED_HEADERS = {"content-encoding", "transfer-encoding", "content-length", "connection"}
+_MIN_POLL_SCALE = 0.01
+
+
+class CassetteMissError(Exception):
+    """Raised in replay mode for a request the cassette has no response for."""
+
+
+@dataclass
+class Interaction:
+    method: str
+    url: str                        # access_token redacted
+    request_sha256: str             # of the redacted request body
+    tool: Optional[str]             # tool_choice name of a Messages request
+    status: int
+    headers: list[tuple[str, str]]
+    body: str                       # blob name under bodies/
+    started: float                  # seconds since the recording started
+    elapsed: float
+
+
+def _redact(text: str) -> str:
+    return _SECRET.sub(r"\1***", text)
+
+
+def _request_digest(body: bytes) -> tuple[str, Optional[str]]:
+    """(sha256 of the redacted body, tool_choice name if it is a Messages request)."""
+    text = _redact(body.decode("utf-8", errors="replace"))
+    tool = None
+    if text.startswith("{"):
+        try:
+            tool = (json.loads(text).get("tool_choice") or {}).get("name")
+        except (ValueError, AttributeError):
+            pass
+    return hashlib.sha256(text.encode()).hexdigest(), tool
+
+
+def _route(method: str, url: str) -> tuple[str, str]:
+    # Query strings carry volatile values (since=<timestamp>), so they only rank candidates
+    return method, url.partition("?")[0]
+
+
+def _stored_headers(headers: Any, length: int) -> list[tuple[str, str]]:
+    kept = [(k, v) for k, v in headers.items() if k.lower() not in _DROPPED_HEADERS]
+    return kept + [("Content-Length", str(length))]
+
+
+class Cassette:
+    def __init__(self, path: Path, mode: str, speed: float = 1.0):
+        if mode not in CASSETTE_MODES:
+            raise ValueError(f"Modalità cassette non valida: {mode!r} (attese: {', '.join(CASSETTE_MODES)})")
+        self.path = Path(path)
+        self.mode = mode
+        self.speed = speed
+        self._lock = threading.Lock()
+        self._origin = time.monotonic()
+        self._interactions: list[Interaction] = []
+        self._pending: dict[tuple[str, str], list[Interaction]] = {}
+        self._last: dict[tuple[str, str], Interaction] = {}
+        self._blobs: set[str] = set()
+        if mode == "record":
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._zip = zipfile.ZipFile(self.path, "w")
+        else:
+            self._zip = zipfile.ZipFile(self.path, "r")
+            for line in self._zip.read(_INDEX_NAME).decode("utf-8").splitlines():
+                data = json.loads(line)
+                data["headers"] = [tuple(h) for h in data["headers"]]
+                interaction = Interaction(**data)
+                self._interactions.append(interaction)
+                self._pending.setdefault(_route(interaction.method, interaction.url), []).append(interaction)
+
+    # ── Recording ──────────────────────────────────────────────────────────────
+
+    def record(
+        self,
+        method: str,
+        url: str,
+        request_body: bytes,
+        status: int,
+        headers: Any,
+        content: bytes,
+        started: float,
+    ) -> list[tuple[str, str]]:
+        """Store one exchange; returns the headers as stored (and replayed)."""
+        request_sha256, tool = _request_digest(request_body)
+        stored = _stored_headers(headers, len(content))
+        blob = hashlib.sha256(content).hexdigest()
+        content_type = str(headers.get("Content-Type") or "")
+        with self._lock:
+            if blob not in self._blobs:
+                self._blobs.add(blob)
+                compression = zipfile.ZIP_STORED if content_type.startswith(("video/", "image/")) else zipfile.ZIP_DEFLATED
+                self._zip.writestr(f"bodies/{blob}", content, compress_type=compression)
+            self._interactions.append(Interaction(
+                method=method,
+                url=_redact(url),
+                request_sha256=request_sha256,
+                tool=tool,
+                status=status,
+                headers=stored,
+                body=blob,
+                started=round(started - self._origin, 4),
+                elapsed=round(time.monotonic() - started, 4),
+            ))
+        return stored
+
+    # ── Replay ─────────────────────────────────────────────────────────────────
+
+    def lookup(self, method: str, url: str, request_body: bytes) -> tuple[Interaction, bytes]:
+        url = _redact(url)
+        key = _route(method, url)
+        request_sha256, tool = _request_digest(request_body)
+        with self._lock:
+            pending = self._pending.get(key) or []
+            match = (
+                next((i for i in pending if i.url == url and i.request_sha256 == request_sha256), None)
+                or next((i for i in pending if i.request_sha256 == request_sha256), None)
+                or next((i for i in pending if tool and i.tool == tool), None)
+                or next((i for i in pending if i.url == url), None)
+                or (pending[0] if pending else self._last.get(key))
+            )
+            if match is None:
+                print(f"  [Cassette] Nessuna risposta registrata per {method} {url}")
+                raise CassetteMissError(f"{method} {url}")
+            if match in pending:
+                pending.remove(match)
+            self._last[key] = match
+            return match, self._zip.read(f"bodies/{match.body}")
+
+    def delay(self, interaction: Interaction) -> float:
+        return interaction.elapsed / self.speed if self.speed > 0 else 0.0
+
+    def close(self) -> None:
+        with self._lock:
+            if self._zip.fp is None:
+                return
+            if self.mode == "record":
+                index = "".join(json.dumps(asdict(i), ensure_ascii=False) + "\n" for i in self._interactions)
+                self._zip.writestr(_INDEX_NAME, index, compress_type=zipfile.ZIP_DEFLATED)
+                print(f"  [Cassette] {len(self._interactions)} richieste registrate in {self.path}")
+            self._zip.close()
+
+    # ── Transports ─────────────────────────────────────────────────────────────
+
+    def send_requests(self, request: requests.PreparedRequest, send: Callable[[], requests.Response]) -> requests.Response:
+        """Record or replay one exchange of a requests session (see clients._PooledAdapter)."""
+        body = request.body or b""
+        body = body.encode() if isinstance(body, str) else body
+        if self.mode == "replay":
+            interaction, content = self.lookup(request.method, request.url, body)
+            time.sleep(self.delay(interaction))
+            return _requests_response(request, interaction.status, interaction.headers, content)
+        started = time.monotonic()
+        response = send()
+        self.record(request.method, request.url, body, response.status_code, response.headers, response.content, started)
+        return response
+
+    def send_httpx(self, request: httpx.Request, send: Callable[[], httpx.Response]) -> httpx.Response:
+        if self.mode == "replay":
+            interaction, content = self.lookup(request.method, str(request.url), request.read())
+            time.sleep(self.delay(interaction))
+            return _response_class(request)(interaction.status, headers=interaction.headers, content=content)
+        started = time.monotonic()
+        response = send()
+        try:
+            raw = b"".join(response.iter_raw())
+        finally:
+            response.close()
+        return self._record_httpx(request, response, raw, started)
+
+    async def asend_httpx(self, request: httpx.Request, send: Callable[[], Any]) -> httpx.Response:
+        if self.mode == "replay":
+            interaction, content = self.lookup(request.method, str(request.url), await request.aread())
+            await asyncio.sleep(self.delay(interaction))
+            return _response_class(request)(interaction.status, headers=interaction.headers, content=content)
+        started = time.monotonic()
+        response = await send()
+        try:
+            raw = b"".join([chunk async for chunk in response.aiter_raw()])
+        finally:
+            await response.aclose()
+        return self._record_httpx(request, response, raw, started)
+
+    def _record_httpx(self, request: httpx.Request, response: httpx.Response, raw: bytes, started: float) -> httpx.Response:
+        # Decode (gzip, br) once, so every transport can replay the body as is
+        response_class = _response_class(request)
+        content = response_class(response.status_code, headers=response.headers, content=raw).read()
+        headers = self.record(request.method, str(request.url), request.read(), response.status_code,
+                              response.headers, content, started)
+        return response_class(response.status_code, headers=headers, content=content)
+
+
+def _response_class(request: Any) -> type:
+    # httpx or the Anthropic SDK's fork of it: answer with the request's own Response type
+    return sys.modules[type(request).__module__.partition(".")[0]].Response
+
+
+def _requests_response(request: requests.PreparedRequest, status: int, headers: list, content: bytes) -> requests.Response:
+    response = requests.Response()
+    response.status_code = status
+    response.reason = _REASONS.get(status, "")
+    response.headers = CaseInsensitiveDict(headers)
+    response.encoding = get_encoding_from_headers(response.headers)
+    response.raw = io.BytesIO(content)
+    response._content = content
+    response.url = request.url
+    response.request = request
+    return response
+
+
+class CassetteTransport:
+    """
+    Wraps the transport of an httpx client so that requests go through the active
+    cassette, if any. Duck-typed rather than an httpx.BaseTransport subclass: the
+    Anthropic SDK may run on its own httpx fork.
+    """
+
+    def __init__(self, transport: Any):
+        self._transport = transport
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        cassette = get_cassette()
+        if cassette is None:
+            return self._transport.handle_request(request)
+        return cassette.send_httpx(request, lambda: self._transport.handle_request(request))
+
+    def __enter__(self) -> "CassetteTransport":
+        self._transport.__enter__()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self._transport.__exit__(*exc_info)
+
+    def close(self) -> None:
+        self._transport.close()
+
+
+class AsyncCassetteTransport:
+    def __init__(self, transport: Any):
+        self._transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        cassette = get_cassette()
+        if cassette is None:
+            return await self._transport.handle_async_request(request)
+        return await cassette.asend_httpx(request, lambda: self._transport.handle_async_request(request))
+
+    async def __aenter__(self) -> "AsyncCassetteTransport":
+        await self._transport.__aenter__()
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self._transport.__aexit__(*exc_info)
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+
+def wrap_client(client: Any) -> Any:
+    """Route an httpx (or SDK fork) client, sync or async, through the cassette."""
+    wrapper = AsyncCassetteTransport if hasattr(client._transport, "handle_async_request") else CassetteTransport
+    client._transport = wrapper(client._transport)
+    return client
+
+
+# ── Process-wide cassette ──────────────────────────────────────────────────────
+
+_default_cassette: Optional[Cassette] = None
+_default_lock = threading.Lock()
+_configured = False
+
+
+def _latest_cassette() -> Optional[Path]:
+    candidates = sorted(CASSETTE_DIR.glob("*.zip"), key=lambda p: p.stat().st_mtime)
+    return candidates[-1] if candidates else None
+
+
+def _compress_polling(speed: float) -> None:
+    # Runway tasks replay in a fraction of their recorded time: poll them as much sooner
+    scale = max(1 / speed, _MIN_POLL_SCALE) if speed > 0 else _MIN_POLL_SCALE
+    for name in ("_FIRST_POLL_SECONDS", "_MIN_INTERVAL_SECONDS", "_MAX_INTERVAL_SECONDS"):
+        setattr(runway_poller, name, getattr(runway_poller, name) * scale)
+
+
+def _activate(path: Optional[Path], mode: str, speed: float) -> Cassette:
+    global _default_cassette, _configured
+    if _default_cassette is not None:
+        _default_cassette.close()
+    if path is None:
+        path = CASSETTE_DIR / time.strftime("%Y%m%d-%H%M%S.zip") if mode == "record" else _latest_cassette()
+        if path is None:
+            raise FileNotFoundError(f"Nessuna cassette da riprodurre in {CASSETTE_DIR}")
+    _default_cassette = Cassette(path, mode, speed)
+    _configured = True
+    if mode == "replay" and speed != 1:
+        _compress_polling(speed)
+    print(f"  [Cassette] {'Registrazione' if mode == 'record' else 'Riproduzione'}: {_default_cassette.path}")
+    atexit.register(_default_cassette.close)
+    return _default_cassette
+
+
+def use_cassette(path: Optional[Path], mode: str, speed: float = 1.0) -> Cassette:
+    """Route every upstream request of the process through a cassette (closed at exit)."""
+    with _default_lock:
+        return _activate(path, mode, speed)
+
+
+def get_cassette() -> Optional[Cassette]:
+    """The active cassette, or None (SOCIAL_AGENT_CASSETTE=off, the default)."""
+    if _configured:
+        return _default_cassette
+    mode = (os.getenv("SOCIAL_AGENT_CASSETTE") or "off").lower()
+    if mode not in CASSETTE_MODES:
+        return None
+    with _default_lock:
+        if not _configured:
+            path = os.getenv("SOCIAL_AGENT_CASSETTE_PATH")
+            _activate(Path(path) if path else None, mode, float(os.getenv("SOCIAL_AGENT_CASSETTE_SPEED") or 1))
+        return _default_cassette
+
+
+# ── CLI ────────────────────────────────────────────────────────────────────────
+
+def summary(path: Path) -> dict[str, Any]:
+    cassette = Cassette(path, "replay")
+    try:
+        hosts: dict[str, dict[str, Any]] = {}
+        for i in cassette._interactions:
+            host = re.sub(r"^https?://([^/]+).*", r"\1", i.url)
+            entry = hosts.setdefault(host, {"requests": 0, "errors": 0, "bytes": 0})
+            entry["requests"] += 1
+            entry["errors"] += i.status >= 400
+            entry["bytes"] += cassette._zip.getinfo(f"bodies/{i.body}").file_size
+        duration = max((i.started + i.elapsed for i in cassette._interactions), default=0.0)
+        return {"path": str(path), "requests": len(cassette._interactions),
+                "recorded_seconds": round(duration, 1), "hosts": hosts}
+    finally:
+        cassette.close()
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Mostra il contenuto di una cassette registrata.")
+    parser.add_argument("path", nargs="?", help=f"File della cassette (default: la più recente in {CASSETTE_DIR}).")
+    args = parser.parse_args(argv)
+    path = Path(args.path) if args.path else _latest_cassette()
+    if path is None:
+        print(f"  [Cassette] Nessuna cassette in {CASSETTE_DIR}")
+        return 1
+    info = summary(path)
+    print(f"  [Cassette] {info['path']}: {info['requests']} richieste, {info['recorded_seconds']}s registrati")
+    for host, entry in sorted(info["hosts"].items()):
+        print(f"  [Cassette]   {host}: {entry['requests']} richieste, {entry['errors']} errori, "
+              f"{entry['bytes'] / 1024:.0f} KB")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
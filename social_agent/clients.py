@@ -0,0 +1,259 @@
+"""
+Process-wide registry of pooled upstream clients.
+
+Every agent shares one Anthropic client (plus one async client per event loop)
+and one keep-alive HTTP session per upstream host, so TLS handshakes are paid
+once per connection instead of once per tool call. connection_stats() reports
+how many requests reused a pooled connection. Every transport goes through
+the record/replay cassette when one is active (cassette.py).
+"""
+import asyncio
+import os
+import threading
+import time
+import weakref
+from typing import TYPE_CHECKING, Any, Optional
+from urllib.parse import urlsplit
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+from .cassette import get_cassette, wrap_client
+from .tracing import child_span, http_attributes, record_span
+
+if TYPE_CHECKING:
+    import anthropic
+
+_POOL_MAXSIZE = 16
+_HTTPX_LIMITS = httpx.Limits(max_connections=32, max_keepalive_connections=_POOL_MAXSIZE)
+
+_lock = threading.Lock()
+_stats: dict[str, dict[str, int]] = {}
+_sessions: dict[str, requests.Session] = {}
+_anthropic_client: Optional["anthropic.Anthropic"] = None
+# Async clients are bound to the loop they were first used on
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict[str, Any]]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+# ── Connection statistics ──────────────────────────────────────────────────────
+
+def _record(host: Optional[str], requests_sent: int = 0, connections: int = 0) -> None:
+    with _lock:
+        entry = _stats.setdefault(host or "?", {"requests": 0, "new_connections": 0})
+        entry["requests"] += requests_sent
+        entry["new_connections"] += connections
+
+
+def connection_stats() -> dict[str, dict[str, Any]]:
+    """Requests, new connections and reuse ratio per upstream host."""
+    with _lock:
+        snapshot = {host: dict(entry) for host, entry in _stats.items()}
+    for entry in snapshot.values():
+        reused = max(entry["requests"] - entry["new_connections"], 0)
+        entry["reused_connections"] = reused
+        entry["reuse_ratio"] = round(reused / entry["requests"], 3) if entry["requests"] else 0.0
+    return snapshot
+
+
+def print_connection_stats() -> None:
+    for host, entry in sorted(connection_stats().items()):
+        print(
+            f"  [Clients] {host}: {entry['requests']} richieste, "
+            f"{entry['new_connections']} nuove connessioni "
+            f"(riuso {entry['reuse_ratio']:.0%})"
+        )
+
+
+# ── requests (Meta, Runway, video downloads) ──────────────────────────────────
+
+class _CountingHTTPConnectionPool(HTTPConnectionPool):
+    def _new_conn(self):
+        _record(self.host, connections=1)
+        return super()._new_conn()
+
+
+class _CountingHTTPSConnectionPool(HTTPSConnectionPool):
+    def _new_conn(self):
+        _record(self.host, connections=1)
+        return super()._new_conn()
+
+
+def _content_length(headers: Any) -> Optional[int]:
+    value = headers.get("Content-Length")
+    return int(value) if value and value.isdigit() else None
+
+
+class _PooledAdapter(HTTPAdapter):
+    """HTTPAdapter that counts requests and newly opened connections per host, and traces each request."""
+
+    def init_poolmanager(self, *args: Any, **kwargs: Any) -> None:
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _CountingHTTPConnectionPool,
+            "https": _CountingHTTPSConnectionPool,
+        }
+
+    def send(self, request: requests.PreparedRequest, **kwargs: Any) -> requests.Response:
+        _record(urlsplit(request.url).hostname, requests_sent=1)
+        name, attributes = http_attributes(request.method, request.url)
+        with child_span(name, **attributes) as traced:
+            cassette = get_cassette()
+            if cassette is None:
+                response = super().send(request, **kwargs)
+            else:
+                response = cassette.send_requests(request, lambda: super(_PooledAdapter, self).send(request, **kwargs))
+            if traced is not None:
+                traced.set(**{
+                    "http.status_code": response.status_code,
+                    "http.request_content_length": _content_length(request.headers),
+                    "http.response_content_length": _content_length(response.headers),
+                })
+            return response
+
+
+def get_http_session(host: str) -> requests.Session:
+    """Shared keep-alive session for one upstream host."""
+    with _lock:
+        session = _sessions.get(host)
+        if session is None:
+            session = requests.Session()
+            adapter = _PooledAdapter(pool_connections=1, pool_maxsize=_POOL_MAXSIZE)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _sessions[host] = session
+        return session
+
+
+def session_for(url: str) -> requests.Session:
+    """Shared session for the host of `url` (e.g. a Runway CDN download link)."""
+    return get_http_session(urlsplit(url).hostname or "")
+
+
+# ── httpx (Anthropic, async Meta/Runway) ───────────────────────────────────────
+
+def _count_connect(name: str, info: dict) -> None:
+    if name == "connection.connect_tcp.complete":
+        _record(info.get("host"), connections=1)
+
+
+async def _acount_connect(name: str, info: dict) -> None:
+    _count_connect(name, info)
+
+
+def _on_request(request: httpx.Request) -> None:
+    _record(request.url.host, requests_sent=1)
+    host = request.url.host
+    request.extensions["trace"] = lambda name, info: _count_connect(name, {"host": host})
+    request.extensions["social_agent.started_ns"] = time.time_ns()
+
+
+async def _aon_request(request: httpx.Request) -> None:
+    _record(request.url.host, requests_sent=1)
+    host = request.url.host
+
+    async def _trace(name: str, info: dict) -> None:
+        await _acount_connect(name, {"host": host})
+
+    request.extensions["trace"] = _trace
+    request.extensions["social_agent.started_ns"] = time.time_ns()
+
+
+def _on_response(response: httpx.Response) -> None:
+    # Hooks run in the caller's context, so the span nests under the caller's current span
+    request = response.request
+    name, attributes = http_attributes(request.method, request.url)
+    record_span(
+        name,
+        request.extensions.get("social_agent.started_ns", time.time_ns()),
+        **attributes,
+        **{
+            "http.status_code": response.status_code,
+            "http.request_content_length": _content_length(request.headers),
+            "http.response_content_length": _content_length(response.headers),
+        },
+    )
+
+
+async def _aon_response(response: httpx.Response) -> None:
+    _on_response(response)
+
+
+def get_anthropic_client() -> "anthropic.Anthropic":
+    """The process-wide Anthropic client (one connection pool for all agents)."""
+    global _anthropic_client
+    with _lock:
+        if _anthropic_client is None:
+            # The SDK takes over a second to import: only pay for it once a client is needed
+            import anthropic
+
+            _anthropic_client = anthropic.Anthropic(
+                api_key=os.getenv("ANTHROPIC_API_KEY", ""),
+                # Retries happen in resilience.call_with_retry, not inside the SDK
+                max_retries=0,
+                http_client=wrap_client(anthropic.DefaultHttpxClient(
+                    limits=_HTTPX_LIMITS,
+                    event_hooks={"request": [_on_request], "response": [_on_response]},
+                )),
+            )
+        return _anthropic_client
+
+
+def _loop_clients() -> dict[str, Any]:
+    loop = asyncio.get_running_loop()
+    with _lock:
+        clients = _async_clients.get(loop)
+        if clients is None:
+            clients = {}
+            _async_clients[loop] = clients
+        return clients
+
+
+def get_async_anthropic_client() -> "anthropic.AsyncAnthropic":
+    """The AsyncAnthropic client of the running event loop."""
+    clients = _loop_clients()
+    if "anthropic" not in clients:
+        import anthropic
+
+        clients["anthropic"] = anthropic.AsyncAnthropic(
+            api_key=os.getenv("ANTHROPIC_API_KEY", ""),
+            # Retries happen in resilience.call_with_retry, not inside the SDK
+            max_retries=0,
+            http_client=wrap_client(anthropic.DefaultAsyncHttpxClient(
+                limits=_HTTPX_LIMITS,
+                event_hooks={"request": [_aon_request], "response": [_aon_response]},
+            )),
+        )
+    return clients["anthropic"]
+
+
+def get_async_http_client(host: str) -> httpx.AsyncClient:
+    """Shared keep-alive httpx.AsyncClient for one upstream host on the running loop."""
+    clients = _loop_clients()
+    key = f"http:{host}"
+    if key not in clients:
+        clients[key] = wrap_client(httpx.AsyncClient(
+            limits=_HTTPX_LIMITS,
+            timeout=60,
+            event_hooks={"request": [_aon_request], "response": [_aon_response]},
+        ))
+    return clients[key]
+
+
+def async_client_for(url: str) -> httpx.AsyncClient:
+    return get_async_http_client(urlsplit(url).hostname or "")
+
+
+async def aclose_async_clients() -> None:
+    """Close the async clients of the running loop (call once at the end of a batch)."""
+    loop = asyncio.get_running_loop()
+    with _lock:
+        clients = _async_clients.pop(loop, {})
+    for key, client in clients.items():
+        if key == "anthropic":
+            await client.close()
+        else:
+            await client.aclose()
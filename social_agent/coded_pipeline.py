@@ -0,0 +1,295 @@
+"""
+Coded pipeline: the 9-step process of SYSTEM_PROMPT as a state machine.
+
+The agentic loop asks the orchestrator (Opus, adaptive thinking) for every
+transition, although the order of the tools never changes. In "coded" mode
+the next tool call is decided here instead, from the last tool result:
+
+    get_recent_posts → draft (LLM) → create_video_concept_with_vc
+    → generate_video_with_runway ⇄ review_video_with_spielbierg (max 3)
+    → review_with_smcc → request_approval → publish_…
+                                        └→ rejected: revise (LLM) → concept…
+
+Only two steps call Claude directly: writing the drafts and rewriting a
+draft from the reviewer's feedback (one forced submit_post_drafts call each,
+no thinking). The tool calls themselves go through the agent's usual
+dispatch as synthetic tool_use blocks, so checkpoints, resume, queue
+approvals, tracing and usage accounting work exactly as in agentic mode.
+
+Selected per run with SocialAgent(pipeline_mode="coded"), the batch
+--pipeline flag or SOCIAL_AGENT_PIPELINE=coded (default "agentic").
+"""
+import json
+import os
+import uuid
+from dataclasses import dataclass
+from typing import Any, Optional
+
+from .compaction import _SUMMARY_HEADER
+from .llm import cached_system, cached_tools
+from .models import Platform, PostDraft
+from .prompts import DRAFT_SYSTEM_PROMPT
+
+PIPELINE_MODES = ("agentic", "coded")
+# Tool calls + draft/revise calls of one run; a post takes 7-11 steps
+MAX_PIPELINE_STEPS = 60
+# Same limit the orchestrator is told about in SYSTEM_PROMPT
+MAX_SPIELBIERG_ATTEMPTS = 3
+
+DRAFT_TOOLS: list[dict] = [
+    {
+        "name": "submit_post_drafts",
+        "description": "Invia le bozze dei post social richiesti dal brief, una per piattaforma.",
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "posts": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "platform": {"type": "string", "enum": ["instagram", "facebook"]},
+                            "caption": {"type": "string", "description": "Testo del post, senza hashtag."},
+                            "hashtags": {
+                                "type": "array",
+                                "items": {"type": "string"},
+                                "description": "Lista di hashtag (senza #).",
+                            },
+                            "content_theme": {
+                                "type": "string",
+                                "description": (
+                                    "Tema principale del contenuto per il Video Creator, "
+                                    "es. 'ricetta bowl con barbabietola'."
+                                ),
+                            },
+                        },
+                        "required": ["platform", "caption", "hashtags", "content_theme"],
+                    },
+                },
+            },
+            "required": ["posts"],
+        },
+    }
+]
+
+_CACHED_DRAFT_SYSTEM = cached_system(DRAFT_SYSTEM_PROMPT)
+_CACHED_DRAFT_TOOLS = cached_tools(DRAFT_TOOLS)
+
+
+def resolve_pipeline_mode(mode: Optional[str] = None) -> str:
+    """Explicit value, then SOCIAL_AGENT_PIPELINE, then "agentic"."""
+    mode = (mode or os.getenv("SOCIAL_AGENT_PIPELINE") or "agentic").lower()
+    if mode not in PIPELINE_MODES:
+        raise ValueError(f"Modalità di pipeline sconosciuta: {mode}")
+    return mode
+
+
+@dataclass
+class PipelineStep:
+    """What the agent does next: run a tool, make one draft/revise call, or finish."""
+    kind: str                           # "tool", "llm" or "done"
+    block: Optional[dict] = None        # tool: synthetic tool_use block
+    label: str = ""                     # llm: caller label for usage accounting
+    request: Optional[dict] = None      # llm: messages.create arguments
+    answers: Optional[str] = None       # llm: tool_use id of the result it responds to
+    text: str = ""                      # done: final answer of the run
+
+
+def _tool_step(name: str, tool_input: dict[str, Any]) -> PipelineStep:
+    return PipelineStep("tool", block={
+        "type": "tool_use", "id": f"coded_{uuid.uuid4().hex[:20]}", "name": name, "input": tool_input,
+    })
+
+
+def _field(block: Any, name: str) -> Any:
+    return block.get(name) if isinstance(block, dict) else getattr(block, name, None)
+
+
+def _last_tool_call(messages: list[dict]) -> Optional[tuple[str, str, dict, dict]]:
+    """(tool_use id, tool name, input, parsed result) of the most recent completed tool call."""
+    if len(messages) < 2 or messages[-1]["role"] != "user" or isinstance(messages[-1]["content"], str):
+        return None
+    uses = [b for b in messages[-2]["content"] if _field(b, "type") == "tool_use"]
+    results = {_field(b, "tool_use_id"): b for b in messages[-1]["content"] if _field(b, "type") == "tool_result"}
+    for use in reversed(uses):
+        result = results.get(_field(use, "id"))
+        if result is None:
+            continue
+        try:
+            payload = json.loads(_field(result, "content") or "{}")
+        except (TypeError, ValueError):
+            payload = {}
+        return _field(use, "id"), _field(use, "name"), _field(use, "input") or {}, payload
+    return None
+
+
+class CodedPipeline:
+    """
+    Decides the next step of a coded run. Its only state is `plan` (the drafts,
+    the post being worked on, published results), checkpointed with the agent's
+    state; everything else is read from the last tool result in the conversation.
+    """
+
+    def __init__(self, plan: Optional[dict[str, Any]] = None):
+        self.plan = plan
+
+    def next_step(
+        self,
+        messages: list[dict],
+        approved_draft: Optional[PostDraft] = None,
+        spielbierg_attempts: int = 0,
+    ) -> PipelineStep:
+        last = _last_tool_call(messages)
+        if last is None:
+            return _tool_step("get_recent_posts", {"platforms": ["instagram", "facebook"], "limit": 5})
+        use_id, name, tool_input, result = last
+
+        if name == "get_recent_posts":
+            if self.plan is None:
+                return self._draft_step(messages, use_id, result)
+            return self._concept_step()
+
+        post = self.current_post
+        if name == "create_video_concept_with_vc":
+            return _tool_step("generate_video_with_runway", {"platform": post["platform"]})
+
+        if name == "generate_video_with_runway":
+            if result.get("status") == "succeeded":
+                return _tool_step("review_video_with_spielbierg", {
+                    "caption": post["caption"], "hashtags": post["hashtags"],
+                })
+            return self._smcc_step()     # failed or skipped: go on without (another) video
+
+        if name == "review_video_with_spielbierg":
+            if result.get("status") == "rejected" and spielbierg_attempts < MAX_SPIELBIERG_ATTEMPTS:
+                return _tool_step("generate_video_with_runway", {
+                    "platform": post["platform"],
+                    "additional_prompt_notes": result.get("improved_prompt_notes") or "",
+                })
+            return self._smcc_step()
+
+        if name == "review_with_smcc":
+            caption = result.get("revised_caption") or post["caption"]
+            hashtags = result.get("revised_hashtags") or post["hashtags"]
+            return _tool_step("request_approval", {
+                "platform": post["platform"], "caption": caption, "hashtags": hashtags,
+            })
+
+        if name == "request_approval":
+            if result.get("status") == "rejected":
+                if self.plan.get("answered") == use_id:
+                    return self._concept_step()      # resumed after the revision was saved
+                return self._revise_step(messages, use_id, result.get("feedback") or "", tool_input)
+            if approved_draft is None:
+                return PipelineStep("done", text="Pipeline interrotta: approvazione senza bozza approvata.")
+            if approved_draft.platform == Platform.FACEBOOK:
+                return _tool_step("publish_facebook_post", {"message": approved_draft.full_text})
+            return _tool_step("publish_instagram_post", {
+                "caption": approved_draft.full_text, "image_url": approved_draft.image_url,
+            })
+
+        if name in ("publish_instagram_post", "publish_facebook_post"):
+            if self.plan.get("answered") != use_id:
+                self.plan["answered"] = use_id
+                self.plan["published"].append({"platform": self.current_post["platform"], **result})
+                self.plan["index"] += 1
+            if self.plan["index"] < len(self.plan["posts"]):
+                return self._concept_step()
+            return PipelineStep("done", text=self._summary())
+
+        return PipelineStep("done", text=f"Pipeline interrotta: tool inatteso {name}.")
+
+    def apply(self, step: PipelineStep, response: Any) -> None:
+        """Store the drafts returned by a draft/revise call."""
+        posts = [dict(post) for post in _submitted_posts(response)]
+        for post in posts:
+            post["platform"] = Platform(post["platform"]).value
+            post.setdefault("hashtags", [])
+            post.setdefault("content_theme", post["caption"][:80])
+        if not posts:
+            raise ValueError("Nessuna bozza restituita da submit_post_drafts.")
+        if self.plan is None:
+            self.plan = {"posts": posts, "index": 0, "published": [], "answered": step.answers}
+        else:
+            self.plan["posts"][self.plan["index"]] = posts[0]
+            self.plan["answered"] = step.answers
+        titles = ", ".join(f"{p['platform']}: {p['content_theme']}" for p in posts)
+        print(f"  [Pipeline] Bozza pronta ({titles})")
+
+    @property
+    def current_post(self) -> dict[str, Any]:
+        return self.plan["posts"][self.plan["index"]]
+
+    # ── Steps ──────────────────────────────────────────────────────────────────
+
+    def _concept_step(self) -> PipelineStep:
+        post = self.current_post
+        return _tool_step("create_video_concept_with_vc", {
+            "platform": post["platform"], "caption": post["caption"], "hashtags": post["hashtags"],
+            "content_theme": post["content_theme"],
+        })
+
+    def _smcc_step(self) -> PipelineStep:
+        post = self.current_post
+        return _tool_step("review_with_smcc", {
+            "platform": post["platform"], "caption": post["caption"], "hashtags": post["hashtags"],
+        })
+
+    def _draft_step(self, messages: list[dict], use_id: str, recent: dict) -> PipelineStep:
+        content = (
+            f"## Brief\n{_brief(messages)}\n\n"
+            f"## Post recenti\n{json.dumps(recent.get('posts', []), ensure_ascii=False)}\n\n"
+            "Scrivi le bozze usando il tool submit_post_drafts."
+        )
+        return PipelineStep("llm", label="Draft", request=_draft_request(content), answers=use_id)
+
+    def _revise_step(self, messages: list[dict], use_id: str, feedback: str, shown: dict) -> PipelineStep:
+        post = self.current_post
+        content = (
+            f"## Brief\n{_brief(messages)}\n\n"
+            f"## Bozza rifiutata ({shown.get('platform', post['platform'])})\n"
+            f"{shown.get('caption', post['caption'])}\n\n"
+            f"Hashtag: {' '.join(shown.get('hashtags') or post['hashtags'])}\n"
+            f"Tema: {post['content_theme']}\n\n"
+            f"## Feedback dell'utente\n{feedback}\n\n"
+            "Riscrivi questa bozza (un solo post, stessa piattaforma) usando il tool submit_post_drafts."
+        )
+        print(f"  [Pipeline] Bozza rifiutata, riscrittura con il feedback: {feedback}")
+        return PipelineStep("llm", label="Revise", request=_draft_request(content), answers=use_id)
+
+    def _summary(self) -> str:
+        lines = [f"Pipeline completata: {len(self.plan['published'])} post."]
+        for result in self.plan["published"]:
+            if result.get("success"):
+                outcome = result.get("post_url") or result.get("post_id")
+            else:
+                outcome = f"errore — {result.get('error')}"
+            lines.append(f"- {result['platform']}: {outcome}")
+        return "\n".join(lines)
+
+
+def _brief(messages: list[dict]) -> str:
+    first = messages[0]["content"]
+    if isinstance(first, str):
+        return first
+    # Without the summary of compacted cycles (see compaction)
+    texts = (_field(b, "text") or "" for b in first if _field(b, "type") == "text")
+    return "\n".join(text for text in texts if not text.startswith(_SUMMARY_HEADER))
+
+
+def _draft_request(content: str) -> dict:
+    return {
+        "model": "claude-opus-4-6",
+        "max_tokens": 4000,
+        "system": _CACHED_DRAFT_SYSTEM,
+        "tools": _CACHED_DRAFT_TOOLS,
+        "tool_choice": {"type": "tool", "name": "submit_post_drafts"},
+        "messages": [{"role": "user", "content": content}],
+    }
+
+
+def _submitted_posts(response: Any) -> list[dict]:
+    for block in response.content:
+        if _field(block, "type") == "tool_use" and _field(block, "name") == "submit_post_drafts":
+            return list((_field(block, "input") or {}).get("posts") or [])
+    return []
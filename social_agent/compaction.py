@@ -0,0 +1,164 @@
+"""
+Conversation-history compaction for long SocialAgent loops.
+
+Past a token threshold, finished post cycles (concept → video → review →
+approval → publish) are replaced by a short summary attached to the first user
+message. Compaction only ever happens at a cycle boundary: right after a publish
+result, successful or not, or a rejected draft, which restarts the cycle with a
+new draft anyway. Between two boundaries the history is append-only, so the
+cached prompt prefix stays byte-identical from one turn to the next.
+"""
+import json
+from typing import Any, Optional
+
+# Rough chars-per-token ratio for Italian prose/JSON — good enough for a threshold check
+_CHARS_PER_TOKEN = 4
+# Images are billed by size; a flat estimate keeps the check cheap
+_IMAGE_TOKENS = 1600
+
+_PUBLISH_TOOLS = ("publish_instagram_post", "publish_facebook_post")
+_SUMMARY_HEADER = "## Post già completati in questa sessione (cronologia compattata)"
+_SUMMARY_FOOTER = "Non ripetere questi post: prosegui con quelli ancora da fare."
+
+
+def _field(block: Any, name: str) -> Any:
+    """Read a field from a content block given as dict or as SDK object."""
+    if isinstance(block, dict):
+        return block.get(name)
+    return getattr(block, name, None)
+
+
+def _blocks(message: dict) -> list:
+    content = message["content"]
+    return [{"type": "text", "text": content}] if isinstance(content, str) else list(content)
+
+
+def estimate_tokens(messages: list[dict]) -> int:
+    """Cheap token estimate of a conversation (no API call)."""
+    chars = 0
+    images = 0
+    for message in messages:
+        for block in _blocks(message):
+            block_type = _field(block, "type")
+            if block_type == "text":
+                chars += len(_field(block, "text") or "")
+            elif block_type == "thinking":
+                chars += len(_field(block, "thinking") or "")
+            elif block_type == "tool_use":
+                chars += len(json.dumps(_field(block, "input") or {}, ensure_ascii=False))
+            elif block_type == "tool_result":
+                content = _field(block, "content")
+                chars += len(content) if isinstance(content, str) else len(json.dumps(content, default=str))
+            elif block_type == "image":
+                images += 1
+    return chars // _CHARS_PER_TOKEN + images * _IMAGE_TOKENS
+
+
+def _tool_names(messages: list[dict]) -> dict[str, tuple[str, dict]]:
+    """Map tool_use_id → (tool name, tool input) over the whole conversation."""
+    names: dict[str, tuple[str, dict]] = {}
+    for message in messages:
+        if message["role"] != "assistant":
+            continue
+        for block in _blocks(message):
+            if _field(block, "type") == "tool_use":
+                names[_field(block, "id")] = (_field(block, "name"), _field(block, "input") or {})
+    return names
+
+
+def _load(content: Any) -> dict:
+    try:
+        data = json.loads(content) if isinstance(content, str) else {}
+    except ValueError:
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def _is_rejection(name: str, result: dict) -> bool:
+    return name == "request_approval" and result.get("status") == "rejected"
+
+
+def _ends_cycle(message: dict, tools: dict[str, tuple[str, dict]]) -> bool:
+    """Whether a message carries a publish result (any outcome) or a rejected draft."""
+    if message["role"] != "user" or isinstance(message["content"], str):
+        return False
+    for block in message["content"]:
+        if _field(block, "type") != "tool_result":
+            continue
+        name, _ = tools.get(_field(block, "tool_use_id"), ("", {}))
+        if name in _PUBLISH_TOOLS or _is_rejection(name, _load(_field(block, "content"))):
+            return True
+    return False
+
+
+def _summarize_cycles(messages: list[dict], tools: dict[str, tuple[str, dict]]) -> list[str]:
+    """One line per publish or rejected draft found in the given messages."""
+    lines: list[str] = []
+    concept_title: Optional[str] = None
+    for message in messages:
+        if message["role"] != "user" or isinstance(message["content"], str):
+            continue
+        for block in message["content"]:
+            if _field(block, "type") != "tool_result":
+                continue
+            name, tool_input = tools.get(_field(block, "tool_use_id"), ("", {}))
+            result = _load(_field(block, "content"))
+            if name == "create_video_concept_with_vc" and result.get("title"):
+                concept_title = result["title"]
+            elif name in _PUBLISH_TOOLS:
+                platform = "instagram" if name == "publish_instagram_post" else "facebook"
+                text = tool_input.get("caption") or tool_input.get("message") or ""
+                head = " ".join(text.split())[:160]
+                outcome = (
+                    f"pubblicato (id {result.get('post_id')})"
+                    if result.get("success")
+                    else f"pubblicazione fallita ({result.get('error')})"
+                )
+                video = f" — video concept «{concept_title}»" if concept_title else ""
+                lines.append(f"- {platform}: {outcome} — «{head}…»{video}")
+            elif _is_rejection(name, result):
+                head = " ".join((tool_input.get("caption") or "").split())[:160]
+                feedback = " ".join((result.get("feedback") or "").split())[:160]
+                lines.append(
+                    f"- {tool_input.get('platform', '')}: bozza rifiutata (feedback: {feedback}) — «{head}…»"
+                )
+    return lines
+
+
+def _summary_lines(message: dict) -> tuple[list, list[str]]:
+    """Blocks of the first user message without the summary, and the lines of a previous summary."""
+    blocks: list = []
+    lines: list[str] = []
+    for block in _blocks(message):
+        text = _field(block, "text") or ""
+        if _field(block, "type") == "text" and text.startswith(_SUMMARY_HEADER):
+            lines += [line for line in text.splitlines() if line.startswith("- ")]
+        else:
+            blocks.append(block)
+    return blocks, lines
+
+
+def compact_history(messages: list[dict], threshold_tokens: int) -> list[dict]:
+    """
+    Return a compacted copy of the conversation if it exceeds threshold_tokens
+    and its last message ends a cycle (a publish result or a rejected draft),
+    otherwise the conversation unchanged.
+
+    Everything between the brief and that turn is folded into the summary on the
+    first user message; the turn and its result are kept, so the run continues
+    from them. Message alternation and tool_use / tool_result
+    pairing are preserved; stored SDK blocks are never mutated.
+    """
+    # Brief, at least one folded exchange, then the boundary exchange that is kept
+    if len(messages) < 5 or estimate_tokens(messages) <= threshold_tokens:
+        return messages
+
+    tools = _tool_names(messages)
+    if not _ends_cycle(messages[-1], tools):
+        return messages
+
+    blocks, lines = _summary_lines(messages[0])
+    lines += _summarize_cycles(messages[1:-2], tools)
+    summary = "\n".join([_SUMMARY_HEADER, *lines, _SUMMARY_FOOTER])
+    first = {**messages[0], "content": blocks + [{"type": "text", "text": summary}]}
+    return [first, *messages[-2:]]
@@ -0,0 +1,486 @@
+"""
+Local stand-ins for the Anthropic Messages API, Runway and the Graph API.
+
+Each fake is a small threaded HTTP server on 127.0.0.1 speaking just enough of
+its upstream's protocol for the pipeline to run end to end offline:
+
+- FakeAnthropic answers /v1/messages. The orchestrator follows a scripted tool
+  sequence (one tool per turn, then end_turn). VC, SMCC and Spielbierg get a
+  schema-valid forced tool call. Token counts follow the request size and
+  the profile.
+- FakeRunway creates text_to_video tasks that go PENDING → RUNNING → SUCCEEDED
+  on a timer, and serves a small synthetic MP4 as their output.
+- FakeGraph answers batch requests (recent posts, IG container + publish),
+  feed posts and content_publishing_limit, with X-App-Usage headers.
+
+Latency, jitter and injected errors come from an UpstreamProfile. Random
+draws use a seeded generator, so a run is repeatable.
+"""
+import json
+import random
+import tempfile
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Optional
+from urllib.parse import parse_qs, urlsplit
+
+# One pipeline cycle, as prescribed by SYSTEM_PROMPT
+DEFAULT_SCRIPT = (
+    "get_recent_posts",
+    "create_video_concept_with_vc",
+    "generate_video_with_runway",
+    "review_video_with_spielbierg",
+    "review_with_smcc",
+    "request_approval",
+    "publish_instagram_post",
+)
+
+_CAPTION = "Barbabietola arrosto in 10 minuti: energia viola per tutta la settimana 💜"
+_HASHTAGS = ["plantbased", "barbabietola", "ricettaveloce"]
+
+
+@dataclass
+class UpstreamProfile:
+    latency_ms: float = 20.0
+    jitter_ms: float = 5.0
+    error_rate: float = 0.0             # share of requests answered with error_status
+    error_status: int = 503
+    retry_after_seconds: Optional[float] = 0.2
+
+
+@dataclass
+class AnthropicProfile(UpstreamProfile):
+    latency_ms: float = 150.0           # time to first token
+    ms_per_output_token: float = 0.2    # generation speed (real Opus: ~15-30 ms)
+    output_tokens: dict[str, int] = field(default_factory=lambda: {
+        "orchestrator": 300, "draft": 600, "vc": 1500, "smcc": 900, "spielbierg": 400,
+    })
+    thinking_chars: int = 800
+    cache_hit_ratio: float = 0.8        # share of input read from the prompt cache when breakpoints are set
+
+
+@dataclass
+class RunwayProfile(UpstreamProfile):
+    pending_seconds: float = 0.5
+    task_seconds: float = 2.0           # creation → SUCCEEDED
+    failure_rate: float = 0.0           # tasks that end FAILED
+
+
+class _FakeServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, handler: type, profile: UpstreamProfile, seed: int):
+        super().__init__(("127.0.0.1", 0), handler)
+        self.profile = profile
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+        self.requests: dict[str, int] = {}
+        self.errors_injected = 0
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_port}"
+
+    def random(self) -> float:
+        with self._rng_lock:
+            return self._rng.random()
+
+    def count(self, route: str) -> None:
+        with self._rng_lock:
+            self.requests[route] = self.requests.get(route, 0) + 1
+
+    def start(self) -> "_FakeServer":
+        threading.Thread(target=self.serve_forever, name=f"fake-{type(self).__name__}", daemon=True).start()
+        return self
+
+    def stats(self) -> dict[str, Any]:
+        with self._rng_lock:
+            return {"requests": dict(self.requests), "errors_injected": self.errors_injected}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"       # keep-alive, like the real upstreams
+    server: _FakeServer
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+    def _body(self) -> bytes:
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def _delay(self, extra_ms: float = 0.0) -> None:
+        profile = self.server.profile
+        jitter = (self.server.random() * 2 - 1) * profile.jitter_ms
+        time.sleep(max(profile.latency_ms + jitter + extra_ms, 0.0) / 1000)
+
+    def _inject_error(self) -> bool:
+        profile = self.server.profile
+        if not profile.error_rate or self.server.random() >= profile.error_rate:
+            return False
+        with self.server._rng_lock:
+            self.server.errors_injected += 1
+        headers = {}
+        if profile.retry_after_seconds is not None:
+            headers["Retry-After"] = f"{profile.retry_after_seconds:g}"
+        self._send_json(profile.error_status, {"error": {"type": "overloaded_error", "message": "injected"}}, headers)
+        return True
+
+    def _send_json(self, status: int, payload: Any, headers: Optional[dict[str, str]] = None) -> None:
+        self._send(status, json.dumps(payload).encode(), "application/json", headers)
+
+    def _send(self, status: int, body: bytes, content_type: str, headers: Optional[dict[str, str]] = None) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+# ── Anthropic ──────────────────────────────────────────────────────────────────
+
+def _tool_input(tool: str, retry: bool) -> dict[str, Any]:
+    inputs: dict[str, dict[str, Any]] = {
+        "get_recent_posts": {"platforms": ["instagram", "facebook"], "limit": 5},
+        "create_video_concept_with_vc": {
+            "platform": "instagram", "caption": _CAPTION, "hashtags": _HASHTAGS, "content_theme": "ricetta veloce",
+        },
+        "generate_video_with_runway": {"platform": "instagram"},
+        "review_video_with_spielbierg": {"caption": _CAPTION, "hashtags": _HASHTAGS},
+        "review_with_smcc": {"platform": "instagram", "caption": _CAPTION, "hashtags": _HASHTAGS},
+        "request_approval": {"platform": "instagram", "caption": _CAPTION, "hashtags": _HASHTAGS},
+        "publish_instagram_post": {"caption": _CAPTION},
+        "publish_facebook_post": {"message": _CAPTION},
+    }
+    payload = dict(inputs[tool])
+    if retry and tool == "generate_video_with_runway":
+        payload["additional_prompt_notes"] = "Luce più naturale, niente texture plastica."
+    return payload
+
+
+def _sub_agent_output(name: str, attempt: int, spielbierg_rejections: int) -> dict[str, Any]:
+    if name == "submit_post_drafts":
+        return {"posts": [{
+            "platform": "instagram", "caption": _CAPTION, "hashtags": _HASHTAGS, "content_theme": "ricetta veloce",
+        }]}
+    if name == "submit_video_concept":
+        return {
+            "title": "Viola in 10 minuti",
+            "total_duration_seconds": 10,
+            "visual_style": "food macro, luce naturale",
+            "platform_format": "Reels 9:16 10s",
+            "hook_description": "Coltello che taglia una barbabietola lucida",
+            "scenes": [
+                {"scene_number": i, "description": f"Scena {i}", "duration_seconds": 5,
+                 "camera_movement": "slow dolly in"}
+                for i in (1, 2)
+            ],
+            "music_mood": "upbeat",
+            "color_palette": ["#6B0F3A", "#F2E8DC"],
+            "cinematography_notes": "85mm, luce da finestra",
+            "production_notes": "Nessuna mano in primo piano",
+        }
+    if name == "submit_review":
+        return {
+            "revised_caption": _CAPTION,
+            "revised_hashtags": _HASHTAGS,
+            "engagement_score": 8,
+            "changes_summary": ["Hook più diretto"],
+            "community_fit_notes": "In linea con il tono del brand",
+            "mainstream_appeal_notes": "Accessibile anche ai non vegani",
+        }
+    # submit_video_review: the first `spielbierg_rejections` reviews of every cycle ask for a regeneration
+    approved = (attempt - 1) % (spielbierg_rejections + 1) == spielbierg_rejections
+    return {
+        "approved": approved,
+        "realism_score": 8 if approved else 5,
+        "adherence_score": 8 if approved else 6,
+        "issues": [] if approved else ["Frame 2: texture plastica"],
+        "improved_prompt_notes": "" if approved else "Luce più naturale",
+        "verdict": "Approvato" if approved else "Da rigenerare",
+    }
+
+
+def sample_concept() -> dict[str, Any]:
+    """The concept FakeAnthropic's VC returns, for driving the video stages on their own."""
+    return _sub_agent_output("submit_video_concept", 1, 0)
+
+
+def _input_tokens(request: dict) -> int:
+    """~4 characters per text token; images flat, like compaction.estimate_tokens (base64 is not text)."""
+    chars = len(json.dumps(request))
+    images = 0
+    for message in request.get("messages", []):
+        content = message.get("content")
+        for block in content if isinstance(content, list) else []:
+            if isinstance(block, dict) and block.get("type") == "image":
+                images += 1
+                chars -= len((block.get("source") or {}).get("data", ""))
+    return max(chars // 4, 1) + images * 1600
+
+
+def _has_breakpoints(request: dict) -> bool:
+    return '"cache_control"' in json.dumps(request.get("system", "")) + json.dumps(request.get("tools", []))
+
+
+class _AnthropicHandler(_Handler):
+    server: "FakeAnthropic"
+
+    def do_POST(self) -> None:
+        request = json.loads(self._body() or b"{}")
+        if urlsplit(self.path).path != "/v1/messages":
+            self._send_json(404, {"error": {"type": "not_found_error", "message": self.path}})
+            return
+        role, content, stop_reason = self.server.respond(request)
+        self.server.count(role)
+        if self._inject_error():
+            return
+        profile: AnthropicProfile = self.server.profile
+        output_tokens = profile.output_tokens.get(role, 300)
+        self._delay(output_tokens * profile.ms_per_output_token)
+
+        input_tokens = _input_tokens(request)
+        cache_read = int(input_tokens * profile.cache_hit_ratio) if _has_breakpoints(request) else 0
+        self._send_json(200, {
+            "id": f"msg_{uuid.uuid4().hex[:20]}",
+            "type": "message",
+            "role": "assistant",
+            "model": request.get("model", "claude-opus-4-6"),
+            "content": content,
+            "stop_reason": stop_reason,
+            "stop_sequence": None,
+            "usage": {
+                "input_tokens": input_tokens - cache_read,
+                "output_tokens": output_tokens,
+                "cache_read_input_tokens": cache_read,
+                "cache_creation_input_tokens": 0,
+            },
+        })
+
+
+class FakeAnthropic(_FakeServer):
+    def __init__(
+        self,
+        profile: Optional[AnthropicProfile] = None,
+        script: tuple[str, ...] = DEFAULT_SCRIPT,
+        spielbierg_rejections: int = 0,
+        seed: int = 0,
+    ):
+        super().__init__(_AnthropicHandler, profile or AnthropicProfile(), seed)
+        self.script = script
+        self.spielbierg_rejections = spielbierg_rejections
+        self._attempts: dict[str, int] = {}
+
+    def reset(self, script: tuple[str, ...], spielbierg_rejections: int) -> None:
+        """New orchestrator script and rejection pattern, with the review counters restarted."""
+        with self._rng_lock:
+            self.script = script
+            self.spielbierg_rejections = spielbierg_rejections
+            self._attempts.clear()
+
+    def _attempt(self, name: str) -> int:
+        with self._rng_lock:
+            self._attempts[name] = self._attempts.get(name, 0) + 1
+            return self._attempts[name]
+
+    def respond(self, request: dict) -> tuple[str, list[dict], str]:
+        """(caller role, content blocks, stop reason) for one messages.create request."""
+        tool_choice = request.get("tool_choice") or {}
+        tools = [tool["name"] for tool in request.get("tools", [])]
+        sub_agent = tool_choice.get("name") or (tools[0] if tool_choice.get("type") == "any" and tools else None)
+        if sub_agent:
+            role = {
+                "submit_post_drafts": "draft", "submit_video_concept": "vc", "submit_review": "smcc",
+            }.get(sub_agent, "spielbierg")
+            block = {
+                "type": "tool_use", "id": f"toolu_{uuid.uuid4().hex[:20]}", "name": sub_agent,
+                "input": _sub_agent_output(sub_agent, self._attempt(sub_agent), self.spielbierg_rejections),
+            }
+            return role, [block], "tool_use"
+        return "orchestrator", *self._orchestrator_turn(request)
+
+    def _orchestrator_turn(self, request: dict) -> tuple[list[dict], str]:
+        done = [
+            block.get("name")
+            for message in request.get("messages", []) if message.get("role") == "assistant"
+            for block in message.get("content", []) if isinstance(block, dict) and block.get("type") == "tool_use"
+        ]
+        thinking = {
+            "type": "thinking",
+            "thinking": "Procedo con il passo successivo del flusso. " * (self.profile.thinking_chars // 45 + 1),
+            "signature": "fake",
+        }
+        if len(done) >= len(self.script):
+            return [{"type": "text", "text": "Post pubblicato: pipeline completata."}], "end_turn"
+        tool = self.script[len(done)]
+        block = {
+            "type": "tool_use", "id": f"toolu_{uuid.uuid4().hex[:20]}", "name": tool,
+            "input": _tool_input(tool, retry=tool in done),
+        }
+        return [thinking, block], "tool_use"
+
+
+# ── Runway ─────────────────────────────────────────────────────────────────────
+
+def synthetic_video(frames: int = 48, size: tuple[int, int] = (288, 512)) -> bytes:
+    """A small MP4 with two hard cuts (so keyframe selection has shots to find), or b"" without OpenCV."""
+    try:
+        import cv2
+        import numpy as np
+    except ImportError:
+        return b""
+    width, height = size
+    with tempfile.TemporaryDirectory() as tmp:
+        path = str(Path(tmp) / "clip.mp4")
+        writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), 24, (width, height))
+        for i in range(frames):
+            shot = i * 3 // frames
+            frame = np.zeros((height, width, 3), dtype=np.uint8)
+            frame[:] = ((60 + 80 * shot) % 256, 30 + i, (200 - 60 * shot) % 256)
+            cv2.rectangle(frame, (20 + i * 3, 40), (120 + i * 3, 200), (240, 240, 240), -1)
+            writer.write(frame)
+        writer.release()
+        return Path(path).read_bytes()
+
+
+class _RunwayHandler(_Handler):
+    server: "FakeRunway"
+
+    def do_POST(self) -> None:
+        self._body()
+        self.server.count("text_to_video")
+        if self._inject_error():
+            return
+        self._delay()
+        self._send_json(200, {"id": self.server.create_task()})
+
+    def do_GET(self) -> None:
+        path = urlsplit(self.path).path
+        if path.startswith("/videos/"):
+            self.server.count("download")
+            self._send(200, self.server.video, "video/mp4")
+            return
+        self.server.count("tasks")
+        if self._inject_error():
+            return
+        self._delay()
+        task = self.server.task_status(path.rsplit("/", 1)[-1])
+        if task is None:
+            self._send_json(404, {"error": "Task not found"})
+        else:
+            self._send_json(200, task)
+
+    def do_DELETE(self) -> None:
+        self.server.count("cancel")
+        self._delay()
+        self.send_response(204)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+
+class FakeRunway(_FakeServer):
+    def __init__(self, profile: Optional[RunwayProfile] = None, seed: int = 0):
+        super().__init__(_RunwayHandler, profile or RunwayProfile(), seed)
+        self.video = synthetic_video()
+        self._tasks: dict[str, tuple[float, bool]] = {}
+
+    @property
+    def api_base(self) -> str:
+        return f"{self.base_url}/v1"
+
+    def create_task(self) -> str:
+        task_id = str(uuid.uuid4())
+        fails = self.random() < self.profile.failure_rate
+        with self._rng_lock:
+            self._tasks[task_id] = (time.monotonic(), fails)
+        return task_id
+
+    def task_status(self, task_id: str) -> Optional[dict[str, Any]]:
+        with self._rng_lock:
+            entry = self._tasks.get(task_id)
+        if entry is None:
+            return None
+        created, fails = entry
+        age = time.monotonic() - created
+        profile: RunwayProfile = self.profile
+        if age < profile.pending_seconds:
+            return {"id": task_id, "status": "PENDING"}
+        if age < profile.task_seconds:
+            progress = (age - profile.pending_seconds) / max(profile.task_seconds - profile.pending_seconds, 1e-6)
+            return {"id": task_id, "status": "RUNNING", "progress": round(progress, 2)}
+        if fails:
+            return {"id": task_id, "status": "FAILED", "failure": "injected failure"}
+        return {"id": task_id, "status": "SUCCEEDED", "output": [f"{self.base_url}/videos/{task_id}.mp4"]}
+
+
+# ── Graph API ──────────────────────────────────────────────────────────────────
+
+_APP_USAGE = json.dumps({"call_count": 1, "total_cputime": 1, "total_time": 1})
+
+
+def _graph_result(method: str, relative_url: str) -> dict[str, Any]:
+    path = urlsplit(relative_url).path.strip("/")
+    if method == "GET" and path.endswith(("/media", "/feed")):
+        now = time.strftime("%Y-%m-%dT%H:%M:%S+0000", time.gmtime())
+        key = "caption" if path.endswith("/media") else "message"
+        stamp = "timestamp" if path.endswith("/media") else "created_time"
+        return {"data": [{"id": f"{path}-{i}", key: f"Post precedente {i}", stamp: now} for i in range(3)]}
+    return {"id": f"{uuid.uuid4().int % 10 ** 17}"}
+
+
+class _GraphHandler(_Handler):
+    server: "FakeGraph"
+
+    def _reply(self, payload: Any) -> None:
+        self._send_json(200, payload, {"X-App-Usage": _APP_USAGE})
+
+    def do_POST(self) -> None:
+        body = self._body()
+        path = urlsplit(self.path).path.rstrip("/")
+        content_type = self.headers.get("Content-Type", "")
+        if content_type.startswith("application/json"):
+            form: dict[str, Any] = json.loads(body or b"{}")
+        else:
+            form = {k: v[0] for k, v in parse_qs(body.decode()).items()}
+        if "batch" in form:
+            self.server.count("batch")
+            if self._inject_error():
+                return
+            self._delay()
+            operations = json.loads(form["batch"])
+            self._reply([
+                {"code": 200, "body": json.dumps(_graph_result(op["method"], op["relative_url"]))}
+                for op in operations
+            ])
+            return
+        self.server.count(path.rsplit("/", 1)[-1] or "root")
+        if self._inject_error():
+            return
+        self._delay()
+        self._reply(_graph_result("POST", path))
+
+    def do_GET(self) -> None:
+        path = urlsplit(self.path).path
+        self.server.count(path.rsplit("/", 1)[-1])
+        if self._inject_error():
+            return
+        self._delay()
+        if path.endswith("/content_publishing_limit"):
+            self._reply({"data": [{"quota_usage": 0, "config": {"quota_total": 50, "quota_duration": 86400}}]})
+        else:
+            self._reply(_graph_result("GET", path))
+
+
+class FakeGraph(_FakeServer):
+    def __init__(self, profile: Optional[UpstreamProfile] = None, seed: int = 0):
+        super().__init__(_GraphHandler, profile or UpstreamProfile(), seed)
+
+    @property
+    def api_base(self) -> str:
+        return f"{self.base_url}/v19.0"
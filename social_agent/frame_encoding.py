@@ -0,0 +1,229 @@
+"""
+Frame encoding stage for Spielbierg: turns the selected keyframes into the
+image blocks of the review prompt, within a per-call image-token budget.
+
+Two layouts:
+- "frames": one image block per frame (the original behaviour). Width shrinks
+  from MAX_FRAME_WIDTH towards MIN_FRAME_WIDTH until all frames fit the budget.
+- "contact-sheet": frames tiled into labelled grids (up to TILES_PER_SHEET
+  each), so Claude sees the whole clip in one or two images. Far fewer tokens
+  and upload round-trips, at the price of per-frame detail.
+
+frame_capacity tells the keyframe selector how many frames a layout can fit
+at its smallest size (MIN_FRAME_WIDTH frames, MIN_TILE_WIDTH tiles); the
+encoder then grows the frames actually picked to fill the budget.
+
+JPEG quality follows the resolution: smaller images are encoded at lower
+quality, which only affects upload size, not tokens. Every encoding reports
+its estimated image tokens, so fidelity vs cost is an explicit choice.
+
+Configured via SPIELBIERG_FRAME_LAYOUT and SPIELBIERG_IMAGE_TOKEN_BUDGET.
+"""
+import base64
+import math
+import os
+from dataclasses import dataclass, field
+from typing import Optional
+
+import cv2
+import numpy as np
+
+from .keyframes import (
+    DEFAULT_FRAME_TOKEN_BUDGET,
+    MAX_FRAMES,
+    MIN_ENCODED_FRAME_WIDTH,
+    MIN_FRAMES,
+    SelectedFrame,
+    estimate_frame_tokens,
+    frame_budget,
+)
+
+LAYOUTS = ("frames", "contact-sheet")
+DEFAULT_IMAGE_TOKEN_BUDGET = DEFAULT_FRAME_TOKEN_BUDGET
+MAX_FRAME_WIDTH = 720
+MIN_FRAME_WIDTH = MIN_ENCODED_FRAME_WIDTH
+MAX_IMAGE_EDGE = 1568               # the API downscales anything larger anyway
+TILES_PER_SHEET = 9
+MIN_TILE_WIDTH = 200                # below this a tile no longer shows food texture
+JPEG_QUALITY_MAX = 85
+JPEG_QUALITY_MIN = 65
+
+
+@dataclass
+class EncodedImage:
+    data: str                       # base64 JPEG
+    width: int
+    height: int
+    label: str                      # text block sent right before the image
+    size_bytes: int
+
+    @property
+    def tokens(self) -> int:
+        return estimate_frame_tokens(self.width, self.height)
+
+
+@dataclass
+class FrameEncoding:
+    layout: str = "frames"
+    token_budget: int = DEFAULT_IMAGE_TOKEN_BUDGET
+    images: list[EncodedImage] = field(default_factory=list)
+
+    @property
+    def estimated_tokens(self) -> int:
+        return sum(image.tokens for image in self.images)
+
+    @property
+    def size_bytes(self) -> int:
+        return sum(image.size_bytes for image in self.images)
+
+    def summary(self) -> str:
+        return (
+            f"{len(self.images)} immagini ({self.layout}), "
+            f"~{self.estimated_tokens} token immagine su {self.token_budget}, "
+            f"{self.size_bytes / 1024:.0f} KB"
+        )
+
+
+def frame_label(index: int, pick: SelectedFrame) -> str:
+    label = f"Frame {index} — t={pick.frame.timestamp:.1f}s"
+    if pick.scene_number is not None:
+        label += f" — Scena {pick.scene_number}"
+    return label
+
+
+def _quality_for(width: int) -> int:
+    """Linear from JPEG_QUALITY_MAX at MAX_FRAME_WIDTH down to JPEG_QUALITY_MIN at MIN_FRAME_WIDTH."""
+    span = (width - MIN_FRAME_WIDTH) / (MAX_FRAME_WIDTH - MIN_FRAME_WIDTH)
+    span = min(1.0, max(0.0, span))
+    return round(JPEG_QUALITY_MIN + span * (JPEG_QUALITY_MAX - JPEG_QUALITY_MIN))
+
+
+def _encode_jpeg(image: np.ndarray, label: str, quality: int) -> Optional[EncodedImage]:
+    ret, buffer = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not ret:
+        return None
+    h, w = image.shape[:2]
+    return EncodedImage(base64.b64encode(buffer.tobytes()).decode("utf-8"), w, h, label, len(buffer))
+
+
+def _fit_width(count: int, aspect: float, budget: int, max_width: int) -> int:
+    """Largest width (≤ max_width) such that `count` images of this aspect fit `budget` tokens."""
+    per_image = budget / max(count, 1)
+    width = int(math.sqrt(per_image * 750 / aspect))
+    return max(1, min(max_width, width))
+
+
+def _resize(image: np.ndarray, width: int) -> np.ndarray:
+    h, w = image.shape[:2]
+    height = max(1, int(h * width / w))
+    return cv2.resize(image, (width, height), interpolation=cv2.INTER_AREA)
+
+
+def _encode_frames(picks: list[SelectedFrame], budget: int) -> list[EncodedImage]:
+    h, w = picks[0].frame.image.shape[:2]
+    width = max(MIN_FRAME_WIDTH, _fit_width(len(picks), h / w, budget, MAX_FRAME_WIDTH))
+    quality = _quality_for(width)
+    images: list[EncodedImage] = []
+    for i, pick in enumerate(picks, start=1):
+        encoded = _encode_jpeg(_resize(pick.frame.image, width), f"{frame_label(i, pick)}:", quality)
+        if encoded:
+            images.append(encoded)
+    return images
+
+
+def _draw_tile_label(tile: np.ndarray, text: str) -> None:
+    scale = max(0.4, tile.shape[1] / 600)
+    thickness = max(1, int(scale * 2))
+    (tw, th), baseline = cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX, scale, thickness)
+    cv2.rectangle(tile, (0, 0), (tw + 8, th + baseline + 8), (0, 0, 0), -1)
+    cv2.putText(tile, text, (4, th + 4), cv2.FONT_HERSHEY_SIMPLEX, scale, (255, 255, 255), thickness, cv2.LINE_AA)
+
+
+def _sheet_grid(count: int) -> tuple[int, int, int, int]:
+    """(sheets, tiles per sheet, columns, rows) for `count` frames."""
+    sheets = math.ceil(count / TILES_PER_SHEET)
+    per_sheet = math.ceil(count / sheets)
+    cols = math.ceil(math.sqrt(per_sheet))
+    rows = math.ceil(per_sheet / cols)
+    return sheets, per_sheet, cols, rows
+
+
+def _sheet_tokens(count: int, aspect: float, tile_w: int) -> int:
+    sheets, _, cols, rows = _sheet_grid(count)
+    return sheets * estimate_frame_tokens(cols * tile_w, rows * max(1, int(tile_w * aspect)))
+
+
+def _encode_contact_sheets(picks: list[SelectedFrame], budget: int) -> list[EncodedImage]:
+    h, w = picks[0].frame.image.shape[:2]
+    aspect = h / w
+    sheets, per_sheet, cols, rows = _sheet_grid(len(picks))
+
+    # Budget is spent on the sheet area, tiles share it; also respect the API's max edge
+    sheet_width = _fit_width(sheets, rows * aspect / cols, budget, MAX_IMAGE_EDGE)
+    tile_w = min(MAX_FRAME_WIDTH, sheet_width // cols, int(MAX_IMAGE_EDGE / (rows * aspect)))
+    tile_h = max(1, int(tile_w * aspect))
+    quality = _quality_for(tile_w * 2)   # tiles are small on purpose: don't over-compress them
+
+    images: list[EncodedImage] = []
+    for s in range(sheets):
+        chunk = picks[s * per_sheet:(s + 1) * per_sheet]
+        first = s * per_sheet + 1
+        sheet = np.zeros((rows * tile_h, cols * tile_w, 3), dtype=np.uint8)
+        for k, pick in enumerate(chunk):
+            tile = cv2.resize(pick.frame.image, (tile_w, tile_h), interpolation=cv2.INTER_AREA)
+            text = f"{first + k} t={pick.frame.timestamp:.1f}s"
+            if pick.scene_number is not None:
+                text += f" S{pick.scene_number}"
+            _draw_tile_label(tile, text)
+            r, c = divmod(k, cols)
+            sheet[r * tile_h:(r + 1) * tile_h, c * tile_w:(c + 1) * tile_w] = tile
+        legend = "; ".join(frame_label(first + k, pick) for k, pick in enumerate(chunk))
+        label = (
+            f"Contact sheet {s + 1}/{sheets} (griglia {rows}×{cols}, ordine di lettura "
+            f"sinistra→destra, alto→basso): {legend}"
+        )
+        encoded = _encode_jpeg(sheet, label, quality)
+        if encoded:
+            images.append(encoded)
+    return images
+
+
+def resolve_config(layout: Optional[str] = None, token_budget: Optional[int] = None) -> tuple[str, int]:
+    """Explicit values, then SPIELBIERG_FRAME_LAYOUT / SPIELBIERG_IMAGE_TOKEN_BUDGET, then defaults."""
+    layout = (layout or os.getenv("SPIELBIERG_FRAME_LAYOUT") or "frames").lower()
+    if layout not in LAYOUTS:
+        raise ValueError(f"Layout frame sconosciuto: {layout}")
+    budget = token_budget or int(os.getenv("SPIELBIERG_IMAGE_TOKEN_BUDGET") or DEFAULT_IMAGE_TOKEN_BUDGET)
+    return layout, budget
+
+
+def frame_capacity(layout: str, token_budget: int, width: int, height: int) -> int:
+    """
+    Frames of a width × height clip the layout fits in `token_budget` at its
+    smallest size, for the keyframe selector (MIN_FRAMES..MAX_FRAMES).
+    """
+    if layout != "contact-sheet":
+        return frame_budget(width, height, token_budget)
+    aspect = height / width
+    for count in range(MAX_FRAMES, MIN_FRAMES, -1):
+        if _sheet_tokens(count, aspect, MIN_TILE_WIDTH) <= token_budget:
+            return count
+    return MIN_FRAMES
+
+
+def encode_frames(
+    picks: list[SelectedFrame],
+    layout: Optional[str] = None,
+    token_budget: Optional[int] = None,
+) -> FrameEncoding:
+    """Encode the picked frames for the review prompt (defaults: see resolve_config)."""
+    layout, budget = resolve_config(layout, token_budget)
+
+    encoding = FrameEncoding(layout=layout, token_budget=budget)
+    if not picks:
+        return encoding
+    if layout == "contact-sheet":
+        encoding.images = _encode_contact_sheets(picks, budget)
+    else:
+        encoding.images = _encode_frames(picks, budget)
+    return encoding
@@ -0,0 +1,235 @@
+"""
+Pluggable video frame decoders for Spielbierg.
+
+Both backends read the clip in a single forward pass — no per-frame seeks, which
+make the decoder restart from the previous keyframe every time — and never
+write temporary files:
+
+- "opencv": grab() every frame, retrieve() only the wanted ones. Needs a file path.
+- "pyav": PyAV (optional dependency `av`), decodes from a path or an in-memory
+  buffer; "pyav-keyframes" decodes keyframes only when the clip has enough.
+
+Besides evenly spaced extraction, decoders offer scan() — a cheap downsampled
+pass over every frame, used by the keyframe selector — and extract_at() for
+arbitrary frame indices.
+"""
+import io
+import os
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional, Protocol, Union
+
+import cv2
+import numpy as np
+
+VideoSource = Union[str, Path, bytes]
+
+
+@dataclass
+class DecodedFrame:
+    index: int
+    timestamp: float          # seconds from the start of the clip
+    image: np.ndarray         # BGR, full resolution
+
+
+@dataclass
+class ClipScan:
+    """Downsampled pass over every frame of a clip, for shot-change analysis."""
+    thumbnails: np.ndarray    # (N, h, w, 3) uint8
+    timestamps: np.ndarray    # (N,) seconds
+    fps: float
+    frame_size: tuple[int, int]   # (width, height) of the source frames
+
+    @property
+    def duration(self) -> float:
+        return float(self.timestamps[-1]) + 1 / self.fps if len(self.timestamps) else 0.0
+
+
+def _evenly_spaced(total: int, count: int) -> list[int]:
+    """`count` equidistant indices in [0, total), same spacing Spielbierg always used."""
+    return sorted({int(total * i / count) for i in range(count)})
+
+
+class FrameDecoder(Protocol):
+    name: str
+    supports_buffers: bool
+
+    def extract(self, source: VideoSource, count: int) -> list[DecodedFrame]:
+        """Return up to `count` frames spread evenly across the clip."""
+        ...
+
+    def extract_at(self, source: VideoSource, indices: list[int]) -> list[DecodedFrame]:
+        """Return the frames at the given indices, in one forward pass."""
+        ...
+
+    def scan(self, source: VideoSource, size: tuple[int, int]) -> ClipScan:
+        """Decode every frame, downsampled to size=(width, height)."""
+        ...
+
+
+class OpenCVSequentialDecoder:
+    name = "opencv"
+    supports_buffers = False
+
+    @staticmethod
+    def _open(source: VideoSource) -> "cv2.VideoCapture":
+        if isinstance(source, bytes):
+            raise ValueError("Il decoder OpenCV richiede un file locale, non un buffer.")
+        cap = cv2.VideoCapture(str(source))
+        if not cap.isOpened():
+            raise RuntimeError(f"Impossibile aprire il video: {source}")
+        return cap
+
+    def extract(self, source: VideoSource, count: int) -> list[DecodedFrame]:
+        cap = self._open(source)
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        cap.release()
+        if total_frames <= 0:
+            raise RuntimeError("Video senza frame.")
+        return self.extract_at(source, _evenly_spaced(total_frames, count))
+
+    def extract_at(self, source: VideoSource, indices: list[int]) -> list[DecodedFrame]:
+        cap = self._open(source)
+        try:
+            fps = cap.get(cv2.CAP_PROP_FPS) or 24.0
+            wanted = set(indices)
+            last = max(wanted)
+            frames: list[DecodedFrame] = []
+            for index in range(last + 1):
+                if not cap.grab():
+                    break
+                if index in wanted:
+                    ret, image = cap.retrieve()
+                    if ret:
+                        frames.append(DecodedFrame(index, index / fps, image))
+            return frames
+        finally:
+            cap.release()
+
+    def scan(self, source: VideoSource, size: tuple[int, int]) -> ClipScan:
+        cap = self._open(source)
+        try:
+            fps = cap.get(cv2.CAP_PROP_FPS) or 24.0
+            frame_size = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+            thumbnails: list[np.ndarray] = []
+            while True:
+                ret, image = cap.read()
+                if not ret:
+                    break
+                thumbnails.append(cv2.resize(image, size, interpolation=cv2.INTER_AREA))
+        finally:
+            cap.release()
+        if not thumbnails:
+            raise RuntimeError("Video senza frame.")
+        return ClipScan(np.stack(thumbnails), np.arange(len(thumbnails)) / fps, fps, frame_size)
+
+
+class PyAVDecoder:
+    """
+    PyAV backend. With keyframes_only=True, extract() decodes keyframes only
+    (much cheaper); if the clip has fewer keyframes than requested it falls
+    back to a full forward pass.
+    """
+
+    supports_buffers = True
+
+    def __init__(self, keyframes_only: bool = False):
+        self.keyframes_only = keyframes_only
+        self.name = "pyav-keyframes" if keyframes_only else "pyav"
+
+    @staticmethod
+    def _open(source: VideoSource):
+        try:
+            import av
+        except ImportError as exc:
+            raise RuntimeError("Decoder PyAV non disponibile: installa il pacchetto 'av'.") from exc
+        return av.open(io.BytesIO(source) if isinstance(source, bytes) else str(source))
+
+    def extract(self, source: VideoSource, count: int) -> list[DecodedFrame]:
+        if self.keyframes_only:
+            frames = self._keyframes(source, count)
+            if len(frames) >= count:
+                return frames
+        with self._open(source) as container:
+            stream = container.streams.video[0]
+            total_frames = stream.frames
+            if total_frames <= 0 and stream.duration and stream.average_rate:
+                total_frames = int(stream.duration * stream.time_base * stream.average_rate)
+        if total_frames <= 0:
+            raise RuntimeError("Video senza frame.")
+        return self.extract_at(source, _evenly_spaced(total_frames, count))
+
+    def _keyframes(self, source: VideoSource, count: int) -> list[DecodedFrame]:
+        with self._open(source) as container:
+            stream = container.streams.video[0]
+            fps = float(stream.average_rate or 24)
+            # Non-key packets are demuxed but never handed to the decoder
+            keyframes = [
+                frame
+                for packet in container.demux(stream)
+                if packet.is_keyframe
+                for frame in packet.decode()
+            ]
+            if len(keyframes) > count:
+                keyframes = [keyframes[i] for i in _evenly_spaced(len(keyframes), count)]
+            # Colour conversion only for the frames actually kept
+            return [
+                DecodedFrame(round(float(f.time or 0.0) * fps), float(f.time or 0.0), f.to_ndarray(format="bgr24"))
+                for f in keyframes
+            ]
+
+    def extract_at(self, source: VideoSource, indices: list[int]) -> list[DecodedFrame]:
+        with self._open(source) as container:
+            stream = container.streams.video[0]
+            stream.thread_type = "AUTO"
+            wanted = set(indices)
+            last = max(wanted)
+            frames: list[DecodedFrame] = []
+            for index, frame in enumerate(container.decode(stream)):
+                if index in wanted:
+                    frames.append(DecodedFrame(index, float(frame.time or 0.0), frame.to_ndarray(format="bgr24")))
+                if index >= last:
+                    break
+            return frames
+
+    def scan(self, source: VideoSource, size: tuple[int, int]) -> ClipScan:
+        width, height = size
+        with self._open(source) as container:
+            stream = container.streams.video[0]
+            stream.thread_type = "AUTO"
+            fps = float(stream.average_rate or 24)
+            frame_size = (stream.codec_context.width, stream.codec_context.height)
+            thumbnails: list[np.ndarray] = []
+            timestamps: list[float] = []
+            for frame in container.decode(stream):
+                # swscale does the downsampling and colour conversion in one step
+                thumbnails.append(frame.to_ndarray(width=width, height=height, format="bgr24"))
+                timestamps.append(float(frame.time or 0.0))
+        if not thumbnails:
+            raise RuntimeError("Video senza frame.")
+        return ClipScan(np.stack(thumbnails), np.array(timestamps), fps, frame_size)
+
+
+def _pyav_available() -> bool:
+    try:
+        import av  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def get_decoder(name: Optional[str] = None) -> FrameDecoder:
+    """
+    Decoder by name ("opencv", "pyav", "pyav-keyframes" or "auto").
+    Defaults to SPIELBIERG_FRAME_DECODER, then "auto" (PyAV when installed).
+    """
+    name = (name or os.getenv("SPIELBIERG_FRAME_DECODER") or "auto").lower()
+    if name == "auto":
+        name = "pyav" if _pyav_available() else "opencv"
+    if name == "opencv":
+        return OpenCVSequentialDecoder()
+    if name == "pyav":
+        return PyAVDecoder()
+    if name == "pyav-keyframes":
+        return PyAVDecoder(keyframes_only=True)
+    raise ValueError(f"Decoder frame sconosciuto: {name}")
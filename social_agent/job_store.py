@@ -0,0 +1,302 @@
+"""
+Durable, checkpointed pipeline jobs.
+
+Every SocialAgent.run is a job in a local SQLite file. The conversation and
+the per-post state (concept, video URL, Spielbierg/SMCC reviews, approved
+draft, in-flight Runway task) are checkpointed at every turn boundary, and
+every tool call is logged as a step with its result as soon as it finishes.
+
+After a crash, SocialAgent.resume(job_id) (or `python -m social_agent.resume`)
+reloads the last checkpoint and finishes the interrupted turn. Completed
+steps are replayed from the log instead of re-run. A Runway generation that
+was in flight is re-attached by task ID, so no video is generated twice. A
+publish whose outcome is unknown is never repeated blindly: Claude is told
+to check the recent posts first.
+
+Each job records the PID of the process running it; every checkpoint doubles
+as its heartbeat. A running job whose owner is still alive and checkpointed
+recently is live, and is not resumed by another process unless forced.
+
+Set SOCIAL_AGENT_JOB_STORE=off to disable checkpointing.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Optional
+
+CACHE_DIR = Path(__file__).parent.parent / "cache"
+
+# A running job that checkpointed within this window and whose owner process exists is live.
+# Longer than any single step (a Runway render is bounded at ~7 minutes)
+LIVE_JOB_SECONDS = 1800
+
+# Pipeline step recorded for each tool
+STEP_NAMES = {
+    "get_recent_posts": "recent_posts",
+    "create_video_concept_with_vc": "concept",
+    "generate_video_with_runway": "video",
+    "review_video_with_spielbierg": "spielbierg",
+    "review_with_smcc": "smcc",
+    "request_approval": "approval",
+    "publish_instagram_post": "publish",
+    "publish_facebook_post": "publish",
+}
+
+
+@dataclass
+class JobRecord:
+    id: str
+    brief: str
+    status: str                     # "running" | "awaiting_approval" | "done" | "stopped" (iteration limit)
+    messages: list[dict]
+    state: dict[str, Any]
+    result: Optional[str]
+    created_at: float
+    updated_at: float
+    owner_pid: Optional[int] = None
+
+
+def _block_dict(block: Any) -> Any:
+    """Content block as plain JSON (SDK response blocks are pydantic models)."""
+    if isinstance(block, dict) or not hasattr(block, "model_dump"):
+        return block
+    return block.model_dump(mode="json", exclude_none=True)
+
+
+def _process_alive(pid: int) -> bool:
+    if os.name == "nt":
+        return True     # os.kill would terminate it: rely on the heartbeat alone
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True     # exists, owned by another user
+    return True
+
+
+def is_live(status: str, owner_pid: Optional[int], updated_at: float) -> bool:
+    """Whether another process is running this job right now (see LIVE_JOB_SECONDS)."""
+    return (
+        status == "running"
+        and owner_pid is not None
+        and owner_pid != os.getpid()
+        and time.time() - updated_at < LIVE_JOB_SECONDS
+        and _process_alive(owner_pid)
+    )
+
+
+def serialize_messages(messages: list[dict]) -> list[dict]:
+    serialized = []
+    for message in messages:
+        content = message["content"]
+        if not isinstance(content, str):
+            content = [_block_dict(block) for block in content]
+        serialized.append({**message, "content": content})
+    return serialized
+
+
+class JobStore:
+    def __init__(self, path: Path = CACHE_DIR / "jobs.sqlite3"):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # One connection shared by the worker threads, serialized by _lock
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY, brief TEXT NOT NULL, status TEXT NOT NULL,"
+            " messages TEXT NOT NULL, state TEXT NOT NULL, result TEXT,"
+            " created_at REAL NOT NULL, updated_at REAL NOT NULL, owner_pid INTEGER)"
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        if "owner_pid" not in columns:
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN owner_pid INTEGER")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS steps ("
+            " job_id TEXT NOT NULL, tool_use_id TEXT NOT NULL, tool_name TEXT NOT NULL,"
+            " step TEXT NOT NULL, status TEXT NOT NULL, result TEXT,"
+            " started_at REAL NOT NULL, finished_at REAL,"
+            " PRIMARY KEY (job_id, tool_use_id))"
+        )
+
+    # ── Jobs ───────────────────────────────────────────────────────────────────
+
+    def create(self, brief: str, messages: list[dict], state: dict[str, Any]) -> str:
+        job_id = uuid.uuid4().hex[:12]
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, brief, status, messages, state, result, created_at, updated_at, owner_pid)"
+                " VALUES (?, ?, 'running', ?, ?, NULL, ?, ?, ?)",
+                (job_id, brief, json.dumps(serialize_messages(messages), ensure_ascii=False),
+                 json.dumps(state, ensure_ascii=False), now, now, os.getpid()),
+            )
+        return job_id
+
+    def claim(self, job_id: str, force: bool = False) -> JobRecord:
+        """
+        Mark a job as running in this process and return it. Raises ValueError if
+        it does not exist, is finished, or is live in another process (unless force).
+        """
+        with self._lock:
+            # IMMEDIATE takes the write lock up front: two resumes cannot both claim the job
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                job = self._load(job_id)
+                if job is None:
+                    raise ValueError(f"Job {job_id} non trovato.")
+                if job.status not in ("running", "awaiting_approval"):
+                    raise ValueError(f"Job {job_id} già concluso ({job.status}).")
+                if not force and is_live(job.status, job.owner_pid, job.updated_at):
+                    raise ValueError(
+                        f"Job {job_id} in esecuzione nel processo {job.owner_pid} "
+                        f"(usa --force per riprenderlo comunque)."
+                    )
+                self._conn.execute(
+                    "UPDATE jobs SET status = 'running', owner_pid = ?, updated_at = ? WHERE id = ?",
+                    (os.getpid(), time.time(), job_id),
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return job
+
+    def checkpoint(self, job_id: str, messages: list[dict], state: dict[str, Any]) -> None:
+        """Conversation and per-post state at a turn boundary."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET messages = ?, state = ?, updated_at = ? WHERE id = ?",
+                (json.dumps(serialize_messages(messages), ensure_ascii=False),
+                 json.dumps(state, ensure_ascii=False), time.time(), job_id),
+            )
+
+    def save_state(self, job_id: str, state: dict[str, Any]) -> None:
+        """Per-post state only (e.g. a Runway task ID, the moment it exists)."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET state = ?, updated_at = ? WHERE id = ?",
+                (json.dumps(state, ensure_ascii=False), time.time(), job_id),
+            )
+
+    def set_status(self, job_id: str, status: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, updated_at = ? WHERE id = ?", (status, time.time(), job_id)
+            )
+
+    def finish(self, job_id: str, status: str, result: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, updated_at = ? WHERE id = ?",
+                (status, result, time.time(), job_id),
+            )
+
+    def load(self, job_id: str) -> Optional[JobRecord]:
+        with self._lock:
+            return self._load(job_id)
+
+    def _load(self, job_id: str) -> Optional[JobRecord]:
+        row = self._conn.execute(
+            "SELECT id, brief, status, messages, state, result, created_at, updated_at, owner_pid"
+            " FROM jobs WHERE id = ?", (job_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        return JobRecord(row[0], row[1], row[2], json.loads(row[3]), json.loads(row[4]), *row[5:])
+
+    def list_jobs(self, status: Optional[str] = None, limit: int = 50) -> list[dict[str, Any]]:
+        """Most recent jobs first: id, brief, status, last completed step, timestamps, owner and liveness."""
+        query = "SELECT id, brief, status, created_at, updated_at, owner_pid FROM jobs"
+        params: tuple = ()
+        if status:
+            query += " WHERE status = ?"
+            params = (status,)
+        with self._lock:
+            rows = self._conn.execute(query + " ORDER BY created_at DESC LIMIT ?", (*params, limit)).fetchall()
+            jobs = []
+            for job_id, brief, job_status, created_at, updated_at, owner_pid in rows:
+                last = self._conn.execute(
+                    "SELECT step FROM steps WHERE job_id = ? AND status = 'done'"
+                    " ORDER BY finished_at DESC LIMIT 1", (job_id,)
+                ).fetchone()
+                jobs.append({
+                    "id": job_id,
+                    "brief": brief,
+                    "status": job_status,
+                    "last_step": last[0] if last else None,
+                    "created_at": created_at,
+                    "updated_at": updated_at,
+                    "owner_pid": owner_pid,
+                    "live": is_live(job_status, owner_pid, updated_at),
+                })
+        return jobs
+
+    # ── Steps ──────────────────────────────────────────────────────────────────
+
+    def start_step(self, job_id: str, tool_use_id: str, tool_name: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO steps (job_id, tool_use_id, tool_name, step, status, result, started_at)"
+                " VALUES (?, ?, ?, ?, 'started', NULL, ?)",
+                (job_id, tool_use_id, tool_name, STEP_NAMES.get(tool_name, tool_name), time.time()),
+            )
+
+    def finish_step(self, job_id: str, tool_use_id: str, result: dict, state: dict[str, Any]) -> None:
+        """Store a tool result together with the state it produced, atomically."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.execute(
+                    "UPDATE steps SET status = 'done', result = ?, finished_at = ?"
+                    " WHERE job_id = ? AND tool_use_id = ?",
+                    (json.dumps(result, ensure_ascii=False), now, job_id, tool_use_id),
+                )
+                self._conn.execute(
+                    "UPDATE jobs SET state = ?, updated_at = ? WHERE id = ?",
+                    (json.dumps(state, ensure_ascii=False), now, job_id),
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                # Never leave the shared connection inside an open transaction
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def steps(self, job_id: str) -> dict[str, dict[str, Any]]:
+        """{tool_use_id: {"tool_name", "step", "status", "result"}} for one job."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT tool_use_id, tool_name, step, status, result FROM steps WHERE job_id = ?", (job_id,)
+            ).fetchall()
+        return {
+            tool_use_id: {
+                "tool_name": tool_name,
+                "step": step,
+                "status": status,
+                "result": json.loads(result) if result else None,
+            }
+            for tool_use_id, tool_name, step, status, result in rows
+        }
+
+
+_default_store: Optional[JobStore] = None
+_default_lock = threading.Lock()
+
+
+def get_job_store() -> Optional[JobStore]:
+    """Process-wide job store, or None when SOCIAL_AGENT_JOB_STORE is "off"."""
+    global _default_store
+    if os.getenv("SOCIAL_AGENT_JOB_STORE", "on").lower() in ("off", "0", "false", "no"):
+        return None
+    with _default_lock:
+        if _default_store is None:
+            _default_store = JobStore()
+        return _default_store
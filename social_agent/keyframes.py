@@ -0,0 +1,169 @@
+"""
+Scene-aware keyframe selection for Spielbierg.
+
+Instead of 6 equidistant frames, the clip is scanned once at thumbnail size
+and every consecutive pair of frames is compared with NumPy (colour-histogram
+distance + mean absolute pixel difference, both vectorized across the whole
+clip). Peaks well above the clip's own noise floor are shot boundaries; one
+frame is picked from the middle of each shot, so static shots cost a single
+frame and every cut the VideoConcept describes gets one.
+
+The number of frames is capped by the encoder's capacity for the clip's
+frame size (frame_encoding.frame_capacity); each selected frame is labelled with its timestamp and the VideoScene it most likely belongs to.
+"""
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+import numpy as np
+
+from .frame_extraction import ClipScan, DecodedFrame, FrameDecoder, VideoSource
+from .models import VideoScene
+
+SCAN_SIZE = (64, 36)                 # thumbnail (width, height) for the analysis pass
+HIST_BINS = 32                       # levels per colour channel
+BOUNDARY_MAD_K = 6.0                 # boundary = score > median + k·MAD
+BOUNDARY_MIN_SCORE = 0.25            # ...and never below this absolute floor
+MIN_SHOT_SECONDS = 0.5               # ignore boundaries closer than this (flashes, fades)
+MIN_FRAMES = 3                       # floor when even the smallest frames don't fit the budget
+BASELINE_FRAMES = 6                  # the former equidistant sample: static clips are padded up to it
+MAX_FRAMES = 10
+DEFAULT_FRAME_TOKEN_BUDGET = 3200    # ≈ 8 frames at 720×405, 10 at 9:16 once shrunk
+MIN_ENCODED_FRAME_WIDTH = 320        # smallest width the encoder shrinks frames to (frame_encoding)
+
+
+@dataclass
+class SelectedFrame:
+    frame: DecodedFrame
+    scene_number: Optional[int]      # VideoScene.scene_number, None without a concept
+    boundary: bool                   # True when picked for a detected shot
+
+
+def estimate_frame_tokens(width: int, height: int) -> int:
+    """Vision tokens for one image, per Anthropic's (w × h) / 750 rule of thumb."""
+    return max(1, int(width * height / 750))
+
+
+def frame_budget(
+    width: int,
+    height: int,
+    token_budget: int = DEFAULT_FRAME_TOKEN_BUDGET,
+) -> int:
+    """
+    How many frames fit the budget at the smallest width the encoder uses
+    (it then widens the frames actually picked to fill the budget).
+    """
+    encoded_h = int(height * MIN_ENCODED_FRAME_WIDTH / width)
+    per_frame = estimate_frame_tokens(MIN_ENCODED_FRAME_WIDTH, encoded_h)
+    return max(MIN_FRAMES, min(MAX_FRAMES, token_budget // per_frame))
+
+
+def difference_scores(thumbnails: np.ndarray) -> np.ndarray:
+    """
+    Score in [0, 1] for each transition i → i+1 (length N-1).
+    Average of the colour-histogram distance (worst channel) and the grayscale
+    mean absolute difference; the histogram catches cuts between similar-looking
+    framings, the pixel term catches cuts between similarly coloured shots.
+    """
+    n = len(thumbnails)
+    if n < 2:
+        return np.zeros(0)
+
+    # Per-channel histograms for all frames in one bincount
+    levels = HIST_BINS
+    quantized = (thumbnails >> (8 - int(np.log2(levels)))).astype(np.int64)
+    offsets = (np.arange(n * 3) * levels).reshape(n, 1, 1, 3)
+    hist = np.bincount((quantized + offsets).ravel(), minlength=n * 3 * levels)
+    hist = hist.reshape(n, 3, levels).astype(np.float32)
+    hist /= hist.sum(axis=2, keepdims=True)
+    # Earth mover's distance via cumulative histograms: a fade shifts the mass
+    # by one bin (small distance) instead of emptying it (L1 ≈ 1)
+    cdf = np.cumsum(hist, axis=2)
+    hist_diff = (np.abs(np.diff(cdf, axis=0)).sum(axis=2) / (levels - 1)).max(axis=1)
+
+    gray = thumbnails.astype(np.float32).mean(axis=3)
+    pixel_diff = np.abs(np.diff(gray, axis=0)).mean(axis=(1, 2)) / 255.0
+
+    return 0.5 * (hist_diff + pixel_diff)
+
+
+def detect_boundaries(scores: np.ndarray, fps: float) -> list[int]:
+    """Indices of the first frame of each new shot (excluding frame 0)."""
+    if scores.size == 0:
+        return []
+    median = float(np.median(scores))
+    mad = float(np.median(np.abs(scores - median)))
+    threshold = max(BOUNDARY_MIN_SCORE, median + BOUNDARY_MAD_K * mad)
+
+    min_gap = max(1, int(MIN_SHOT_SECONDS * fps))
+    boundaries: list[int] = []
+    # Strongest peaks first, so a weak transition never shadows a real cut
+    for i in np.argsort(-scores):
+        if scores[i] <= threshold:
+            break
+        start = int(i) + 1
+        if all(abs(start - b) >= min_gap for b in boundaries) and start >= min_gap:
+            boundaries.append(start)
+    return sorted(boundaries)
+
+
+def _scene_for_time(
+    timestamp: float,
+    scenes: list[VideoScene],
+    duration: float,
+) -> int:
+    """Map a timestamp onto the concept's scenes, scaling their nominal durations to the clip."""
+    nominal = np.array([max(s.duration_seconds, 1) for s in scenes], dtype=float)
+    ends = np.cumsum(nominal) * (duration / nominal.sum())
+    position = int(np.searchsorted(ends, timestamp, side="right"))
+    return scenes[min(position, len(scenes) - 1)].scene_number
+
+
+def select_keyframes(
+    decoder: FrameDecoder,
+    source: VideoSource,
+    scenes: Optional[list[VideoScene]] = None,
+    max_frames: Optional[Callable[[int, int], int]] = None,
+) -> list[SelectedFrame]:
+    """
+    One downsampled pass to find shots, one forward pass to decode the picks
+    at full resolution. Returns frames in clip order.
+    max_frames: frames the encoder can fit for a (width, height) clip;
+    default frame_budget at DEFAULT_FRAME_TOKEN_BUDGET.
+    """
+    scan: ClipScan = decoder.scan(source, SCAN_SIZE)
+    total = len(scan.thumbnails)
+    boundaries = detect_boundaries(difference_scores(scan.thumbnails), scan.fps)
+    starts = [0] + boundaries
+    ends = boundaries + [total]
+
+    width, height = scan.frame_size
+    limit = min((max_frames or frame_budget)(width, height), total)
+
+    # Shot midpoints; over budget, keep the longest shots
+    shots = sorted(zip(starts, ends), key=lambda se: se[1] - se[0], reverse=True)[:limit]
+    picks = {(start + end) // 2: True for start, end in shots}
+
+    # Static clip (few shots): pad with midpoints of the widest uncovered gaps
+    target = min(max(BASELINE_FRAMES, len(picks)), limit)
+    while len(picks) < target:
+        ordered = sorted({0, total - 1, *picks})
+        size, a, b = max((b - a, a, b) for a, b in zip(ordered, ordered[1:]))
+        if size < 2:
+            break
+        picks[(a + b) // 2] = False
+
+    frames = decoder.extract_at(source, sorted(picks))
+    duration = scan.duration
+
+    selected: list[SelectedFrame] = []
+    for frame in frames:
+        scene_number: Optional[int] = None
+        if scenes:
+            if len(starts) == len(scenes):
+                # Detected shots line up with the concept: map them one to one
+                shot = int(np.searchsorted(starts, frame.index, side="right")) - 1
+                scene_number = scenes[shot].scene_number
+            else:
+                scene_number = _scene_for_time(frame.timestamp, scenes, duration)
+        selected.append(SelectedFrame(frame, scene_number, picks.get(frame.index, False)))
+    return selected
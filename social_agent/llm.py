@@ -0,0 +1,131 @@
+"""
+Shared helpers around Anthropic messages.create for the orchestrator and the sub-agents:
+prompt-cache breakpoints on the stable prefixes, cache usage reporting,
+retries/circuit breaking under the "anthropic.messages" policy, one
+"anthropic.messages" tracing span per call, and token/cost accounting
+against the current post's budget (see usage).
+"""
+import threading
+from typing import Any
+
+from .resilience import acall_with_retry, call_with_retry
+from .tracing import span
+from .usage import budget_request, record_message
+
+# Prefix order for caching is tools → system → messages: a breakpoint caches
+# everything up to and including the block it is attached to.
+CACHE_CONTROL = {"type": "ephemeral"}
+
+_stats_lock = threading.Lock()
+_cache_stats: dict[str, dict[str, int]] = {}
+
+
+def cached_system(text: str) -> list[dict]:
+    """System prompt as a single text block carrying a cache breakpoint."""
+    return [{"type": "text", "text": text, "cache_control": CACHE_CONTROL}]
+
+
+def cached_tools(tools: list[dict]) -> list[dict]:
+    """Copy of the tool list with a breakpoint on the last definition (caches all tool schemas)."""
+    if not tools:
+        return tools
+    return [*tools[:-1], {**tools[-1], "cache_control": CACHE_CONTROL}]
+
+
+def cached_text(text: str) -> dict:
+    """Text content block carrying a cache breakpoint (e.g. retry context reused across calls)."""
+    return {"type": "text", "text": text, "cache_control": CACHE_CONTROL}
+
+
+def with_conversation_breakpoint(messages: list[dict]) -> list[dict]:
+    """
+    Copy of the conversation with a breakpoint on the last block of the last message,
+    so each turn reads the previous turns from the cache and writes the new prefix.
+    Only the outgoing copy is marked: stored messages never accumulate breakpoints.
+    """
+    if not messages:
+        return messages
+    last = messages[-1]
+    content = last["content"]
+    if isinstance(content, str):
+        blocks = [cached_text(content)]
+    else:
+        blocks = list(content)
+        if not blocks or not isinstance(blocks[-1], dict):
+            return messages
+        blocks[-1] = {**blocks[-1], "cache_control": CACHE_CONTROL}
+    return [*messages[:-1], {**last, "content": blocks}]
+
+
+def record_cache_usage(label: str, usage: Any) -> dict[str, int]:
+    """Print and accumulate the prompt-cache counters of one response."""
+    read = getattr(usage, "cache_read_input_tokens", None) or 0
+    written = getattr(usage, "cache_creation_input_tokens", None) or 0
+    uncached = getattr(usage, "input_tokens", None) or 0
+
+    with _stats_lock:
+        stats = _cache_stats.setdefault(label, {
+            "calls": 0, "hits": 0, "misses": 0,
+            "cache_read_tokens": 0, "cache_write_tokens": 0, "uncached_input_tokens": 0,
+        })
+        stats["calls"] += 1
+        stats["hits" if read else "misses"] += 1
+        stats["cache_read_tokens"] += read
+        stats["cache_write_tokens"] += written
+        stats["uncached_input_tokens"] += uncached
+
+    outcome = "HIT" if read else "MISS"
+    print(
+        f"  [Cache] {label}: {outcome} — {read} token letti dalla cache, "
+        f"{written} scritti, {uncached} non in cache"
+    )
+    return {"cache_read_tokens": read, "cache_write_tokens": written, "uncached_input_tokens": uncached}
+
+
+def cache_stats() -> dict[str, dict[str, int]]:
+    """Snapshot of the cache counters accumulated per caller label."""
+    with _stats_lock:
+        return {label: dict(stats) for label, stats in _cache_stats.items()}
+
+
+def _request_attributes(label: str, kwargs: dict[str, Any]) -> dict[str, Any]:
+    return {"label": label, "model": kwargs.get("model"), "max_tokens": kwargs.get("max_tokens")}
+
+
+def _trace_response(traced: Any, response: Any, cost_usd: float) -> None:
+    if traced is None:
+        return
+    usage = response.usage
+    traced.set(
+        cost_usd=round(cost_usd, 5),
+        stop_reason=response.stop_reason,
+        input_tokens=getattr(usage, "input_tokens", None),
+        output_tokens=getattr(usage, "output_tokens", None),
+        cache_read_input_tokens=getattr(usage, "cache_read_input_tokens", None),
+        cache_creation_input_tokens=getattr(usage, "cache_creation_input_tokens", None),
+    )
+
+
+def create_message(client: Any, label: str, image_tokens: int = 0, **kwargs: Any) -> Any:
+    """
+    client.messages.create plus retries, cache usage reporting and cost accounting
+    under `label`. image_tokens: estimated tokens of the images in the request.
+    """
+    kwargs = budget_request(kwargs)
+    with span("anthropic.messages", **_request_attributes(label, kwargs)) as traced:
+        response = call_with_retry("anthropic.messages", lambda: client.messages.create(**kwargs))
+        usage = record_message(label, kwargs["model"], response, image_tokens)
+        _trace_response(traced, response, usage.cost_usd)
+    record_cache_usage(label, response.usage)
+    return response
+
+
+async def acreate_message(client: Any, label: str, image_tokens: int = 0, **kwargs: Any) -> Any:
+    """Async counterpart of create_message for anthropic.AsyncAnthropic clients."""
+    kwargs = budget_request(kwargs)
+    with span("anthropic.messages", **_request_attributes(label, kwargs)) as traced:
+        response = await acall_with_retry("anthropic.messages", lambda: client.messages.create(**kwargs))
+        usage = record_message(label, kwargs["model"], response, image_tokens)
+        _trace_response(traced, response, usage.cost_usd)
+    record_cache_usage(label, response.usage)
+    return response
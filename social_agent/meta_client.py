@@ -1,13 +1,27 @@
+import json
 import os
 import requests
-from typing import Optional
-from dotenv import load_dotenv
+from dataclasses import dataclass, field
+from typing import Any, Iterable, Optional
+from urllib.parse import urlencode, urlsplit
 
-from .models import Platform, PublishResult, RecentPost
+import httpx
 
-load_dotenv()
+from .clients import get_async_http_client, get_http_session
+from .meta_rate_limit import (
+    DEFAULT_IG_PUBLISH_QUOTA,
+    IG_PUBLISH_WINDOW_SECONDS,
+    MetaRateLimitError,
+    MetaRateLimiter,
+    get_meta_rate_limiter,
+)
+from .models import Platform, PublishResult, RecentPost
+from .post_history import MAX_SYNC_PAGES, PAGE_SIZE, PostHistoryStore, get_post_history
+from .resilience import CircuitOpenError, acall_with_retry, call_with_retry
 
 GRAPH_API_BASE = "https://graph.facebook.com/v19.0"
+_GRAPH_HOST = urlsplit(GRAPH_API_BASE).hostname
+MAX_BATCH_OPERATIONS = 50
 
 
 class MetaAPIError(Exception):
@@ -30,150 +44,621 @@ def _check_meta_response(data: dict) -> None:
         )
 
 
-class MetaClient:
-    def __init__(self):
+def _ig_container_payload(caption: str, image_url: Optional[str], access_token: str) -> dict:
+    """Payload for the IG /media container creation call."""
+    payload: dict = {
+        "caption": caption,
+        "access_token": access_token,
+    }
+    if image_url:
+        payload["image_url"] = image_url
+        payload["media_type"] = "IMAGE"
+    else:
+        # Reels/carousel require media; for text-only we use a placeholder
+        # In practice IG requires an image — caller should always pass one.
+        payload["media_type"] = "IMAGE"
+    return payload
+
+
+def _parse_recent_posts(data: dict, platform: Platform) -> list[RecentPost]:
+    """Map a Graph API media/feed listing to RecentPost objects."""
+    if platform == Platform.INSTAGRAM:
+        caption_key, ts_key, link_key = "caption", "timestamp", "permalink"
+    else:
+        caption_key, ts_key, link_key = "message", "created_time", "permalink_url"
+    return [
+        RecentPost(
+            post_id=item["id"],
+            platform=platform,
+            caption=item.get(caption_key),
+            timestamp=item.get(ts_key),
+            permalink=item.get(link_key),
+        )
+        for item in data.get("data", [])
+    ]
+
+
+def _recent_posts_request(
+    platform: Platform,
+    account_id: str,
+    access_token: str,
+    limit: int,
+    since: Optional[int],
+) -> tuple[str, dict]:
+    """First page of a media/feed listing: a backfill of `limit` posts, or everything after `since`."""
+    if platform == Platform.INSTAGRAM:
+        url, fields = f"{GRAPH_API_BASE}/{account_id}/media", "id,caption,timestamp,permalink"
+    else:
+        url, fields = f"{GRAPH_API_BASE}/{account_id}/feed", "id,message,created_time,permalink_url"
+    params: dict = {"fields": fields, "limit": limit, "access_token": access_token}
+    if since is not None:
+        params["since"] = since
+        params["limit"] = PAGE_SIZE
+    return url, params
+
+
+def _next_page(data: dict) -> Optional[str]:
+    """Cursor URL of the next page (it already carries every query parameter)."""
+    return data.get("paging", {}).get("next")
+
+
+def _stale_posts(history: PostHistoryStore, key: str, limit: int, exc: Exception) -> list[RecentPost]:
+    posts = history.stale_posts(key, limit)
+    if posts:
+        age = history.age_seconds(key)
+        age_str = f"{age / 60:.0f} min fa" if age is not None else "età ignota"
+        print(f"  [Meta] Errore API ({exc}) — uso {len(posts)} post in cache ({age_str}).")
+    return posts
+
+
+@dataclass
+class _PostSync:
+    """Pending history sync of one account: the next page to fetch and what was fetched so far."""
+    platform: Platform
+    key: str
+    since: Optional[int]
+    limit: int
+    url: Optional[str]
+    params: Optional[dict]
+    fetched: list[RecentPost] = field(default_factory=list)
+    exhausted: bool = False
+
+    def feed(self, data: dict) -> bool:
+        """Consume one page; True when the next page (self.url) should be fetched too."""
+        _check_meta_response(data)
+        self.fetched.extend(_parse_recent_posts(data, self.platform))
+        self.url, self.params = _next_page(data), None
+        if self.url is None:
+            self.exhausted = self.since is None
+            return False
+        return not (self.since is None and len(self.fetched) >= self.limit)
+
+
+def _plan_post_sync(
+    history: PostHistoryStore,
+    platform: Platform,
+    account_id: str,
+    access_token: str,
+    limit: int,
+) -> tuple[Optional[list[RecentPost]], Optional[_PostSync]]:
+    """(fresh posts, None) when the local history can answer, else (None, sync to run)."""
+    key = f"{platform.value}:{account_id}"
+    cached = history.fresh_posts(key, limit)
+    if cached is not None:
+        return cached, None
+    since = history.since(key, limit)
+    url, params = _recent_posts_request(platform, account_id, access_token, limit, since)
+    return None, _PostSync(platform, key, since, limit, url, params)
+
+
+# ── Batch requests ─────────────────────────────────────────────────────────────
+# One POST to the Graph API root carries up to 50 operations. Each operation
+# carries its own access token, so Instagram and Facebook calls can share a batch;
+# dependent operations reference earlier results by name with JSONPath.
+# Used for the shared first page of a multi-account history sync, and for the
+# Instagram container → publish chain.
+
+def _batch_form(operations: list[dict], access_token: str) -> dict:
+    if len(operations) > MAX_BATCH_OPERATIONS:
+        raise ValueError(f"Batch Meta troppo grande: {len(operations)} > {MAX_BATCH_OPERATIONS} operazioni.")
+    return {"batch": json.dumps(operations), "include_headers": "false", "access_token": access_token}
+
+
+def _batch_get(url: str, params: Optional[dict]) -> dict:
+    relative = url[len(GRAPH_API_BASE) + 1:] if url.startswith(GRAPH_API_BASE) else url
+    if params:
+        relative += "?" + urlencode(params)
+    return {"method": "GET", "relative_url": relative}
+
+
+def _check_batch_response(data: Any) -> list[Optional[dict]]:
+    if isinstance(data, dict):
+        _check_meta_response(data)
+        raise MetaAPIError("Risposta batch inattesa dalla Graph API.")
+    return data
+
+
+def _batch_item_json(item: Optional[dict]) -> dict:
+    """Body of one batch result. MetaAPIError if it failed, or was skipped because a dependency failed."""
+    if item is None:
+        raise MetaAPIError("Operazione batch non eseguita: un'operazione da cui dipende è fallita.")
+    try:
+        body = json.loads(item.get("body") or "{}")
+    except ValueError as exc:
+        raise MetaAPIError(f"Risposta batch non valida: {exc}") from exc
+    _check_meta_response(body)
+    code = item.get("code", 200)
+    if code >= 400:
+        raise MetaAPIError(f"HTTP {code} nell'operazione batch", code=code)
+    return body
+
+
+def _ig_publish_operations(account_id: str, caption: str, image_url: Optional[str], access_token: str) -> list[dict]:
+    """Container creation and publish as one batch: the publish reads the container ID server-side."""
+    container = {
+        "method": "POST",
+        "name": "ig-container",
+        "relative_url": f"{account_id}/media",
+        "body": urlencode(_ig_container_payload(caption, image_url, access_token)),
+        # Results that others depend on are omitted by default; keep it for error reporting
+        "omit_response_on_success": False,
+    }
+    publish = {
+        "method": "POST",
+        "relative_url": f"{account_id}/media_publish",
+        "body": urlencode({"access_token": access_token}) + "&creation_id={result=ig-container:$.id}",
+    }
+    return [container, publish]
+
+
+def _ig_publish_result(container_item: Optional[dict], publish_item: Optional[dict]) -> PublishResult:
+    try:
+        _batch_item_json(container_item)
+        post_id = _batch_item_json(publish_item)["id"]
+    except MetaAPIError as e:
+        return PublishResult(success=False, platform=Platform.INSTAGRAM, error=str(e))
+    return PublishResult(
+        success=True,
+        platform=Platform.INSTAGRAM,
+        post_id=post_id,
+        post_url=f"https://www.instagram.com/p/{post_id}/",
+    )
+
+
+# ── Rate limiting ──────────────────────────────────────────────────────────────
+
+def _scopes(client: Any, platforms: Iterable[Platform]) -> list[str]:
+    """Rate-limit scopes a call counts against: the app plus the Page / IG account involved."""
+    scopes = ["app"]
+    for platform in dict.fromkeys(platforms):
+        if platform == Platform.INSTAGRAM:
+            scopes.append(f"ig:{client.ig_account_id}")
+        else:
+            scopes.append(f"page:{client.fb_page_id}")
+    return scopes
+
+
+def _operation_platforms(client: Any, operations: list[dict]) -> list[Platform]:
+    """Platforms touched by batch operations, from the account ID their relative_url starts with."""
+    platforms: list[Platform] = []
+    for operation in operations:
+        account_id = operation["relative_url"].split("/", 1)[0].split("?", 1)[0]
+        platforms.append(Platform.INSTAGRAM if account_id == client.ig_account_id else Platform.FACEBOOK)
+    return platforms
+
+
+def _observe_batch_items(limiter: MetaRateLimiter, items: list[Optional[dict]], scopes: list[str]) -> None:
+    for item in items:
+        if item and item.get("code", 200) >= 400:
+            try:
+                limiter.throttled(scopes, json.loads(item.get("body") or "{}").get("error", {}).get("code"))
+            except ValueError:
+                pass
+
+
+def _publishing_quota(data: dict) -> tuple[int, int, int]:
+    """(used, total, window seconds) from a content_publishing_limit response."""
+    entry = (data.get("data") or [{}])[0]
+    config = entry.get("config") or {}
+    return (
+        int(entry.get("quota_usage", 0)),
+        int(config.get("quota_total", DEFAULT_IG_PUBLISH_QUOTA)),
+        int(config.get("quota_duration", IG_PUBLISH_WINDOW_SECONDS)),
+    )
+
+
+def _response_json(resp: Any) -> Any:
+    """Body of a requests or httpx response; raises on HTTP errors."""
+    resp.raise_for_status()
+    return resp.json()
+
+
+class _MetaClientBase:
+    """
+    What MetaClient and AsyncMetaClient share: credentials, how each call is
+    built and how its response is read. The subclasses only add the transport
+    (_request) and the methods that have to wait on it.
+    """
+
+    # Network errors of the subclass's HTTP library
+    _transport_errors: tuple[type[Exception], ...] = ()
+
+    def __init__(self, history: Optional[PostHistoryStore], limiter: Optional[MetaRateLimiter]):
         self.ig_access_token = os.getenv("INSTAGRAM_ACCESS_TOKEN", "")
         self.ig_account_id = os.getenv("INSTAGRAM_BUSINESS_ACCOUNT_ID", "")
         self.fb_page_id = os.getenv("FACEBOOK_PAGE_ID", "")
         self.fb_page_token = os.getenv("FACEBOOK_PAGE_ACCESS_TOKEN", "")
-        self._session = requests.Session()
+        self._history = history or get_post_history()
+        self._limiter = limiter or get_meta_rate_limiter()
+
+    def rate_limit_budget(self) -> dict[str, dict[str, Any]]:
+        """Current headroom per scope (see MetaRateLimiter.budget)."""
+        return self._limiter.budget()
+
+    @property
+    def _publish_errors(self) -> tuple[type[Exception], ...]:
+        """Failures reported as an unsuccessful PublishResult rather than raised."""
+        return (MetaAPIError, MetaRateLimitError, CircuitOpenError, *self._transport_errors)
+
+    def _credentials(self, platform: Platform) -> tuple[str, str]:
+        if platform == Platform.INSTAGRAM:
+            return self.ig_account_id, self.ig_access_token
+        return self.fb_page_id, self.fb_page_token
+
+    @staticmethod
+    def _endpoint(method: str, idempotent: Optional[bool]) -> str:
+        """Resilience endpoint: writes are never repeated once sent (see resilience)."""
+        return "meta.read" if (method == "GET" if idempotent is None else idempotent) else "meta.write"
+
+    # ── Batch ──────────────────────────────────────────────────────────────────
+
+    def _batch_call(self, operations: list[dict]) -> dict[str, Any]:
+        """_request arguments of a batch; Meta counts every operation against the rate limits."""
+        return {
+            "method": "POST",
+            "url": f"{GRAPH_API_BASE}/",
+            "platforms": _operation_platforms(self, operations),
+            "cost": len(operations),
+            "idempotent": all(operation["method"] == "GET" for operation in operations),
+            "data": _batch_form(operations, self.ig_access_token or self.fb_page_token),
+            "timeout": 30,
+        }
+
+    def _batch_items(self, resp: Any, call: dict[str, Any]) -> list[Optional[dict]]:
+        items = _check_batch_response(_response_json(resp))
+        _observe_batch_items(self._limiter, items, _scopes(self, call["platforms"]))
+        return items
+
+    # ── Publishing ─────────────────────────────────────────────────────────────
+
+    def _instagram_published(self, items: list[Optional[dict]]) -> PublishResult:
+        result = _ig_publish_result(items[0], items[1])
+        self._after_publish(result)
+        return result
+
+    def _after_publish(self, result: PublishResult) -> None:
+        if result.success:
+            account_id = self.ig_account_id if result.platform == Platform.INSTAGRAM else self.fb_page_id
+            self._history.mark_stale(f"{result.platform.value}:{account_id}")
+
+    def _publishing_quota_call(self) -> dict[str, Any]:
+        return {
+            "method": "GET",
+            "url": f"{GRAPH_API_BASE}/{self.ig_account_id}/content_publishing_limit",
+            "platforms": [Platform.INSTAGRAM],
+            "params": {"fields": "config,quota_usage", "access_token": self.ig_access_token},
+            "timeout": 15,
+        }
+
+    def _set_publishing_quota(self, resp: Any) -> None:
+        data = _response_json(resp)
+        _check_meta_response(data)
+        self._limiter.set_publishing_quota(self.ig_account_id, *_publishing_quota(data))
+
+    def _facebook_publish_call(self, message: str) -> dict[str, Any]:
+        return {
+            "method": "POST",
+            "url": f"{GRAPH_API_BASE}/{self.fb_page_id}/feed",
+            "platforms": [Platform.FACEBOOK],
+            "json": {"message": message, "access_token": self.fb_page_token},
+            "timeout": 30,
+        }
+
+    def _facebook_published(self, resp: Any) -> PublishResult:
+        data = _response_json(resp)
+        _check_meta_response(data)
+        post_id = data["id"]
+        result = PublishResult(
+            success=True,
+            platform=Platform.FACEBOOK,
+            post_id=post_id,
+            post_url=f"https://www.facebook.com/{post_id}",
+        )
+        self._after_publish(result)
+        return result
+
+    # ── Post history ───────────────────────────────────────────────────────────
+
+    def _plan_recent_posts(
+        self, names: list[str], limit: int,
+    ) -> tuple[dict[str, list[RecentPost]], list[_PostSync]]:
+        """Posts the local history can answer, and the syncs still to run."""
+        results: dict[str, list[RecentPost]] = {}
+        pending: list[_PostSync] = []
+        for name in names:
+            platform = Platform(name)
+            cached, sync = _plan_post_sync(self._history, platform, *self._credentials(platform), limit)
+            if sync is None:
+                results[name] = cached
+            else:
+                pending.append(sync)
+        return results, pending
+
+    def _first_pages(
+        self,
+        pending: list[_PostSync],
+        items: list[Any],
+        results: dict[str, list[RecentPost]],
+    ) -> list[tuple[_PostSync, dict]]:
+        """
+        Read the shared first-page batch: accounts whose page failed get their
+        stale posts in `results`, the others are returned to continue syncing.
+        """
+        fetched: list[tuple[_PostSync, dict]] = []
+        for sync, item in zip(pending, items):
+            try:
+                if isinstance(item, Exception):
+                    raise item
+                fetched.append((sync, _batch_item_json(item)))
+            except Exception as exc:
+                results[sync.platform.value] = _stale_posts(self._history, sync.key, sync.limit, exc)
+        return fetched
+
+    def _sync_page_call(self, sync: _PostSync) -> dict[str, Any]:
+        return {"method": "GET", "url": sync.url, "platforms": [sync.platform], "params": sync.params, "timeout": 15}
+
+    def _merge_sync(self, sync: _PostSync) -> list[RecentPost]:
+        return self._history.merge(sync.key, sync.fetched, sync.exhausted, sync.limit, full=sync.since is None)
+
+
+class MetaClient(_MetaClientBase):
+    _transport_errors = (requests.RequestException,)
+
+    def __init__(
+        self,
+        session: Optional[requests.Session] = None,
+        history: Optional[PostHistoryStore] = None,
+        limiter: Optional[MetaRateLimiter] = None,
+    ):
+        super().__init__(history, limiter)
+        self._session = session or get_http_session(_GRAPH_HOST)
+
+    # ── Rate-limited transport ─────────────────────────────────────────────────
+
+    def _request(
+        self,
+        method: str,
+        url: str,
+        platforms: Iterable[Platform],
+        cost: int = 1,
+        idempotent: Optional[bool] = None,
+        **kwargs: Any,
+    ):
+        """
+        One Graph API call, paced by the rate limiter and feeding it the usage headers.
+        Transient failures are retried (see resilience); every attempt is paced and observed.
+        idempotent defaults to method == "GET": writes are never repeated once sent.
+        """
+        scopes = _scopes(self, platforms)
+
+        def send():
+            self._limiter.acquire(scopes, cost)
+            resp = self._session.request(method, url, **kwargs)
+            self._limiter.observe_response(resp, scopes)
+            return resp
+
+        return call_with_retry(self._endpoint(method, idempotent), send)
+
+    # ── Batch ──────────────────────────────────────────────────────────────────
+
+    def batch(self, operations: list[dict]) -> list[Optional[dict]]:
+        """
+        Run Graph API operations in one request. Returns one item per operation
+        ({"code", "body"}), or None where a dependency failed.
+        Meta counts every operation of a batch against the rate limits.
+        """
+        call = self._batch_call(operations)
+        return self._batch_items(self._request(**call), call)
 
     # ── Instagram ──────────────────────────────────────────────────────────────
 
+    def _reserve_instagram_publish(self) -> None:
+        """Wait for a slot in the IG 24 h publishing quota, refreshing it from the API hourly."""
+        if self._limiter.needs_publishing_quota(self.ig_account_id):
+            try:
+                self._set_publishing_quota(self._request(**self._publishing_quota_call()))
+            except (MetaAPIError, ValueError, *self._transport_errors):
+                self._limiter.set_publishing_quota(self.ig_account_id, used=0)
+        self._limiter.acquire([f"ig_publish:{self.ig_account_id}"])
+
     def instagram_publish(
         self,
         caption: str,
         image_url: Optional[str] = None,
     ) -> PublishResult:
-        """Two-step Instagram publish: create container → publish container."""
+        """Two-step Instagram publish (create container → publish container) in one batch request."""
+        operations = _ig_publish_operations(self.ig_account_id, caption, image_url, self.ig_access_token)
         try:
-            # Step 1: create media container
-            container_payload: dict = {
-                "caption": caption,
-                "access_token": self.ig_access_token,
-            }
-            if image_url:
-                container_payload["image_url"] = image_url
-                container_payload["media_type"] = "IMAGE"
-            else:
-                # Reels/carousel require media; for text-only we use a placeholder
-                # In practice IG requires an image — caller should always pass one.
-                container_payload["media_type"] = "IMAGE"
-
-            resp = self._session.post(
-                f"{GRAPH_API_BASE}/{self.ig_account_id}/media",
-                json=container_payload,
-                timeout=30,
-            )
-            resp.raise_for_status()
-            data = resp.json()
-            _check_meta_response(data)
-            container_id = data["id"]
-
-            # Step 2: publish container
-            publish_resp = self._session.post(
-                f"{GRAPH_API_BASE}/{self.ig_account_id}/media_publish",
-                json={"creation_id": container_id, "access_token": self.ig_access_token},
-                timeout=30,
-            )
-            publish_resp.raise_for_status()
-            publish_data = publish_resp.json()
-            _check_meta_response(publish_data)
-            post_id = publish_data["id"]
-
-            return PublishResult(
-                success=True,
-                platform=Platform.INSTAGRAM,
-                post_id=post_id,
-                post_url=f"https://www.instagram.com/p/{post_id}/",
-            )
-        except MetaAPIError as e:
-            return PublishResult(success=False, platform=Platform.INSTAGRAM, error=str(e))
-        except requests.RequestException as e:
+            self._reserve_instagram_publish()
+            items = self.batch(operations)
+        except self._publish_errors as e:
             return PublishResult(success=False, platform=Platform.INSTAGRAM, error=str(e))
+        return self._instagram_published(items)
 
     def instagram_get_recent_posts(self, limit: int = 5) -> list[RecentPost]:
-        """Return recent IG posts for editorial context. Silent fallback on error."""
-        try:
-            resp = self._session.get(
-                f"{GRAPH_API_BASE}/{self.ig_account_id}/media",
-                params={
-                    "fields": "id,caption,timestamp,permalink",
-                    "limit": limit,
-                    "access_token": self.ig_access_token,
-                },
-                timeout=15,
-            )
-            resp.raise_for_status()
-            data = resp.json()
-            _check_meta_response(data)
-            posts = []
-            for item in data.get("data", []):
-                posts.append(
-                    RecentPost(
-                        post_id=item["id"],
-                        platform=Platform.INSTAGRAM,
-                        caption=item.get("caption"),
-                        timestamp=item.get("timestamp"),
-                        permalink=item.get("permalink"),
-                    )
-                )
-            return posts
-        except Exception:
-            return []
+        """Return recent IG posts for editorial context (local history, synced incrementally)."""
+        return self.get_recent_posts(["instagram"], limit)
 
     # ── Facebook ───────────────────────────────────────────────────────────────
 
     def facebook_publish(self, message: str) -> PublishResult:
         """Publish to Facebook Page feed using Page Access Token."""
         try:
-            resp = self._session.post(
-                f"{GRAPH_API_BASE}/{self.fb_page_id}/feed",
-                json={"message": message, "access_token": self.fb_page_token},
-                timeout=30,
-            )
-            resp.raise_for_status()
-            data = resp.json()
-            _check_meta_response(data)
-            post_id = data["id"]
-
-            return PublishResult(
-                success=True,
-                platform=Platform.FACEBOOK,
-                post_id=post_id,
-                post_url=f"https://www.facebook.com/{post_id}",
-            )
-        except MetaAPIError as e:
-            return PublishResult(success=False, platform=Platform.FACEBOOK, error=str(e))
-        except requests.RequestException as e:
+            return self._facebook_published(self._request(**self._facebook_publish_call(message)))
+        except self._publish_errors as e:
             return PublishResult(success=False, platform=Platform.FACEBOOK, error=str(e))
 
     def facebook_get_recent_posts(self, limit: int = 5) -> list[RecentPost]:
-        """Return recent FB page posts for editorial context. Silent fallback on error."""
+        """Return recent FB page posts for editorial context (local history, synced incrementally)."""
+        return self.get_recent_posts(["facebook"], limit)
+
+    # ── Post history ───────────────────────────────────────────────────────────
+
+    def get_recent_posts(self, platforms: list[str], limit: int = 5) -> list[RecentPost]:
+        """
+        Recent posts of several platforms, served from the local history when fresh.
+        Accounts that need a sync fetch their first page in one shared batch request.
+        """
+        names = list(dict.fromkeys(platforms))
+        results, pending = self._plan_recent_posts(names, limit)
+        if len(pending) == 1:
+            results[pending[0].platform.value] = self._run_sync(pending[0])
+        elif pending:
+            try:
+                items = self.batch([_batch_get(sync.url, sync.params) for sync in pending])
+            except Exception as exc:
+                items = [exc] * len(pending)
+            for sync, first_page in self._first_pages(pending, items, results):
+                results[sync.platform.value] = self._run_sync(sync, first_page)
+        return [post for name in names for post in results[name]]
+
+    def _run_sync(self, sync: _PostSync, first_page: Optional[dict] = None) -> list[RecentPost]:
+        """Fetch (or continue from first_page) and merge; stale posts if the API fails."""
+        data = first_page
+        try:
+            for _ in range(MAX_SYNC_PAGES):
+                if data is None:
+                    data = _response_json(self._request(**self._sync_page_call(sync)))
+                if not sync.feed(data):
+                    break
+                data = None
+        except Exception as exc:
+            return _stale_posts(self._history, sync.key, sync.limit, exc)
+        return self._merge_sync(sync)
+
+
+class AsyncMetaClient(_MetaClientBase):
+    """asyncio counterpart of MetaClient, built on httpx.AsyncClient."""
+
+    _transport_errors = (httpx.HTTPError,)
+
+    def __init__(
+        self,
+        client: Optional[httpx.AsyncClient] = None,
+        history: Optional[PostHistoryStore] = None,
+        limiter: Optional[MetaRateLimiter] = None,
+    ):
+        super().__init__(history, limiter)
+        self._client = client or get_async_http_client(_GRAPH_HOST)
+
+    # ── Rate-limited transport ─────────────────────────────────────────────────
+
+    async def _request(
+        self,
+        method: str,
+        url: str,
+        platforms: Iterable[Platform],
+        cost: int = 1,
+        idempotent: Optional[bool] = None,
+        **kwargs: Any,
+    ):
+        """One Graph API call, paced and retried (see MetaClient._request)."""
+        scopes = _scopes(self, platforms)
+
+        async def send():
+            await self._limiter.aacquire(scopes, cost)
+            resp = await self._client.request(method, url, **kwargs)
+            self._limiter.observe_response(resp, scopes)
+            return resp
+
+        return await acall_with_retry(self._endpoint(method, idempotent), send)
+
+    # ── Batch ──────────────────────────────────────────────────────────────────
+
+    async def batch(self, operations: list[dict]) -> list[Optional[dict]]:
+        """Run Graph API operations in one request (see MetaClient.batch)."""
+        call = self._batch_call(operations)
+        return self._batch_items(await self._request(**call), call)
+
+    # ── Instagram ──────────────────────────────────────────────────────────────
+
+    async def _reserve_instagram_publish(self) -> None:
+        """Wait for a slot in the IG 24 h publishing quota (see MetaClient)."""
+        if self._limiter.needs_publishing_quota(self.ig_account_id):
+            try:
+                self._set_publishing_quota(await self._request(**self._publishing_quota_call()))
+            except (MetaAPIError, ValueError, *self._transport_errors):
+                self._limiter.set_publishing_quota(self.ig_account_id, used=0)
+        await self._limiter.aacquire([f"ig_publish:{self.ig_account_id}"])
+
+    async def instagram_publish(
+        self,
+        caption: str,
+        image_url: Optional[str] = None,
+    ) -> PublishResult:
+        """Two-step Instagram publish (create container → publish container) in one batch request."""
+        operations = _ig_publish_operations(self.ig_account_id, caption, image_url, self.ig_access_token)
+        try:
+            await self._reserve_instagram_publish()
+            items = await self.batch(operations)
+        except self._publish_errors as e:
+            return PublishResult(success=False, platform=Platform.INSTAGRAM, error=str(e))
+        return self._instagram_published(items)
+
+    async def instagram_get_recent_posts(self, limit: int = 5) -> list[RecentPost]:
+        """Return recent IG posts for editorial context (local history, synced incrementally)."""
+        return await self.get_recent_posts(["instagram"], limit)
+
+    # ── Facebook ───────────────────────────────────────────────────────────────
+
+    async def facebook_publish(self, message: str) -> PublishResult:
+        """Publish to Facebook Page feed using Page Access Token."""
+        try:
+            return self._facebook_published(await self._request(**self._facebook_publish_call(message)))
+        except self._publish_errors as e:
+            return PublishResult(success=False, platform=Platform.FACEBOOK, error=str(e))
+
+    async def facebook_get_recent_posts(self, limit: int = 5) -> list[RecentPost]:
+        """Return recent FB page posts for editorial context (local history, synced incrementally)."""
+        return await self.get_recent_posts(["facebook"], limit)
+
+    # ── Post history ───────────────────────────────────────────────────────────
+
+    async def get_recent_posts(self, platforms: list[str], limit: int = 5) -> list[RecentPost]:
+        """Recent posts of several platforms (see MetaClient.get_recent_posts)."""
+        names = list(dict.fromkeys(platforms))
+        results, pending = self._plan_recent_posts(names, limit)
+        if len(pending) == 1:
+            results[pending[0].platform.value] = await self._run_sync(pending[0])
+        elif pending:
+            try:
+                items = await self.batch([_batch_get(sync.url, sync.params) for sync in pending])
+            except Exception as exc:
+                items = [exc] * len(pending)
+            for sync, first_page in self._first_pages(pending, items, results):
+                results[sync.platform.value] = await self._run_sync(sync, first_page)
+        return [post for name in names for post in results[name]]
+
+    async def _run_sync(self, sync: _PostSync, first_page: Optional[dict] = None) -> list[RecentPost]:
+        """Fetch (or continue from first_page) and merge; stale posts if the API fails."""
+        data = first_page
         try:
-            resp = self._session.get(
-                f"{GRAPH_API_BASE}/{self.fb_page_id}/feed",
-                params={
-                    "fields": "id,message,created_time,permalink_url",
-                    "limit": limit,
-                    "access_token": self.fb_page_token,
-                },
-                timeout=15,
-            )
-            resp.raise_for_status()
-            data = resp.json()
-            _check_meta_response(data)
-            posts = []
-            for item in data.get("data", []):
-                posts.append(
-                    RecentPost(
-                        post_id=item["id"],
-                        platform=Platform.FACEBOOK,
-                        caption=item.get("message"),
-                        timestamp=item.get("created_time"),
-                        permalink=item.get("permalink_url"),
-                    )
-                )
-            return posts
-        except Exception:
-            return []
+            for _ in range(MAX_SYNC_PAGES):
+                if data is None:
+                    data = _response_json(await self._request(**self._sync_page_call(sync)))
+                if not sync.feed(data):
+                    break
+                data = None
+        except Exception as exc:
+            return _stale_posts(self._history, sync.key, sync.limit, exc)
+        return self._merge_sync(sync)
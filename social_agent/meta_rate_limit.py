@@ -0,0 +1,289 @@
+"""
+Rate-limit scheduler for the Graph API.
+
+Meta reports how much of each rate limit has been used in response headers:
+X-App-Usage (app-wide), X-Page-Usage and X-Business-Use-Case-Usage (per Page or
+Instagram account, with an estimated_time_to_regain_access when throttled).
+Instagram additionally caps API publishes per 24 h, exposed by the
+/{ig-user-id}/content_publishing_limit endpoint.
+
+MetaRateLimiter keeps one token bucket per scope ("app", "page:<id>",
+"ig:<id>", "ig_publish:<id>"). Buckets refill over Meta's rolling window and
+are re-synced to the server's numbers after every response. The cost of a
+call, in usage percent, is learned from consecutive headers. acquire()
+reserves tokens and sleeps until they are available, so concurrent callers
+queue up instead of running into throttling errors; budget() exposes the
+remaining headroom so batch runs can pace themselves.
+"""
+import asyncio
+import json
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Iterable, Optional
+
+USAGE_CEILING_PCT = 80.0             # stay below this share of every usage limit
+USAGE_WINDOW_SECONDS = 3600          # Meta's usage percentages are over a rolling hour
+DEFAULT_CALL_COST_PCT = 1.0          # until learned from the headers
+RATE_LIMIT_BACKOFF_SECONDS = 300     # throttled without a regain estimate
+MAX_ACQUIRE_WAIT_SECONDS = 900       # longer waits fail fast instead of stalling the run
+DEFAULT_IG_PUBLISH_QUOTA = 50        # posts per 24 h, until the endpoint says otherwise
+IG_PUBLISH_WINDOW_SECONDS = 24 * 3600
+PUBLISH_QUOTA_REFRESH_SECONDS = 3600
+
+# Graph API error codes that mean "throttled" (app, user, page, BUC, IG publishing)
+RATE_LIMIT_ERROR_CODES = frozenset({4, 9, 17, 32, 613, 80001, 80002})
+
+_BUC_SCOPE_PREFIX = {"pages": "page", "instagram": "ig"}
+
+
+class MetaRateLimitError(Exception):
+    """The call would have to wait longer than MAX_ACQUIRE_WAIT_SECONDS for budget."""
+
+    def __init__(self, scopes: list[str], wait_seconds: float):
+        super().__init__(
+            f"Budget Meta esaurito per {', '.join(scopes)}: disponibile tra {wait_seconds / 60:.0f} min."
+        )
+        self.scopes = scopes
+        self.wait_seconds = wait_seconds
+
+
+@dataclass
+class _Bucket:
+    capacity: float
+    refill_per_second: float
+    tokens: float
+    unit_cost: float                  # tokens consumed by one call
+    usage_pct: Optional[float] = None
+    blocked_until: float = 0.0
+    calls_since_observed: int = 0
+    updated_at: float = 0.0
+    learn_cost: bool = True
+
+    def refill(self, now: float) -> None:
+        if self.updated_at:
+            elapsed = now - self.updated_at
+            self.tokens = min(self.capacity, self.tokens + elapsed * self.refill_per_second)
+        self.updated_at = now
+
+    def wait_for(self, cost: float, now: float) -> float:
+        """Seconds until `cost` calls fit (without reserving)."""
+        needed = cost * self.unit_cost - self.tokens
+        refill_wait = needed / self.refill_per_second if needed > 0 else 0.0
+        return max(refill_wait, self.blocked_until - now, 0.0)
+
+
+def _usage_bucket() -> _Bucket:
+    return _Bucket(
+        capacity=USAGE_CEILING_PCT,
+        refill_per_second=100.0 / USAGE_WINDOW_SECONDS,
+        tokens=USAGE_CEILING_PCT,
+        unit_cost=DEFAULT_CALL_COST_PCT,
+    )
+
+
+def _parse_json_header(value: Optional[str]) -> Any:
+    if not value:
+        return None
+    try:
+        return json.loads(value)
+    except ValueError:
+        return None
+
+
+def _usage_pct(entry: dict) -> float:
+    return float(max(entry.get("call_count", 0), entry.get("total_cputime", 0), entry.get("total_time", 0)))
+
+
+def parse_usage_headers(headers: Any, page_scope: Optional[str] = None) -> dict[str, tuple[float, float]]:
+    """
+    {scope: (usage percent, seconds until access is regained)} from a Graph API response.
+    X-Page-Usage carries no Page ID: it is attributed to page_scope, the Page the call was for.
+    """
+    usage: dict[str, tuple[float, float]] = {}
+    app = _parse_json_header(headers.get("X-App-Usage"))
+    if isinstance(app, dict):
+        usage["app"] = (_usage_pct(app), 0.0)
+    page = _parse_json_header(headers.get("X-Page-Usage"))
+    if page_scope and isinstance(page, dict):
+        regain = float(page.get("estimated_time_to_regain_access") or 0) * 60
+        usage[page_scope] = (_usage_pct(page), regain)
+    buc = _parse_json_header(headers.get("X-Business-Use-Case-Usage"))
+    if isinstance(buc, dict):
+        for object_id, entries in buc.items():
+            for entry in entries or []:
+                prefix = _BUC_SCOPE_PREFIX.get(entry.get("type"), entry.get("type", "buc"))
+                regain = float(entry.get("estimated_time_to_regain_access") or 0) * 60
+                scope = f"{prefix}:{object_id}"
+                previous = usage.get(scope, (0.0, 0.0))
+                usage[scope] = (max(previous[0], _usage_pct(entry)), max(previous[1], regain))
+    return usage
+
+
+class MetaRateLimiter:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets: dict[str, _Bucket] = {}
+        self._quota_checked_at: dict[str, float] = {}
+
+    def _bucket(self, scope: str) -> _Bucket:
+        bucket = self._buckets.get(scope)
+        if bucket is None:
+            bucket = self._buckets[scope] = _usage_bucket()
+        return bucket
+
+    # ── Scheduling ─────────────────────────────────────────────────────────────
+
+    def _reserve(self, scopes: list[str], cost: float) -> float:
+        """
+        Reserve `cost` calls on every scope; returns how long the caller must wait.
+        Raises MetaRateLimitError (reserving nothing) past MAX_ACQUIRE_WAIT_SECONDS.
+        """
+        now = time.monotonic()
+        with self._lock:
+            buckets = [self._bucket(scope) for scope in scopes]
+            for bucket in buckets:
+                bucket.refill(now)
+            wait = max((bucket.wait_for(cost, now) for bucket in buckets), default=0.0)
+            if wait > MAX_ACQUIRE_WAIT_SECONDS:
+                raise MetaRateLimitError(scopes, wait)
+            for bucket in buckets:
+                # Tokens may go negative: later callers queue behind this reservation
+                bucket.tokens -= cost * bucket.unit_cost
+                bucket.calls_since_observed += int(cost)
+        return wait
+
+    def acquire(self, scopes: Iterable[str], cost: float = 1.0) -> float:
+        """Block until `cost` calls fit every scope's budget. Returns the seconds waited."""
+        scopes = list(scopes)
+        wait = self._reserve(scopes, cost)
+        if wait > 0:
+            print(f"  [RateLimit] {', '.join(scopes)}: attesa {wait:.1f}s per restare sotto i limiti Meta")
+            time.sleep(wait)
+        return wait
+
+    async def aacquire(self, scopes: Iterable[str], cost: float = 1.0) -> float:
+        """asyncio counterpart of acquire()."""
+        scopes = list(scopes)
+        wait = self._reserve(scopes, cost)
+        if wait > 0:
+            print(f"  [RateLimit] {', '.join(scopes)}: attesa {wait:.1f}s per restare sotto i limiti Meta")
+            await asyncio.sleep(wait)
+        return wait
+
+    # ── Feedback from responses ────────────────────────────────────────────────
+
+    def observe(self, headers: Any, page_scope: Optional[str] = None) -> None:
+        """Re-sync buckets to the usage Meta reports, learning the per-call cost."""
+        now = time.monotonic()
+        with self._lock:
+            for scope, (usage, regain) in parse_usage_headers(headers, page_scope).items():
+                bucket = self._bucket(scope)
+                bucket.refill(now)
+                if bucket.learn_cost and bucket.usage_pct is not None and bucket.calls_since_observed:
+                    delta = (usage - bucket.usage_pct) / bucket.calls_since_observed
+                    if delta > 0:
+                        bucket.unit_cost = 0.8 * bucket.unit_cost + 0.2 * delta
+                bucket.usage_pct = usage
+                bucket.calls_since_observed = 0
+                bucket.tokens = min(bucket.tokens, bucket.capacity - usage)
+                if regain:
+                    bucket.blocked_until = max(bucket.blocked_until, now + regain)
+
+    def throttled(self, scopes: Iterable[str], code: Optional[int]) -> None:
+        """A call failed with a rate-limit error: hold the scopes back."""
+        if code not in RATE_LIMIT_ERROR_CODES:
+            return
+        now = time.monotonic()
+        with self._lock:
+            for scope in scopes:
+                bucket = self._bucket(scope)
+                bucket.blocked_until = max(bucket.blocked_until, now + RATE_LIMIT_BACKOFF_SECONDS)
+        print(f"  [RateLimit] Limite Meta raggiunto (codice {code}) — pausa di {RATE_LIMIT_BACKOFF_SECONDS}s")
+
+    def observe_response(self, response: Any, scopes: Iterable[str]) -> None:
+        """observe() plus throttling detection, for requests and httpx responses alike."""
+        scopes = list(scopes)
+        page_scope = next((scope for scope in scopes if scope.startswith("page:")), None)
+        self.observe(response.headers, page_scope)
+        if response.status_code < 400:
+            return
+        try:
+            error = response.json().get("error", {})
+        except (ValueError, AttributeError):
+            return
+        self.throttled(scopes, error.get("code"))
+
+    # ── Instagram publishing quota ─────────────────────────────────────────────
+
+    def needs_publishing_quota(self, ig_account_id: str) -> bool:
+        checked = self._quota_checked_at.get(ig_account_id)
+        return checked is None or time.monotonic() - checked > PUBLISH_QUOTA_REFRESH_SECONDS
+
+    def set_publishing_quota(
+        self,
+        ig_account_id: str,
+        used: int,
+        total: int = DEFAULT_IG_PUBLISH_QUOTA,
+        window_seconds: float = IG_PUBLISH_WINDOW_SECONDS,
+    ) -> None:
+        now = time.monotonic()
+        with self._lock:
+            self._buckets[f"ig_publish:{ig_account_id}"] = _Bucket(
+                capacity=float(total),
+                refill_per_second=total / window_seconds,
+                tokens=float(total - used),
+                unit_cost=1.0,
+                usage_pct=100.0 * used / total if total else None,
+                updated_at=now,
+                learn_cost=False,
+            )
+            self._quota_checked_at[ig_account_id] = now
+
+    # ── Budget ─────────────────────────────────────────────────────────────────
+
+    def time_until_available(self, scopes: Iterable[str], calls: float = 1.0) -> float:
+        """Seconds until `calls` calls fit every scope, without reserving anything."""
+        now = time.monotonic()
+        with self._lock:
+            waits = [0.0]
+            for scope in scopes:
+                bucket = self._bucket(scope)
+                bucket.refill(now)
+                waits.append(bucket.wait_for(calls, now))
+        return max(waits)
+
+    def budget(self) -> dict[str, dict[str, Any]]:
+        """Per scope: last reported usage, calls that fit right now, seconds still blocked."""
+        now = time.monotonic()
+        snapshot: dict[str, dict[str, Any]] = {}
+        with self._lock:
+            for scope, bucket in sorted(self._buckets.items()):
+                bucket.refill(now)
+                snapshot[scope] = {
+                    "usage_pct": None if bucket.usage_pct is None else round(bucket.usage_pct, 1),
+                    "calls_available": max(int(bucket.tokens / bucket.unit_cost), 0),
+                    "cost_per_call": round(bucket.unit_cost, 3),
+                    "blocked_for_seconds": round(max(bucket.blocked_until - now, 0.0), 1),
+                }
+        return snapshot
+
+
+_limiter: Optional[MetaRateLimiter] = None
+_limiter_lock = threading.Lock()
+
+
+def get_meta_rate_limiter() -> MetaRateLimiter:
+    """The process-wide limiter shared by every MetaClient and AsyncMetaClient."""
+    global _limiter
+    with _limiter_lock:
+        if _limiter is None:
+            _limiter = MetaRateLimiter()
+        return _limiter
+
+
+def print_rate_limit_budget() -> None:
+    for scope, entry in get_meta_rate_limiter().budget().items():
+        usage = f"{entry['usage_pct']}%" if entry["usage_pct"] is not None else "n/d"
+        blocked = f", bloccato {entry['blocked_for_seconds']}s" if entry["blocked_for_seconds"] else ""
+        print(f"  [RateLimit] {scope}: utilizzo {usage}, {entry['calls_available']} chiamate disponibili{blocked}")
@@ -0,0 +1,180 @@
+"""
+Local history of the account's own posts, synced incrementally from the Graph API.
+
+get_recent_posts runs at the start of every run and again after every
+rejection, always asking for the same handful of posts. MetaClient now keeps
+them in cache/post_history.json, one entry per account ("instagram:<id>",
+"facebook:<page id>"):
+
+- Within FRESHNESS_SECONDS of the last sync, requests are served locally.
+- Past the window, only posts newer than the newest known one are fetched
+  (`since` filter + cursor pagination) and merged by post ID.
+- A first sync, or a request for more posts than the store holds, pages
+  backwards until it has enough (or the account runs out of posts).
+- Every FULL_SYNC_SECONDS the sync fetches the whole window again instead of
+  only newer posts; stored posts inside that window that Meta no longer returns
+  were deleted there and are dropped.
+- When the API fails, the stored posts are returned, stale, instead of [].
+"""
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Optional
+
+from .models import RecentPost
+
+HISTORY_PATH = Path(__file__).parent.parent / "cache" / "post_history.json"
+FRESHNESS_SECONDS = 10 * 60
+FULL_SYNC_SECONDS = 60 * 60
+PAGE_SIZE = 25
+MAX_SYNC_PAGES = 10
+
+
+def _parse_timestamp(value: Optional[str]) -> float:
+    """Graph API timestamps ("2024-05-01T09:30:00+0000") as epoch seconds; 0 if missing."""
+    if not value:
+        return 0.0
+    try:
+        return datetime.strptime(value, "%Y-%m-%dT%H:%M:%S%z").timestamp()
+    except ValueError:
+        return 0.0
+
+
+class PostHistoryStore:
+    def __init__(
+        self,
+        path: Path = HISTORY_PATH,
+        freshness_seconds: float = FRESHNESS_SECONDS,
+        full_sync_seconds: float = FULL_SYNC_SECONDS,
+    ):
+        self.path = Path(path)
+        self.freshness_seconds = freshness_seconds
+        self.full_sync_seconds = full_sync_seconds
+        self._lock = threading.Lock()
+        self._accounts: dict[str, dict[str, Any]] = self._load()
+
+    def _load(self) -> dict[str, dict[str, Any]]:
+        try:
+            return json.loads(self.path.read_text(encoding="utf-8"))["accounts"]
+        except (OSError, ValueError, KeyError):
+            return {}
+
+    def _save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".json.tmp")
+        tmp.write_text(json.dumps({"accounts": self._accounts}, indent=2), encoding="utf-8")
+        os.replace(tmp, self.path)
+
+    def _account(self, key: str) -> dict[str, Any]:
+        return self._accounts.setdefault(
+            key, {"posts": {}, "synced_at": 0.0, "full_synced_at": 0.0, "stale": False, "complete": False},
+        )
+
+    @staticmethod
+    def _newest_first(account: dict[str, Any], limit: int) -> list[RecentPost]:
+        posts = sorted(
+            account["posts"].values(),
+            key=lambda p: _parse_timestamp(p.get("timestamp")),
+            reverse=True,
+        )
+        return [RecentPost(**p) for p in posts[:limit]]
+
+    # ── Read side ──────────────────────────────────────────────────────────────
+
+    def fresh_posts(self, key: str, limit: int) -> Optional[list[RecentPost]]:
+        """Posts served locally, or None when a sync is needed."""
+        with self._lock:
+            account = self._account(key)
+            fresh = not account.get("stale") and time.time() - account["synced_at"] < self.freshness_seconds
+            enough = account["complete"] or len(account["posts"]) >= limit
+            if not (fresh and enough):
+                return None
+            return self._newest_first(account, limit)
+
+    def stale_posts(self, key: str, limit: int) -> list[RecentPost]:
+        """Whatever is stored, regardless of age (fallback when the API fails)."""
+        with self._lock:
+            return self._newest_first(self._account(key), limit)
+
+    def age_seconds(self, key: str) -> Optional[float]:
+        with self._lock:
+            synced_at = self._account(key)["synced_at"]
+        return time.time() - synced_at if synced_at else None
+
+    # ── Sync side ──────────────────────────────────────────────────────────────
+
+    def since(self, key: str, limit: int) -> Optional[int]:
+        """
+        `since` for an incremental sync (epoch seconds of the newest known post),
+        or None for a full-window fetch: when the store cannot satisfy `limit`, or
+        when the last full sync is older than full_sync_seconds.
+        """
+        with self._lock:
+            account = self._account(key)
+            if not (account["complete"] or len(account["posts"]) >= limit):
+                return None
+            if time.time() - account.get("full_synced_at", 0.0) >= self.full_sync_seconds:
+                return None
+            newest = max((_parse_timestamp(p.get("timestamp")) for p in account["posts"].values()), default=0)
+        return int(newest) or None
+
+    def merge(
+        self,
+        key: str,
+        posts: list[RecentPost],
+        exhausted: bool,
+        limit: int,
+        full: bool = False,
+    ) -> list[RecentPost]:
+        """
+        Store fetched posts and mark the account synced.
+        exhausted: pagination ended on a full backfill, so the account has no older posts.
+        full: `posts` are everything from the newest post back to the oldest fetched
+        one (no `since`), so stored posts in that window that are missing were deleted.
+        """
+        with self._lock:
+            account = self._account(key)
+            now = time.time()
+            if full:
+                self._drop_deleted(account, posts, exhausted)
+                account["full_synced_at"] = now
+            for post in posts:
+                account["posts"][post.post_id] = post.model_dump(mode="json")
+            account["synced_at"] = now
+            account["stale"] = False
+            account["complete"] = account["complete"] or exhausted
+            self._save()
+            return self._newest_first(account, limit)
+
+    @staticmethod
+    def _drop_deleted(account: dict[str, Any], posts: list[RecentPost], exhausted: bool) -> None:
+        fetched = {post.post_id for post in posts}
+        # Strictly newer than the oldest fetched post: a page may end between two posts of the same second
+        times = [t for t in (_parse_timestamp(post.timestamp) for post in posts) if t]
+        oldest = min(times, default=float("inf"))
+        for post_id, stored in list(account["posts"].items()):
+            if post_id not in fetched and (exhausted or _parse_timestamp(stored.get("timestamp")) > oldest):
+                del account["posts"][post_id]
+
+    def mark_stale(self, key: str) -> None:
+        """Force the next read to sync (e.g. right after publishing)."""
+        with self._lock:
+            if key in self._accounts:
+                self._accounts[key]["stale"] = True
+                self._save()
+
+
+_history: Optional[PostHistoryStore] = None
+_history_lock = threading.Lock()
+
+
+def get_post_history() -> PostHistoryStore:
+    """The process-wide post history shared by MetaClient and AsyncMetaClient."""
+    global _history
+    with _history_lock:
+        if _history is None:
+            _history = PostHistoryStore()
+        return _history
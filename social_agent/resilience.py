@@ -0,0 +1,390 @@
+"""
+Retry, backoff and circuit breaking for every upstream call (Runway, Meta, Anthropic).
+
+A transient failure used to be terminal: one 502 from Runway while creating or
+polling a task marked the whole generation as failed, one 5xx from the Graph
+API turned into an error PublishResult. Every call now goes through
+call_with_retry / acall_with_retry with the policy of its endpoint
+("runway.create", "meta.read", ...), or call_once when the caller reschedules
+retries itself:
+
+- Retries use exponential backoff with full jitter, and honour Retry-After
+  (seconds or HTTP date) when the upstream sends one.
+- Retries are idempotency-aware. Idempotent calls (GET, polling, DELETE, LLM
+  messages) retry on 429, 5xx and connection errors. Calls with side effects
+  (creating a Runway task, publishing) retry only when the request provably
+  never reached the server (connect errors) or was rejected unprocessed (429,
+  or 503 with Retry-After), so a retry can never create a second video or a duplicate post.
+- One circuit breaker per upstream opens after FAILURE_THRESHOLD consecutive
+  5xx/connection failures: calls then fail fast with CircuitOpenError for
+  RESET_SECONDS, after which a single probe call decides whether it closes.
+
+resilience_stats() exposes attempts, retries, give-ups and breaker state.
+"""
+import asyncio
+import random
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, Awaitable, Callable, Optional, TypeVar
+
+import httpx
+import requests
+from urllib3.exceptions import ConnectTimeoutError, NewConnectionError
+
+from .tracing import add_event
+
+T = TypeVar("T")
+
+RETRYABLE_STATUSES = frozenset({429, 500, 502, 503, 504, 529})   # 529: Anthropic overloaded
+FAILURE_THRESHOLD = 5
+RESET_SECONDS = 60.0
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    max_attempts: int = 4
+    base_delay: float = 1.0
+    max_delay: float = 30.0
+    idempotent: bool = True
+    max_retry_after: float = 120.0     # a longer Retry-After gives up instead of stalling the run
+
+    def backoff(self, retry: int) -> float:
+        """Full jitter: uniform in [0, min(max_delay, base_delay · 2^retry)]."""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** retry))
+
+
+# Per endpoint; the upstream (and its breaker) is the part before the dot
+POLICIES: dict[str, RetryPolicy] = {
+    "runway.create": RetryPolicy(max_attempts=4, base_delay=2.0, idempotent=False),
+    "runway.poll": RetryPolicy(max_attempts=5, base_delay=1.0, max_delay=15.0),
+    "runway.cancel": RetryPolicy(max_attempts=2, base_delay=1.0, max_delay=5.0),
+    "meta.read": RetryPolicy(max_attempts=4, base_delay=1.0, max_delay=20.0),
+    "meta.write": RetryPolicy(max_attempts=3, base_delay=2.0, idempotent=False),
+    "anthropic.messages": RetryPolicy(max_attempts=5, base_delay=2.0, max_delay=60.0),
+}
+
+
+class CircuitOpenError(Exception):
+    """The upstream's breaker is open: the call was not attempted."""
+
+    def __init__(self, upstream: str, retry_in: float):
+        super().__init__(f"{upstream} non disponibile (circuit breaker aperto): nuovo tentativo tra {retry_in:.0f}s.")
+        self.upstream = upstream
+        self.retry_in = retry_in
+
+
+class RetryLater(Exception):
+    """call_once: a transient failure the caller retries on its own schedule, `delay` seconds from now."""
+
+    def __init__(self, cause: Any, delay: float):
+        super().__init__(f"{_describe(cause)}: nuovo tentativo tra {delay:.1f}s")
+        self.cause = cause
+        self.delay = delay
+
+
+# ── Circuit breaker ────────────────────────────────────────────────────────────
+
+class CircuitBreaker:
+    """closed → open after `failure_threshold` consecutive failures → half-open after `reset_seconds`."""
+
+    def __init__(self, upstream: str, failure_threshold: int = FAILURE_THRESHOLD, reset_seconds: float = RESET_SECONDS):
+        self.upstream = upstream
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._lock = threading.Lock()
+        self._state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._times_opened = 0
+        self._short_circuited = 0
+
+    def before_call(self) -> None:
+        """Raise CircuitOpenError unless the call may go through (at most one probe while half-open)."""
+        with self._lock:
+            if self._state == "closed":
+                return
+            remaining = self._opened_at + self.reset_seconds - time.monotonic()
+            if self._state == "open" and remaining <= 0:
+                self._state = "half-open"
+            if self._state == "half-open" and not self._probing:
+                self._probing = True
+                return
+            self._short_circuited += 1
+        raise CircuitOpenError(self.upstream, max(remaining, 0.0))
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self._state != "closed":
+                print(f"  [Circuit] {self.upstream}: di nuovo raggiungibile, circuito chiuso")
+            self._state = "closed"
+            self._failures = 0
+            self._probing = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            reopen = self._state == "half-open"
+            if reopen or (self._state == "closed" and self._failures >= self.failure_threshold):
+                self._state = "open"
+                self._opened_at = time.monotonic()
+                self._times_opened += 1
+                print(
+                    f"  [Circuit] {self.upstream}: aperto dopo {self._failures} errori consecutivi "
+                    f"— chiamate bloccate per {self.reset_seconds:.0f}s"
+                )
+            self._probing = False
+
+    def release_probe(self) -> None:
+        """The probe ended without a verdict (e.g. a 4xx or a non-HTTP error)."""
+        with self._lock:
+            self._probing = False
+
+    def snapshot(self) -> dict[str, Any]:
+        with self._lock:
+            remaining = self._opened_at + self.reset_seconds - time.monotonic() if self._state == "open" else 0.0
+            return {
+                "state": self._state,
+                "consecutive_failures": self._failures,
+                "times_opened": self._times_opened,
+                "short_circuited": self._short_circuited,
+                "open_for_seconds": round(max(remaining, 0.0), 1),
+            }
+
+
+_lock = threading.Lock()
+_breakers: dict[str, CircuitBreaker] = {}
+_stats: dict[str, dict[str, int]] = {}
+
+
+def get_breaker(upstream: str) -> CircuitBreaker:
+    with _lock:
+        breaker = _breakers.get(upstream)
+        if breaker is None:
+            breaker = _breakers[upstream] = CircuitBreaker(upstream)
+        return breaker
+
+
+def _count(endpoint: str, key: str) -> None:
+    with _lock:
+        entry = _stats.setdefault(endpoint, {"calls": 0, "attempts": 0, "retries": 0, "gave_up": 0})
+        entry[key] += 1
+
+
+# ── Outcome classification ─────────────────────────────────────────────────────
+
+def _status_of(outcome: Any) -> Optional[int]:
+    """HTTP status of a response, or of the response carried by an HTTP error."""
+    response = outcome if not isinstance(outcome, BaseException) else getattr(outcome, "response", None)
+    status = getattr(response, "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def _headers_of(outcome: Any) -> Any:
+    response = outcome if not isinstance(outcome, BaseException) else getattr(outcome, "response", None)
+    return getattr(response, "headers", None) or {}
+
+
+def _is_anthropic_connection_error(exc: BaseException) -> bool:
+    # The SDK is imported lazily (clients.py): if it isn't loaded, exc can't be one of its errors
+    anthropic = sys.modules.get("anthropic")
+    return anthropic is not None and isinstance(exc, anthropic.APIConnectionError)
+
+
+def _is_connection_error(exc: BaseException) -> bool:
+    errors = (requests.ConnectionError, requests.Timeout, httpx.TransportError)
+    return isinstance(exc, errors) or _is_anthropic_connection_error(exc)
+
+
+def _never_sent(exc: BaseException) -> bool:
+    """True when the request provably never reached the server (safe to repeat even with side effects)."""
+    if isinstance(exc, (httpx.ConnectError, httpx.ConnectTimeout, requests.ConnectTimeout)):
+        return True
+    if isinstance(exc, requests.ConnectionError):
+        reason = getattr(exc.args[0], "reason", None) if exc.args else None
+        return isinstance(reason, (NewConnectionError, ConnectTimeoutError))
+    cause = exc.__cause__
+    return _is_anthropic_connection_error(exc) and cause is not None and _never_sent(cause)
+
+
+def parse_retry_after(headers: Any) -> Optional[float]:
+    """Retry-After in seconds (delta-seconds or HTTP-date form), None if absent or invalid."""
+    value = headers.get("Retry-After") if headers else None
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max((when - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+def _retry_delay(policy: RetryPolicy, outcome: Any, retry: int) -> Optional[float]:
+    """
+    Seconds to wait before the next attempt, or None if `outcome` (a response or
+    an exception) must be returned/raised as is.
+    """
+    status = _status_of(outcome)
+    if status is not None:
+        retry_after = parse_retry_after(_headers_of(outcome))
+        # With side effects, only an explicit "come back later" proves nothing was processed
+        rejected = status == 429 or (status == 503 and retry_after is not None)
+        if status not in RETRYABLE_STATUSES or not (policy.idempotent or rejected):
+            return None
+        if retry_after is not None:
+            return retry_after if retry_after <= policy.max_retry_after else None
+        return policy.backoff(retry)
+    if isinstance(outcome, BaseException) and _is_connection_error(outcome):
+        if policy.idempotent or _never_sent(outcome):
+            return policy.backoff(retry)
+    return None
+
+
+def _settle(breaker: CircuitBreaker, outcome: Any) -> None:
+    """Feed the breaker: 5xx and connection errors count as failures, any other HTTP answer as success."""
+    status = _status_of(outcome)
+    if (status is not None and status >= 500) or (isinstance(outcome, BaseException) and _is_connection_error(outcome)):
+        breaker.record_failure()
+    elif status is not None or not isinstance(outcome, BaseException):
+        breaker.record_success()
+    else:
+        breaker.release_probe()
+
+
+def _describe(outcome: Any) -> str:
+    status = _status_of(outcome)
+    return f"HTTP {status}" if status is not None else type(outcome).__name__
+
+
+def _is_transient(outcome: Any) -> bool:
+    status = _status_of(outcome)
+    if status is not None:
+        return status in RETRYABLE_STATUSES
+    return isinstance(outcome, BaseException) and _is_connection_error(outcome)
+
+
+def _next_delay(endpoint: str, policy: RetryPolicy, outcome: Any, attempt: int) -> Optional[float]:
+    delay = _retry_delay(policy, outcome, attempt - 1) if attempt < policy.max_attempts else None
+    if delay is None:
+        if _is_transient(outcome):
+            _count(endpoint, "gave_up")
+        return None
+    _count(endpoint, "retries")
+    add_event("retry", endpoint=endpoint, attempt=attempt + 1, delay_seconds=round(delay, 2), cause=_describe(outcome))
+    print(
+        f"  [Retry] {endpoint}: {_describe(outcome)}, "
+        f"tentativo {attempt + 1}/{policy.max_attempts} tra {delay:.1f}s"
+    )
+    return delay
+
+
+# ── Entry points ───────────────────────────────────────────────────────────────
+
+def call_with_retry(endpoint: str, send: Callable[[], T]) -> T:
+    """
+    Run `send` under the policy and breaker of `endpoint`. `send` either returns a
+    response (retried on a retryable status code; the last one is returned, so
+    callers keep their raise_for_status) or raises (retried on retryable errors).
+    """
+    policy = POLICIES[endpoint]
+    breaker = get_breaker(endpoint.split(".")[0])
+    _count(endpoint, "calls")
+    attempt = 0
+    while True:
+        attempt += 1
+        breaker.before_call()
+        _count(endpoint, "attempts")
+        try:
+            outcome: Any = send()
+        except Exception as exc:
+            outcome = exc
+        _settle(breaker, outcome)
+        delay = _next_delay(endpoint, policy, outcome, attempt)
+        if delay is None:
+            if isinstance(outcome, BaseException):
+                raise outcome
+            return outcome
+        time.sleep(delay)
+
+
+async def acall_with_retry(endpoint: str, send: Callable[[], Awaitable[T]]) -> T:
+    """asyncio counterpart of call_with_retry: `send` is a coroutine factory."""
+    policy = POLICIES[endpoint]
+    breaker = get_breaker(endpoint.split(".")[0])
+    _count(endpoint, "calls")
+    attempt = 0
+    while True:
+        attempt += 1
+        breaker.before_call()
+        _count(endpoint, "attempts")
+        try:
+            outcome: Any = await send()
+        except Exception as exc:
+            outcome = exc
+        _settle(breaker, outcome)
+        delay = _next_delay(endpoint, policy, outcome, attempt)
+        if delay is None:
+            if isinstance(outcome, BaseException):
+                raise outcome
+            return outcome
+        await asyncio.sleep(delay)
+
+
+def call_once(endpoint: str, send: Callable[[], T], attempt: int = 1) -> T:
+    """
+    One attempt of call_with_retry, for callers that schedule their own retries
+    instead of blocking a shared thread (the Runway poller). `attempt` is the
+    caller's count of consecutive tries: where call_with_retry would sleep,
+    RetryLater is raised with the delay; once the policy's attempts are used up
+    the outcome is returned or raised as is.
+    """
+    policy = POLICIES[endpoint]
+    breaker = get_breaker(endpoint.split(".")[0])
+    if attempt == 1:
+        _count(endpoint, "calls")
+    breaker.before_call()
+    _count(endpoint, "attempts")
+    try:
+        outcome: Any = send()
+    except Exception as exc:
+        outcome = exc
+    _settle(breaker, outcome)
+    delay = _next_delay(endpoint, policy, outcome, attempt)
+    if delay is not None:
+        raise RetryLater(outcome, delay)
+    if isinstance(outcome, BaseException):
+        raise outcome
+    return outcome
+
+
+# ── Metrics ────────────────────────────────────────────────────────────────────
+
+def resilience_stats() -> dict[str, dict[str, Any]]:
+    """{"endpoints": per-endpoint calls/attempts/retries/gave_up, "breakers": per-upstream state}."""
+    with _lock:
+        endpoints = {name: dict(entry) for name, entry in _stats.items()}
+        breakers = list(_breakers.values())
+    return {"endpoints": endpoints, "breakers": {b.upstream: b.snapshot() for b in breakers}}
+
+
+def print_resilience_stats() -> None:
+    stats = resilience_stats()
+    for endpoint, entry in sorted(stats["endpoints"].items()):
+        print(
+            f"  [Retry] {endpoint}: {entry['calls']} chiamate, {entry['retries']} ritentativi, "
+            f"{entry['gave_up']} abbandonate"
+        )
+    for upstream, entry in sorted(stats["breakers"].items()):
+        opened = f", aperto {entry['times_opened']} volte" if entry["times_opened"] else ""
+        blocked = f", {entry['short_circuited']} chiamate bloccate" if entry["short_circuited"] else ""
+        print(f"  [Circuit] {upstream}: {entry['state']}{opened}{blocked}")
@@ -0,0 +1,194 @@
+"""
+Persistent memoization of VC and SMCC calls.
+
+When a draft is rejected, the orchestrator often reruns VCAgent.create_concept
+and SMCCAgent.review with the very same caption/theme/platform: each repeat is
+a full Opus call with thinking. Responses are stored in a local SQLite file,
+keyed by a SHA-256 of the normalized request — model, system prompt, tool
+schemas, tool_choice, thinking settings and messages — so editing a prompt or
+a schema invalidates old entries by construction.
+
+Entries expire after a TTL, and the least-recently-used ones are evicted once
+the database exceeds its size cap. Set SOCIAL_AGENT_RESPONSE_CACHE=off to
+disable the cache globally, or pass bypass_cache=True for a single call.
+"""
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Optional, TypeVar
+
+from pydantic import ValidationError
+
+from .llm import create_message
+from .usage import budget_request
+
+CACHE_DIR = Path(__file__).parent.parent / "cache"
+DEFAULT_TTL_SECONDS = 7 * 24 * 3600
+DEFAULT_MAX_BYTES = 50 * 1024 ** 2
+KEY_VERSION = 1                      # bump when the key normalization changes
+
+T = TypeVar("T")
+
+
+def _normalize(value: Any) -> Any:
+    """Drop cache_control breakpoints and cosmetic whitespace, recursively."""
+    if isinstance(value, dict):
+        return {k: _normalize(v) for k, v in value.items() if k != "cache_control"}
+    if isinstance(value, list):
+        return [_normalize(v) for v in value]
+    if isinstance(value, str):
+        lines = value.replace("\r\n", "\n").split("\n")
+        text = "\n".join(line.rstrip() for line in lines).strip()
+        return re.sub(r"\n{3,}", "\n\n", text)
+    return value
+
+
+def request_key(request: dict) -> str:
+    """Stable hash of a messages.create request."""
+    payload = json.dumps(
+        {"v": KEY_VERSION, **_normalize(request)},
+        sort_keys=True,
+        ensure_ascii=False,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    def __init__(
+        self,
+        path: Path = CACHE_DIR / "responses.sqlite3",
+        ttl_seconds: float = DEFAULT_TTL_SECONDS,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+    ):
+        self.path = Path(path)
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "expired": 0, "evicted": 0}
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # One connection shared by the worker threads, serialized by _lock
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY, label TEXT NOT NULL, value TEXT NOT NULL,"
+            " size INTEGER NOT NULL, created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_lru ON responses (accessed_at)")
+
+    def get(self, key: str) -> Optional[tuple[Any, float]]:
+        """(value, age in seconds), or None on a miss or an expired entry."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self._stats["misses"] += 1
+                return None
+            value, created_at = row
+            if now - created_at > self.ttl_seconds:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._stats["expired"] += 1
+                self._stats["misses"] += 1
+                return None
+            self._conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+            self._stats["hits"] += 1
+        return json.loads(value), now - created_at
+
+    def put(self, key: str, label: str, value: Any) -> None:
+        data = json.dumps(value, ensure_ascii=False)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, label, value, size, created_at, accessed_at)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (key, label, data, len(data.encode("utf-8")), now, now),
+            )
+            self._evict()
+
+    def discard(self, key: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+
+    def _evict(self) -> None:
+        """Drop least-recently-used entries until the total size fits max_bytes. Caller holds _lock."""
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        victims = []
+        for key, size in self._conn.execute("SELECT key, size FROM responses ORDER BY accessed_at"):
+            if total <= self.max_bytes:
+                break
+            victims.append((key,))
+            total -= size
+        self._conn.executemany("DELETE FROM responses WHERE key = ?", victims)
+        self._stats["evicted"] += len(victims)
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"], stats["bytes"] = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()
+        return stats
+
+
+_default_cache: Optional[ResponseCache] = None
+_default_lock = threading.Lock()
+
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """Process-wide cache, or None when SOCIAL_AGENT_RESPONSE_CACHE is "off"."""
+    global _default_cache
+    if os.getenv("SOCIAL_AGENT_RESPONSE_CACHE", "on").lower() in ("off", "0", "false", "no"):
+        return None
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = ResponseCache()
+        return _default_cache
+
+
+def memoized_tool_call(
+    client: Any,
+    label: str,
+    parse: Callable[[dict], T],
+    cache: Optional[ResponseCache] = None,
+    bypass_cache: bool = False,
+    **request: Any,
+) -> T:
+    """
+    create_message for a forced single-tool call, memoized on the request.
+    `parse` validates the tool input (e.g. VideoConcept(**data)); entries that
+    no longer validate against the current model are dropped and refetched.
+    """
+    # Key the degraded request, so a fallback-model answer never stands in for a full one
+    request = budget_request(request)
+    key = request_key(request)
+    if cache is not None and not bypass_cache:
+        hit = cache.get(key)
+        if hit is not None:
+            value, age = hit
+            try:
+                result = parse(value)
+            except ValidationError:
+                cache.discard(key)
+            else:
+                print(f"  [Memo] {label}: HIT ({key[:12]}, {age / 60:.0f} min fa) — chiamata evitata")
+                return result
+
+    response = create_message(client, label, **request)
+    for block in response.content:
+        if getattr(block, "type", None) == "tool_use":
+            result = parse(block.input)
+            if cache is not None:
+                cache.put(key, label, block.input)
+            return result
+
+    raise ValueError(f"{label}Agent: nessun tool_use trovato nella risposta")
@@ -0,0 +1,83 @@
+"""
+Resume interrupted pipeline jobs from their last checkpoint.
+
+    python -m social_agent.resume --list          # jobs recenti e stato
+    python -m social_agent.resume <job_id>        # riprende un job
+    python -m social_agent.resume                 # riprende tutti i job non conclusi
+    python -m social_agent.resume <job_id> --force  # anche se risulta ancora in esecuzione
+
+Resuming every job skips the ones still live in another process (see job_store).
+"""
+import argparse
+import sys
+import time
+from typing import Optional
+
+from .agent import SocialAgent
+from .job_store import get_job_store
+
+
+def _print_jobs(jobs: list[dict]) -> None:
+    if not jobs:
+        print("Nessun job trovato.")
+        return
+    for job in jobs:
+        updated = time.strftime("%Y-%m-%d %H:%M", time.localtime(job["updated_at"]))
+        brief = job["brief"].replace("\n", " ")[:60]
+        live = f"  (in esecuzione, PID {job['owner_pid']})" if job["live"] else ""
+        print(f"  {job['id']}  {job['status']:<8} ultimo step: {job['last_step'] or '-':<12} {updated}  {brief}{live}")
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Riprende i job della pipeline social interrotti.")
+    parser.add_argument("job_id", nargs="?", help="Job da riprendere (default: tutti quelli non conclusi).")
+    parser.add_argument("--list", action="store_true", help="Elenca i job recenti senza riprenderli.")
+    parser.add_argument("--concurrent-tools", action="store_true",
+                        help="Esegue in parallelo i tool indipendenti di ogni turno.")
+    parser.add_argument("--force", action="store_true",
+                        help="Riprende il job indicato anche se risulta in esecuzione in un altro processo.")
+    args = parser.parse_args(argv)
+
+    store = get_job_store()
+    if store is None:
+        print("Job store disattivato (SOCIAL_AGENT_JOB_STORE=off).", file=sys.stderr)
+        return 1
+    if args.list:
+        _print_jobs(store.list_jobs())
+        return 0
+
+    if args.force and not args.job_id:
+        parser.error("--force richiede un job_id esplicito")
+    if args.job_id:
+        job_ids = [args.job_id]
+    else:
+        job_ids = []
+        for job in reversed(store.list_jobs(status="running")):
+            if job["live"]:
+                print(f"  [Jobs] {job['id']} in esecuzione nel processo {job['owner_pid']}: lo salto")
+            else:
+                job_ids.append(job["id"])
+    if not job_ids:
+        print("Nessun job da riprendere.")
+        return 0
+
+    failed = 0
+    for job_id in job_ids:
+        try:
+            agent = SocialAgent(concurrent_tools=args.concurrent_tools, jobs=store)
+            result = agent.resume(job_id, force=args.force)
+        except (ValueError, RuntimeError) as exc:
+            print(f"  [Jobs] {exc}", file=sys.stderr)
+            failed += 1
+            continue
+        except Exception as exc:
+            # One broken job must not stop the others
+            print(f"  [Jobs] {job_id}: ripresa fallita — {type(exc).__name__}: {exc}", file=sys.stderr)
+            failed += 1
+            continue
+        print(f"\n[{job_id}] {result}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
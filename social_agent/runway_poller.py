@@ -0,0 +1,236 @@
+"""
+Multiplexed Runway task poller.
+
+A single background thread tracks every in-flight Runway task of the process,
+polls each one on an adaptive schedule (task age, reported status and progress)
+and resolves a Future per task. Callers block on the Future or await it, so
+concurrent generations no longer hold one sleeping thread each.
+Polls run in the context of the caller that started tracking the task, so
+their tracing spans nest under the caller's span.
+"""
+import asyncio
+import contextvars
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Any, Callable, Optional
+
+from .resilience import RetryLater
+from .tracing import add_event
+
+# Gen-4.5 needs ~1-2 minutes for a 10s clip: polling faster than this only burns quota
+_FIRST_POLL_SECONDS = 5.0
+_MIN_INTERVAL_SECONDS = 2.0
+_MAX_INTERVAL_SECONDS = 15.0
+
+
+@dataclass
+class _TrackedTask:
+    task_id: str
+    future: Future
+    created: float
+    deadline: float
+    next_poll: float
+    status: str = "SUBMITTED"
+    status_since: float = 0.0
+    running_since: Optional[float] = None
+    progress: Optional[float] = None
+    polls: int = 0
+    failed_polls: int = 0       # consecutive transient failures, the retry attempt of the next poll
+    time_in_state: dict[str, float] = field(default_factory=dict)
+    context: contextvars.Context = field(default_factory=contextvars.copy_context)
+
+
+def next_poll_interval(status: str, age: float, progress: Optional[float], running_for: float) -> float:
+    """
+    Seconds until the next poll of a task.
+    Queued tasks back off with age; running tasks that report progress are polled
+    around the midpoint of their estimated remaining time.
+    """
+    if status == "RUNNING" and progress and progress > 0:
+        remaining = running_for * (1 - progress) / progress
+        interval = remaining / 2
+    elif status == "RUNNING":
+        interval = 3 + age * 0.05
+    else:  # SUBMITTED / PENDING / THROTTLED
+        interval = 4 + age * 0.1
+    return min(max(interval, _MIN_INTERVAL_SECONDS), _MAX_INTERVAL_SECONDS)
+
+
+class RunwayTaskPoller:
+    """
+    Tracks many Runway task IDs at once on one daemon thread.
+
+    fetch_status(task_id, attempt) returns the task JSON; resolve(task_id, data)
+    returns the output URL when the task succeeded, None while it is still in
+    progress, and raises on failure. Exceptions from either end up on the task's
+    Future, except RetryLater: the task is simply polled again after its delay,
+    so one flaky fetch never stalls the other tasks.
+    """
+
+    def __init__(
+        self,
+        fetch_status: Callable[[str, int], dict],
+        resolve: Callable[[str, dict], Optional[str]],
+        timeout_seconds: float,
+    ):
+        self._fetch_status = fetch_status
+        self._resolve = resolve
+        self._timeout = timeout_seconds
+        self._tasks: dict[str, _TrackedTask] = {}
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        # Aggregated over finished tasks: status → [count, total seconds, max seconds]
+        self._state_totals: dict[str, list[float]] = {}
+        self._total_polls = 0
+
+    # ── Public API ─────────────────────────────────────────────────────────────
+
+    def track(self, task_id: str) -> Future:
+        """Start tracking a task (idempotent). The Future resolves to the video URL."""
+        with self._cond:
+            task = self._tasks.get(task_id)
+            if task is None:
+                now = time.monotonic()
+                task = _TrackedTask(
+                    task_id=task_id,
+                    future=Future(),
+                    created=now,
+                    deadline=now + self._timeout,
+                    next_poll=now + _FIRST_POLL_SECONDS,
+                    status_since=now,
+                )
+                self._tasks[task_id] = task
+                self._ensure_thread()
+                self._cond.notify()
+            return task.future
+
+    async def wait(self, task_id: str) -> str:
+        """Awaitable handle for a task, for asyncio callers."""
+        return await asyncio.wrap_future(self.track(task_id))
+
+    def untrack(self, task_id: str) -> None:
+        """Stop polling a task; its Future is cancelled if still pending."""
+        with self._cond:
+            task = self._tasks.pop(task_id, None)
+            if task is not None:
+                self._close_state(task, time.monotonic())
+                task.future.cancel()
+
+    def metrics(self) -> dict[str, Any]:
+        """Queue depth, tasks per status and time spent in each status."""
+        now = time.monotonic()
+        with self._cond:
+            by_status: dict[str, int] = {}
+            totals = {status: list(values) for status, values in self._state_totals.items()}
+            for task in self._tasks.values():
+                by_status[task.status] = by_status.get(task.status, 0) + 1
+                current = now - task.status_since
+                entry = totals.setdefault(task.status, [0, 0.0, 0.0])
+                entry[0] += 1
+                entry[1] += current
+                entry[2] = max(entry[2], current)
+            return {
+                "queue_depth": len(self._tasks),
+                "by_status": by_status,
+                "polls": self._total_polls,
+                "time_in_state": {
+                    status: {
+                        "count": int(count),
+                        "total_seconds": round(total, 1),
+                        "avg_seconds": round(total / count, 1) if count else 0.0,
+                        "max_seconds": round(longest, 1),
+                    }
+                    for status, (count, total, longest) in totals.items()
+                },
+            }
+
+    # ── Worker ─────────────────────────────────────────────────────────────────
+
+    def _ensure_thread(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="runway-poller", daemon=True)
+            self._thread.start()
+
+    def _close_state(self, task: _TrackedTask, now: float) -> None:
+        elapsed = now - task.status_since
+        task.time_in_state[task.status] = task.time_in_state.get(task.status, 0.0) + elapsed
+        entry = self._state_totals.setdefault(task.status, [0, 0.0, 0.0])
+        entry[0] += 1
+        entry[1] += elapsed
+        entry[2] = max(entry[2], elapsed)
+
+    def _finish(self, task: _TrackedTask, result: Optional[str] = None, error: Optional[BaseException] = None) -> None:
+        with self._cond:
+            if self._tasks.pop(task.task_id, None) is None:
+                return  # untracked meanwhile
+            self._close_state(task, time.monotonic())
+        if task.future.done():
+            return
+        if error is not None:
+            task.future.set_exception(error)
+        else:
+            task.future.set_result(result)
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._tasks:
+                    self._cond.wait()
+                now = time.monotonic()
+                due = [t for t in self._tasks.values() if t.next_poll <= now or t.deadline <= now]
+                if not due:
+                    wake = min(min(t.next_poll, t.deadline) for t in self._tasks.values())
+                    self._cond.wait(timeout=wake - now)
+                    continue
+
+            for task in due:
+                try:
+                    self._poll(task)
+                except Exception as exc:
+                    # Fail this task only: the thread is the sole enforcer of every deadline
+                    self._finish(task, error=exc)
+
+    def _poll(self, task: _TrackedTask) -> None:
+        now = time.monotonic()
+        if now >= task.deadline:
+            self._finish(task, error=TimeoutError(
+                f"Runway task {task.task_id} non completata entro {int(self._timeout)} secondi."
+            ))
+            return
+
+        try:
+            data = task.context.run(self._fetch_status, task.task_id, task.failed_polls + 1)
+            video_url = task.context.run(self._resolve, task.task_id, data)
+        except RetryLater as exc:
+            with self._cond:
+                task.failed_polls += 1
+                task.next_poll = time.monotonic() + exc.delay
+            return
+        except Exception as exc:
+            self._finish(task, error=exc)
+            return
+
+        if video_url:
+            self._finish(task, result=video_url)
+            return
+
+        now = time.monotonic()
+        status = data.get("status", task.status)
+        progress = data.get("progress")
+        with self._cond:
+            self._total_polls += 1
+            task.polls += 1
+            task.failed_polls = 0
+            if status != task.status:
+                self._close_state(task, now)
+                task.status = status
+                task.status_since = now
+                if status == "RUNNING":
+                    task.running_since = now
+                print(f"  [Runway] Task {task.task_id[:8]}… {status} ({int(now - task.created)}s)")
+                task.context.run(add_event, "runway.status", status=status, elapsed_seconds=round(now - task.created, 1))
+            task.progress = progress if isinstance(progress, (int, float)) else task.progress
+            running_for = now - task.running_since if task.running_since else 0.0
+            task.next_poll = now + next_poll_interval(status, now - task.created, task.progress, running_for)
@@ -0,0 +1,22 @@
+"""
+Single load of the .env file.
+
+Every setting is read from the environment when it is used (os.getenv), so
+.env only has to be loaded once per process, before the first read: the
+package __init__ does it. Variables already set in the environment win.
+"""
+import threading
+
+_loaded = False
+_lock = threading.Lock()
+
+
+def load_settings() -> None:
+    global _loaded
+    with _lock:
+        if _loaded:
+            return
+        _loaded = True
+    from dotenv import load_dotenv
+
+    load_dotenv()
@@ -1,12 +1,12 @@
-import os
+from typing import Optional
 
 import anthropic
-from dotenv import load_dotenv
 
+from .clients import get_anthropic_client
+from .llm import cached_system, cached_tools
 from .models import ContentReview
 from .prompts import SMCC_SYSTEM_PROMPT
-
-load_dotenv()
+from .response_cache import ResponseCache, get_response_cache, memoized_tool_call
 
 # ── SMCC tool definition ───────────────────────────────────────────────────────
 
@@ -73,8 +73,13 @@ SMCC_TOOLS: list[dict] = [
 class SMCCAgent:
     """Social Media Content Checker — rivede contenuti per massimizzare engagement."""
 
-    def __init__(self):
-        self.client = anthropic.Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY", ""))
+    def __init__(
+        self,
+        client: Optional[anthropic.Anthropic] = None,
+        cache: Optional[ResponseCache] = None,
+    ):
+        self.client = client or get_anthropic_client()
+        self.cache = cache or get_response_cache()
 
     def review(
         self,
@@ -82,6 +87,7 @@ class SMCCAgent:
         caption: str,
         hashtags: list[str] | None = None,
         video_concept: str | None = None,
+        bypass_cache: bool = False,
     ) -> ContentReview:
         """
         Rivede caption e hashtag per una piattaforma specifica.
@@ -91,6 +97,7 @@ class SMCCAgent:
             caption: testo del post da rivedere
             hashtags: lista di hashtag proposti (senza #)
             video_concept: descrizione testuale del video concept VC (opzionale)
+            bypass_cache: ignora la cache delle risposte e forza una nuova chiamata
 
         Returns:
             ContentReview con caption e hashtag revisionati + note di analisi
@@ -118,18 +125,70 @@ Tieni conto dell'allineamento tra caption e video concept nella tua revisione.
 
         user_message += "\nForma il tuo output usando il tool submit_review."
 
-        response = self.client.messages.create(
+        return memoized_tool_call(
+            self.client,
+            "SMCC",
+            lambda data: ContentReview(**data),
+            cache=self.cache,
+            bypass_cache=bypass_cache,
             model="claude-opus-4-6",
             max_tokens=8000,
             thinking={"type": "adaptive", "budget_tokens": 4000},
-            system=SMCC_SYSTEM_PROMPT,
-            tools=SMCC_TOOLS,
+            system=cached_system(SMCC_SYSTEM_PROMPT),
+            tools=cached_tools(SMCC_TOOLS),
             tool_choice={"type": "tool", "name": "submit_review"},
             messages=[{"role": "user", "content": user_message}],
         )
 
-        for block in response.content:
-            if hasattr(block, "type") and block.type == "tool_use":
-                return ContentReview(**block.input)
+    def align_with_video(
+        self,
+        platform: str,
+        review: ContentReview,
+        video_changes: str,
+        bypass_cache: bool = False,
+    ) -> ContentReview:
+        """
+        Delta pass after a review made on the video concept alone: adjusts the
+        already revised caption/hashtags to how the final video turned out.
+        Short and without thinking — the tone and hashtag work is already done.
+
+        Args:
+            platform: "instagram" o "facebook"
+            review: revisione fatta sul concept, prima del video finale
+            video_changes: in cosa il video finale differisce dal concept
+            bypass_cache: ignora la cache delle risposte e forza una nuova chiamata
+        """
+        hashtag_str = " ".join(f"#{tag.lstrip('#')}" for tag in review.revised_hashtags) or "(nessun hashtag)"
+        user_message = f"""Hai già revisionato questo contenuto per {platform.upper()} sulla base del video concept.
 
-        raise ValueError("SMCCAgent: nessun tool_use trovato nella risposta")
+## Caption revisionata
+{review.revised_caption}
+
+## Hashtag revisionati
+{hashtag_str}
+
+## Il video finale differisce dal concept
+{video_changes}
+
+Correggi SOLO i riferimenti al video che non corrispondono più (scene, dettagli visivi, promesse \
+del tipo "guarda il video"): non riscrivere tono, hook o hashtag già ottimizzati. \
+In changes_summary elenca solo queste correzioni. Forma il tuo output usando il tool submit_review."""
+
+        aligned = memoized_tool_call(
+            self.client,
+            "SMCC",
+            lambda data: ContentReview(**data),
+            cache=self.cache,
+            bypass_cache=bypass_cache,
+            model="claude-opus-4-6",
+            max_tokens=2000,
+            system=cached_system(SMCC_SYSTEM_PROMPT),
+            tools=cached_tools(SMCC_TOOLS),
+            tool_choice={"type": "tool", "name": "submit_review"},
+            messages=[{"role": "user", "content": user_message}],
+        )
+        return aligned.model_copy(update={
+            "changes_summary": review.changes_summary + aligned.changes_summary,
+            "community_fit_notes": review.community_fit_notes,
+            "mainstream_appeal_notes": review.mainstream_appeal_notes,
+        })
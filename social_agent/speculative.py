@@ -0,0 +1,254 @@
+"""
+Speculative best-of-N video generation.
+
+Submits K Runway prompt variants derived from the same VideoConcept at once,
+reviews each finished candidate with Spielbierg as soon as it is ready and
+cancels everything still pending once one candidate passes the realism /
+adherence thresholds. Trades Runway credits for wall time on hard prompts.
+"""
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Callable, Optional
+
+from .artifact_store import get_artifact_store
+from .models import SpielbiergReview, VideoConcept, VideoGenerationResult
+from .tracing import run_in_context
+from .video_generator_agent import (
+    RUNWAY_CLIP_SECONDS,
+    RUNWAY_RESULT_TIMEOUT_SECONDS,
+    VideoGeneratorAgent,
+    _ratio_for,
+    get_runway_poller,
+)
+
+if TYPE_CHECKING:
+    from .spielbierg_agent import SpielbiergAgent
+
+# Same bar Spielbierg uses for its own "approved" verdict
+REALISM_THRESHOLD = 7
+ADHERENCE_THRESHOLD = 6
+
+# Extra direction per variant; index 0 is the plain concept prompt
+_VARIANT_NOTES: list[Optional[str]] = [
+    None,
+    "extreme macro close-up, shallow depth of field, tactile real food textures",
+    "handheld documentary realism, natural imperfections, real home kitchen",
+    "locked-off tripod shot, soft window light, minimal camera motion",
+]
+
+
+@dataclass
+class SpeculativeResult:
+    result: VideoGenerationResult
+    review: Optional[SpielbiergReview]
+    candidates_submitted: int
+    candidates_reviewed: int
+    cancelled: int
+
+
+def passes_thresholds(review: SpielbiergReview) -> bool:
+    return (
+        review.approved
+        and review.realism_score >= REALISM_THRESHOLD
+        and review.adherence_score >= ADHERENCE_THRESHOLD
+    )
+
+
+def _score(review: SpielbiergReview) -> tuple:
+    return (passes_thresholds(review), review.realism_score + review.adherence_score)
+
+
+def prompt_variants(
+    generator: VideoGeneratorAgent,
+    concept: VideoConcept,
+    count: int,
+    additional_notes: Optional[str] = None,
+) -> list[str]:
+    """
+    Up to `count` distinct Runway prompts for one concept. Odd variants also lead
+    with the later scenes, since the prompt builder only uses the first two.
+    """
+    prompts: list[str] = []
+    for index in range(count):
+        notes = " | ".join(
+            n for n in (additional_notes, _VARIANT_NOTES[index % len(_VARIANT_NOTES)]) if n
+        ) or None
+        variant = concept
+        if index % 2 == 1 and len(concept.scenes) > 2:
+            variant = concept.model_copy(update={"scenes": concept.scenes[1:] + concept.scenes[:1]})
+        prompt = generator._build_runway_prompt(variant, notes)
+        if prompt not in prompts:
+            prompts.append(prompt)
+    return prompts
+
+
+def _release_candidate(future: Future) -> None:
+    if not future.cancelled() and future.exception() is None:
+        get_artifact_store().release(future.result()[1])
+
+
+class SpeculativeVideoRunner:
+    def __init__(
+        self,
+        candidates: int = 3,
+        generator: Optional[VideoGeneratorAgent] = None,
+        reviewer: Optional["SpielbiergAgent"] = None,
+    ):
+        self.candidates = max(1, candidates)
+        self._generator = generator or VideoGeneratorAgent()
+        if reviewer is None:
+            from .spielbierg_agent import SpielbiergAgent
+
+            reviewer = SpielbiergAgent()
+        self._reviewer = reviewer
+
+    def _submit(self, prompt: str, ratio: str) -> Optional[str]:
+        try:
+            return self._generator._create_task(prompt, ratio, duration=RUNWAY_CLIP_SECONDS)
+        except Exception as exc:
+            print(f"  [Runway] Candidato non avviato: {exc}")
+            return None
+
+    def _review_candidate(
+        self,
+        task_id: str,
+        video_url: str,
+        concept: VideoConcept,
+        platform: str,
+        caption: str,
+        hashtags: list[str],
+    ) -> tuple[SpielbiergReview, Optional[str]]:
+        """Store the candidate once, then let Spielbierg review the local copy (pinned until run() settles)."""
+        local_path = self._generator._save_video(video_url, platform, task_id)
+        try:
+            review = self._reviewer.review_video(
+                video_url, concept, caption, hashtags, local_path=local_path
+            )
+        except BaseException:
+            get_artifact_store().release(local_path)
+            raise
+        return review, local_path
+
+    def run(
+        self,
+        concept: VideoConcept,
+        platform: str,
+        caption: str,
+        hashtags: list[str],
+        additional_notes: Optional[str] = None,
+        tasks: Optional[list[tuple[str, str]]] = None,
+        on_tasks_created: Optional[Callable[[list[tuple[str, str]]], None]] = None,
+    ) -> SpeculativeResult:
+        """
+        Generate K candidates concurrently and return the best-scoring reviewed one. Never raises.
+        tasks: (task_id, prompt) pairs of an interrupted run to re-attach to instead of submitting.
+        on_tasks_created: called with the (task_id, prompt) pairs as soon as Runway accepts them.
+        """
+        ratio = _ratio_for(platform)
+        poller = get_runway_poller()
+        if tasks:
+            prompts = [prompt for _, prompt in tasks]
+            print(f"\n  [Runway] Ripresa di {len(tasks)} varianti speculative di un'esecuzione interrotta")
+        else:
+            prompts = prompt_variants(self._generator, concept, self.candidates, additional_notes)
+            print(f"\n  [Runway] Generazione speculativa: {len(prompts)} varianti in parallelo...")
+
+        pool = ThreadPoolExecutor(max_workers=len(prompts), thread_name_prefix="speculative")
+        pending: dict[Future, tuple[str, str]] = {}
+        reviewing: dict[Future, tuple[str, str, str]] = {}
+        # ((review, local_path), task_id, prompt, video_url)
+        reviewed: list[tuple] = []
+        winner: Optional[tuple] = None
+        cancelled = 0
+        submitted = 0
+        try:
+            if not tasks:
+                # Workers inherit the caller's context: trace span, post and tool for cost accounting
+                task_ids = pool.map(run_in_context(lambda p: self._submit(p, ratio)), prompts)
+                tasks = [(task_id, prompt) for task_id, prompt in zip(task_ids, prompts) if task_id]
+                if tasks and on_tasks_created:
+                    on_tasks_created(tasks)
+            for task_id, prompt in tasks:
+                submitted += 1
+                pending[poller.track(task_id)] = (task_id, prompt)
+
+            while (pending or reviewing) and winner is None:
+                done, _ = wait(
+                    [*pending, *reviewing], timeout=RUNWAY_RESULT_TIMEOUT_SECONDS, return_when=FIRST_COMPLETED
+                )
+                if not done:
+                    print(f"  [Runway] Nessun candidato concluso in {RUNWAY_RESULT_TIMEOUT_SECONDS}s: interrompo l'attesa")
+                    break
+                for future in done:
+                    if future in pending:
+                        task_id, prompt = pending.pop(future)
+                        try:
+                            video_url = future.result()
+                        except Exception as exc:
+                            print(f"  [Runway] Candidato {task_id[:8]}… fallito: {exc}")
+                            continue
+                        review_future = pool.submit(
+                            run_in_context(self._review_candidate), task_id, video_url, concept, platform, caption, hashtags
+                        )
+                        reviewing[review_future] = (task_id, prompt, video_url)
+                    elif future in reviewing:
+                        task_id, prompt, video_url = reviewing.pop(future)
+                        try:
+                            outcome = future.result()
+                        except Exception as exc:
+                            print(f"  [Spielbierg] Candidato {task_id[:8]}… non revisionato: {exc}")
+                            continue
+                        review = outcome[0]
+                        print(
+                            f"  [Spielbierg] Candidato {task_id[:8]}… — "
+                            f"Realism {review.realism_score}/10, Adherence {review.adherence_score}/10"
+                        )
+                        reviewed.append((outcome, task_id, prompt, video_url))
+                        if passes_thresholds(review):
+                            winner = reviewed[-1]
+                            break
+        finally:
+            # Stop paying for candidates nobody will look at
+            for task_id, _ in pending.values():
+                poller.untrack(task_id)
+                self._generator._cancel_task(task_id)
+                cancelled += 1
+            for future in reviewing:
+                if not future.cancel():
+                    # Still being reviewed: let go of its video whenever it finishes
+                    future.add_done_callback(_release_candidate)
+            pool.shutdown(wait=False, cancel_futures=True)
+
+        if cancelled:
+            print(f"  [Runway] {cancelled} candidati in corso annullati.")
+
+        best = winner or (max(reviewed, key=lambda r: _score(r[0][0])) if reviewed else None)
+        if best is None:
+            return SpeculativeResult(
+                result=VideoGenerationResult(
+                    status="failed", error="Nessun candidato Runway completato."
+                ),
+                review=None,
+                candidates_submitted=submitted,
+                candidates_reviewed=0,
+                cancelled=cancelled,
+            )
+
+        for candidate in reviewed:
+            if candidate is not best:
+                get_artifact_store().release(candidate[0][1])
+        (review, local_path), task_id, prompt, video_url = best
+        return SpeculativeResult(
+            result=VideoGenerationResult(
+                status="succeeded",
+                video_url=video_url,
+                task_id=task_id,
+                platform_format=concept.platform_format,
+                prompt_used=prompt,
+                local_path=local_path,
+            ),
+            review=review,
+            candidates_submitted=submitted,
+            candidates_reviewed=len(reviewed),
+            cancelled=cancelled,
+        )
@@ -1,17 +1,17 @@
-import base64
 import json
-import os
-import tempfile
+import time
 from typing import Optional
 
 import anthropic
-import cv2
-import requests
-from dotenv import load_dotenv
 
-from .models import SpielbiergReview, VideoConcept
-
-load_dotenv()
+from .artifact_store import get_artifact_store
+from .clients import get_anthropic_client, session_for
+from .frame_encoding import FrameEncoding, encode_frames, frame_capacity, resolve_config
+from .frame_extraction import FrameDecoder, VideoSource, get_decoder
+from .keyframes import SelectedFrame, select_keyframes
+from .llm import cached_system, cached_text, cached_tools, create_message
+from .models import SpielbiergReview, VideoConcept, VideoScene
+from .tracing import span
 
 _TOOL = {
     "name": "submit_video_review",
@@ -75,8 +75,18 @@ _TOOL = {
 
 
 class SpielbiergAgent:
-    def __init__(self):
-        self._client = anthropic.Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY", ""))
+    def __init__(
+        self,
+        client: Optional[anthropic.Anthropic] = None,
+        decoder: Optional[FrameDecoder] = None,
+        frame_layout: Optional[str] = None,
+        image_token_budget: Optional[int] = None,
+    ):
+        self._client = client or get_anthropic_client()
+        self._decoder = decoder or get_decoder()
+        # "frames" or "contact-sheet", and the image-token budget per review call
+        self._frame_layout, self._image_token_budget = resolve_config(frame_layout, image_token_budget)
+        self.last_encoding: Optional[FrameEncoding] = None
 
     def review_video(
         self,
@@ -84,12 +94,22 @@ class SpielbiergAgent:
         concept: Optional[VideoConcept],
         caption: str,
         hashtags: list[str],
+        local_path: Optional[str] = None,
     ) -> SpielbiergReview:
-        """Entry point. Never raises."""
+        """Entry point. Never raises. local_path: video already in the artifact store."""
         try:
-            frames_b64 = self._download_and_extract_frames(video_url)
-            messages = self._build_messages(frames_b64, concept, caption, hashtags)
-            return self._call_claude(messages)
+            scenes = concept.scenes if concept else None
+            with span("spielbierg.frames", decoder=self._decoder.name, local=bool(local_path)) as traced:
+                picks = self._download_and_extract_frames(video_url, local_path, scenes)
+                if traced is not None:
+                    traced.set(frames=len(picks), shot_changes=sum(1 for pick in picks if pick.boundary))
+            with span("spielbierg.encode", layout=self._frame_layout) as traced:
+                encoding = self._encode_frames(picks)
+                if traced is not None:
+                    traced.set(images=len(encoding.images), image_tokens=encoding.estimated_tokens,
+                               bytes=encoding.size_bytes)
+            messages = self._build_messages(encoding, concept, caption, hashtags)
+            return self._call_claude(messages, image_tokens=encoding.estimated_tokens)
         except Exception as exc:
             print(f"  [Spielbierg] Errore: {exc} — approvazione automatica.")
             return SpielbiergReview(
@@ -101,61 +121,65 @@ class SpielbiergAgent:
                 verdict="Auto-approvato per errore tecnico.",
             )
 
-    def _download_and_extract_frames(self, video_url: str) -> list[str]:
-        """Download video, extract 6 equidistant frames, return as base64 JPEG strings."""
-        response = requests.get(video_url, timeout=60, stream=True)
-        response.raise_for_status()
-
-        with tempfile.NamedTemporaryFile(suffix=".mp4", delete=False) as tmp:
-            tmp_path = tmp.name
-            for chunk in response.iter_content(chunk_size=8192):
-                tmp.write(chunk)
+    def _download_and_extract_frames(
+        self,
+        video_url: str,
+        local_path: Optional[str] = None,
+        scenes: Optional[list[VideoScene]] = None,
+    ) -> list[SelectedFrame]:
+        """
+        Pick keyframes at detected shot changes (see keyframes.py), decoded at
+        full resolution.
+        Decodes the local artifact when available; otherwise buffer-capable decoders
+        read the download straight from memory and the others go through the
+        artifact store. No temporary files either way.
+        """
+        start = time.perf_counter()
+        source: VideoSource
+        fetched: Optional[str] = None
+        if local_path:
+            source = local_path
+        elif self._decoder.supports_buffers:
+            response = session_for(video_url).get(video_url, timeout=60)
+            response.raise_for_status()
+            source = response.content
+        else:
+            source = fetched = str(get_artifact_store().fetch(video_url))
 
         try:
-            cap = cv2.VideoCapture(tmp_path)
-            if not cap.isOpened():
-                raise RuntimeError(f"Impossibile aprire il video: {tmp_path}")
-
-            total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-            if total_frames <= 0:
-                raise RuntimeError("Video senza frame.")
-
-            n_frames = 6
-            indices = [int(total_frames * i / n_frames) for i in range(n_frames)]
-
-            frames_b64: list[str] = []
-            for idx in indices:
-                cap.set(cv2.CAP_PROP_POS_FRAMES, idx)
-                ret, frame = cap.read()
-                if not ret:
-                    continue
-
-                # Resize to 720px width maintaining aspect ratio
-                h, w = frame.shape[:2]
-                target_w = 720
-                target_h = int(h * target_w / w)
-                frame = cv2.resize(frame, (target_w, target_h), interpolation=cv2.INTER_AREA)
-
-                # Encode as JPEG quality 85
-                ret, buffer = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, 85])
-                if not ret:
-                    continue
-
-                frames_b64.append(base64.b64encode(buffer.tobytes()).decode("utf-8"))
-
-            cap.release()
-
-            if not frames_b64:
-                raise RuntimeError("Nessun frame estratto dal video.")
+            picks = select_keyframes(
+                self._decoder,
+                source,
+                scenes,
+                max_frames=lambda width, height: frame_capacity(
+                    self._frame_layout, self._image_token_budget, width, height
+                ),
+            )
+        finally:
+            # Pinned only while decoding: the frames are all Spielbierg needs from the file
+            get_artifact_store().release(fetched)
+        if not picks:
+            raise RuntimeError("Nessun frame estratto dal video.")
 
-            return frames_b64
+        shots = sum(1 for pick in picks if pick.boundary)
+        print(
+            f"  [Spielbierg] {len(picks)} frame estratti ({shots} cambi scena) in "
+            f"{time.perf_counter() - start:.2f}s ({self._decoder.name})"
+        )
+        return picks
 
-        finally:
-            os.unlink(tmp_path)
+    def _encode_frames(self, picks: list[SelectedFrame]) -> FrameEncoding:
+        """Encode frames (or contact sheets) within the image-token budget; logs the estimate."""
+        encoding = encode_frames(picks, self._frame_layout, self._image_token_budget)
+        if not encoding.images:
+            raise RuntimeError("Nessun frame codificato.")
+        print(f"  [Spielbierg] {encoding.summary()}")
+        self.last_encoding = encoding
+        return encoding
 
     def _build_messages(
         self,
-        frames_b64: list[str],
+        encoding: FrameEncoding,
         concept: Optional[VideoConcept],
         caption: str,
         hashtags: list[str],
@@ -183,35 +207,46 @@ class SpielbiergAgent:
         context_text = (
             f"## Post Caption\n{caption}\n\n"
             f"## Hashtags\n{hashtags_str}\n"
-            f"{concept_text}\n"
-            f"## Frame del video (estratti uniformemente)\n"
-            f"Analizza i {len(frames_b64)} frame qui sotto e valuta il video."
+            f"{concept_text}"
         )
 
-        content.append({"type": "text", "text": context_text})
+        # Caption and concept are identical across regeneration attempts:
+        # the breakpoint lets retries read system + tools + context from the cache.
+        content.append(cached_text(context_text))
+        content.append({
+            "type": "text",
+            "text": (
+                f"## Frame del video (uno per inquadratura, selezionati ai cambi scena)\n"
+                f"Analizza le {len(encoding.images)} immagini qui sotto e valuta il video. "
+                f"Ogni frame riporta il timestamp e la scena del concept corrispondente."
+            ),
+        })
 
-        for i, frame_b64 in enumerate(frames_b64):
-            content.append({"type": "text", "text": f"Frame {i + 1}:"})
+        for image in encoding.images:
+            content.append({"type": "text", "text": image.label})
             content.append({
                 "type": "image",
                 "source": {
                     "type": "base64",
                     "media_type": "image/jpeg",
-                    "data": frame_b64,
+                    "data": image.data,
                 },
             })
 
         return [{"role": "user", "content": content}]
 
-    def _call_claude(self, messages: list[dict]) -> SpielbiergReview:
+    def _call_claude(self, messages: list[dict], image_tokens: int = 0) -> SpielbiergReview:
         """Call claude-opus-4-6 with tool submit_video_review, tool_choice=any."""
         from .prompts import SPIELBIERG_SYSTEM_PROMPT
 
-        response = self._client.messages.create(
+        response = create_message(
+            self._client,
+            "Spielbierg",
+            image_tokens=image_tokens,
             model="claude-opus-4-6",
             max_tokens=2000,
-            system=SPIELBIERG_SYSTEM_PROMPT,
-            tools=[_TOOL],
+            system=cached_system(SPIELBIERG_SYSTEM_PROMPT),
+            tools=cached_tools([_TOOL]),
             tool_choice={"type": "any"},
             messages=messages,
         )
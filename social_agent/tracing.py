@@ -0,0 +1,304 @@
+"""
+Per-step tracing for the agent pipeline, exported to local files.
+
+Spans nest through a context variable, so they follow the code across
+asyncio tasks, asyncio.to_thread and (via run_in_context) worker threads:
+
+    agent.run
+    └── agent.turn
+        ├── anthropic.messages          model, tokens, stop reason
+        │   └── http POST api.anthropic.com
+        └── tool.generate_video_with_runway
+            ├── http POST api.dev.runwayml.com   status, bytes
+            └── runway.wait                      status changes as events
+                └── http GET …/tasks/{id}
+
+When a root span ends, its whole trace is written to TRACE_DIR as
+- "chrome": Chrome trace-event JSON (open in https://ui.perfetto.dev or
+  chrome://tracing — the file never leaves the machine), or
+- "otlp": OTLP/JSON (resourceSpans), the format of the OpenTelemetry
+  collector's file exporter.
+
+Enabled with SOCIAL_AGENT_TRACE=chrome|otlp; off by default. Spans are
+cheap no-ops while tracing is off, unless an in-process listener (e.g. the
+benchmark's per-stage breakdown) is registered with add_listener.
+"""
+import contextvars
+import json
+import os
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Iterator, Optional, TypeVar
+from urllib.parse import urlsplit
+
+T = TypeVar("T")
+
+TRACE_DIR = Path(__file__).parent.parent / "traces"
+TRACE_FORMATS = ("chrome", "otlp")
+
+_current: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("social_agent_span", default=None)
+# Called with the spans of every finished trace, whether or not it is exported to a file
+_listeners: list[Callable[[list["Span"]], None]] = []
+
+
+@dataclass
+class Span:
+    name: str
+    trace_id: str
+    span_id: str
+    parent: Optional["Span"]
+    start_ns: int
+    attributes: dict[str, Any] = field(default_factory=dict)
+    events: list[tuple[int, str, dict[str, Any]]] = field(default_factory=list)
+    end_ns: Optional[int] = None
+    error: Optional[str] = None
+    lane: int = 0                   # chrome export: spans on one lane never overlap
+    _child_on_lane: bool = False
+    _trace: Optional["_Trace"] = None
+
+    def set(self, **attributes: Any) -> None:
+        self.attributes.update({k: v for k, v in attributes.items() if v is not None})
+
+    def event(self, name: str, **attributes: Any) -> None:
+        self.events.append((time.time_ns(), name, attributes))
+
+
+@dataclass
+class _Trace:
+    spans: list[Span] = field(default_factory=list)
+    lanes: int = 1
+    free_lanes: list[int] = field(default_factory=list)
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+
+def trace_format() -> Optional[str]:
+    """"chrome", "otlp", or None when tracing is off (SOCIAL_AGENT_TRACE)."""
+    value = (os.getenv("SOCIAL_AGENT_TRACE") or "off").lower()
+    return value if value in TRACE_FORMATS else None
+
+
+def add_listener(listener: Callable[[list[Span]], None]) -> None:
+    _listeners.append(listener)
+
+
+def remove_listener(listener: Callable[[list[Span]], None]) -> None:
+    if listener in _listeners:
+        _listeners.remove(listener)
+
+
+def _enabled() -> bool:
+    return bool(_listeners) or trace_format() is not None
+
+
+def current_span() -> Optional[Span]:
+    return _current.get()
+
+
+def set_attributes(**attributes: Any) -> None:
+    """Attach attributes to the innermost open span, if any."""
+    span = _current.get()
+    if span is not None:
+        span.set(**attributes)
+
+
+def add_event(name: str, **attributes: Any) -> None:
+    span = _current.get()
+    if span is not None:
+        span.event(name, **attributes)
+
+
+def _open(name: str, attributes: dict[str, Any]) -> Span:
+    parent = _current.get()
+    if parent is None:
+        trace = _Trace()
+        span = Span(name, secrets.token_hex(16), secrets.token_hex(8), None, time.time_ns(), _trace=trace)
+    else:
+        trace = parent._trace
+        span = Span(name, parent.trace_id, secrets.token_hex(8), parent, time.time_ns(), _trace=trace)
+        with trace.lock:
+            # Concurrent siblings (thread pool, gather) each get a lane of their own
+            if parent._child_on_lane:
+                if trace.free_lanes:
+                    span.lane = trace.free_lanes.pop()
+                else:
+                    span.lane = trace.lanes
+                    trace.lanes += 1
+            else:
+                span.lane = parent.lane
+                parent._child_on_lane = True
+    span.set(**attributes)
+    return span
+
+
+def _close(span: Span) -> None:
+    span.end_ns = time.time_ns()
+    trace = span._trace
+    with trace.lock:
+        trace.spans.append(span)
+        if span.parent is not None:
+            if span.lane == span.parent.lane:
+                span.parent._child_on_lane = False
+            else:
+                trace.free_lanes.append(span.lane)
+    if span.parent is None:
+        for listener in list(_listeners):
+            listener(trace.spans)
+        export(trace.spans)
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Optional[Span]]:
+    """
+    Open a span for the duration of the block (None while tracing is off).
+    Exceptions mark the span as failed and propagate unchanged.
+    """
+    if not _enabled():
+        yield None
+        return
+    opened = _open(name, attributes)
+    token = _current.set(opened)
+    try:
+        yield opened
+    except BaseException as exc:
+        opened.error = f"{type(exc).__name__}: {exc}"
+        raise
+    finally:
+        _current.reset(token)
+        _close(opened)
+
+
+def record_span(name: str, start_ns: int, error: Optional[str] = None, **attributes: Any) -> None:
+    """
+    Record a span that already finished (started at start_ns, ending now)
+    under the current span. Used where the code only sees callbacks, like
+    httpx event hooks. Outside any trace it records nothing.
+    """
+    if not _enabled() or _current.get() is None:
+        return
+    finished = _open(name, attributes)
+    finished.start_ns = start_ns
+    finished.error = error
+    _close(finished)
+
+
+@contextmanager
+def child_span(name: str, **attributes: Any) -> Iterator[Optional[Span]]:
+    """span() that only opens inside an existing trace, so stray calls don't produce one-span files."""
+    if _current.get() is None:
+        yield None
+        return
+    with span(name, **attributes) as opened:
+        yield opened
+
+
+def http_attributes(method: str, url: str) -> tuple[str, dict[str, Any]]:
+    """Span name and attributes for an outgoing request. The query string is dropped: it carries access tokens."""
+    parts = urlsplit(str(url))
+    return f"http {method} {parts.hostname}", {
+        "http.method": method,
+        "http.url": f"{parts.scheme}://{parts.netloc}{parts.path}",
+    }
+
+
+def run_in_context(fn: Callable[..., T]) -> Callable[..., T]:
+    """Wrap `fn` so that, run on another thread, its spans nest under the caller's current span."""
+    context = contextvars.copy_context()
+
+    def wrapper(*args: Any, **kwargs: Any) -> T:
+        return context.copy().run(fn, *args, **kwargs)
+
+    return wrapper
+
+
+# ── Export ─────────────────────────────────────────────────────────────────────
+
+def _chrome_events(spans: list[Span]) -> list[dict]:
+    origin = min(s.start_ns for s in spans)
+    events: list[dict] = []
+    for s in sorted(spans, key=lambda s: s.start_ns):
+        args = dict(s.attributes)
+        if s.error:
+            args["error"] = s.error
+        events.append({
+            "name": s.name,
+            "cat": s.name.split(".")[0].split(" ")[0],
+            "ph": "X",
+            "ts": (s.start_ns - origin) / 1000,
+            "dur": (s.end_ns - s.start_ns) / 1000,
+            "pid": 1,
+            "tid": s.lane,
+            "args": args,
+        })
+        for ts, name, attributes in s.events:
+            events.append({
+                "name": name, "ph": "i", "s": "t", "ts": (ts - origin) / 1000,
+                "pid": 1, "tid": s.lane, "args": attributes,
+            })
+    return events
+
+
+def _otlp_value(value: Any) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    if isinstance(value, (list, tuple)):
+        return {"arrayValue": {"values": [_otlp_value(v) for v in value]}}
+    return {"stringValue": str(value)}
+
+
+def _otlp_attributes(attributes: dict[str, Any]) -> list[dict]:
+    return [{"key": k, "value": _otlp_value(v)} for k, v in attributes.items()]
+
+
+def _otlp_document(spans: list[Span]) -> dict:
+    otlp_spans = []
+    for s in spans:
+        entry = {
+            "traceId": s.trace_id,
+            "spanId": s.span_id,
+            "name": s.name,
+            "kind": 3 if s.name.startswith(("http ", "anthropic.")) else 1,   # CLIENT / INTERNAL
+            "startTimeUnixNano": str(s.start_ns),
+            "endTimeUnixNano": str(s.end_ns),
+            "attributes": _otlp_attributes(s.attributes),
+            "events": [
+                {"timeUnixNano": str(ts), "name": name, "attributes": _otlp_attributes(attributes)}
+                for ts, name, attributes in s.events
+            ],
+            "status": {"code": 2, "message": s.error} if s.error else {"code": 1},
+        }
+        if s.parent is not None:
+            entry["parentSpanId"] = s.parent.span_id
+        otlp_spans.append(entry)
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": _otlp_attributes({"service.name": "social_agent"})},
+            "scopeSpans": [{"scope": {"name": "social_agent.tracing"}, "spans": otlp_spans}],
+        }]
+    }
+
+
+def export(spans: list[Span], fmt: Optional[str] = None, directory: Optional[Path] = None) -> Optional[Path]:
+    """Write one finished trace; returns the file path (None if tracing is off)."""
+    fmt = fmt or trace_format()
+    if fmt is None or not spans:
+        return None
+    directory = Path(directory or os.getenv("SOCIAL_AGENT_TRACE_DIR") or TRACE_DIR)
+    directory.mkdir(parents=True, exist_ok=True)
+    root = min(spans, key=lambda s: s.start_ns)
+    stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(root.start_ns / 1e9))
+    path = directory / f"{stamp}-{root.name}-{root.trace_id[:8]}.{fmt}.json"
+    if fmt == "chrome":
+        document: dict = {"traceEvents": _chrome_events(spans), "displayTimeUnit": "ms"}
+    else:
+        document = _otlp_document(spans)
+    path.write_text(json.dumps(document, ensure_ascii=False, default=str), encoding="utf-8")
+    print(f"  [Trace] {len(spans)} span esportati in {path}")
+    return path
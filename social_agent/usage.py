@@ -0,0 +1,325 @@
+"""
+Token and cost accounting, with per-post budgets.
+
+Every Claude call (llm.create_message) and every Runway task is recorded
+here and aggregated per caller label, model, tool, post and for the whole
+process run. A post is one SocialAgent job (one brief). Costs come from the
+list prices in MODEL_PRICES and RUNWAY_USD_PER_SECOND, so keep them in line
+with the price pages.
+
+The API reports thinking as part of the output tokens. thinking_tokens is an
+estimate made from the thinking blocks that come back. image_tokens is the
+frame_encoding estimate and is already counted in the input tokens.
+
+Budgets make a post degrade instead of overspending (SOCIAL_AGENT_POST_BUDGET_USD,
+SOCIAL_AGENT_POST_RUNWAY_SECONDS; no budget by default):
+- past FALLBACK_AT of the cost budget, Claude calls switch to the cheaper
+  FALLBACK_MODELS with a smaller thinking budget;
+- past the cost or Runway budget, further Runway generations are skipped and
+  the pipeline continues with the current video;
+- past HARD_STOP_FACTOR times the cost budget, the orchestrator loop stops.
+"""
+import contextvars
+import os
+import threading
+import uuid
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, fields
+from typing import Any, Iterator, Optional
+
+# USD per million tokens: input, output, cache write (5 min), cache read
+MODEL_PRICES: dict[str, tuple[float, float, float, float]] = {
+    "claude-opus-4-6": (5.00, 25.00, 6.25, 0.50),
+    "claude-sonnet-4-5": (3.00, 15.00, 3.75, 0.30),
+    "claude-haiku-4-5": (1.00, 5.00, 1.25, 0.10),
+}
+RUNWAY_USD_PER_SECOND = 0.12            # Gen-4.5: 12 credits per second at $0.01 per credit
+
+FALLBACK_MODELS = {"claude-opus-4-6": "claude-sonnet-4-5"}     # SOCIAL_AGENT_FALLBACK_MODEL overrides
+FALLBACK_AT = 0.8                       # share of the cost budget after which calls switch model
+FALLBACK_THINKING_BUDGET = 2000
+HARD_STOP_FACTOR = 1.5
+
+_CHARS_PER_TOKEN = 4                    # same rough ratio as compaction.estimate_tokens
+
+
+@dataclass
+class Usage:
+    calls: int = 0
+    input_tokens: int = 0               # uncached input, images included
+    output_tokens: int = 0              # thinking included
+    thinking_tokens: int = 0            # estimated
+    cache_read_tokens: int = 0
+    cache_write_tokens: int = 0
+    image_tokens: int = 0               # estimated
+    runway_seconds: float = 0.0
+    cost_usd: float = 0.0
+
+    def add(self, other: "Usage") -> None:
+        for f in fields(self):
+            setattr(self, f.name, getattr(self, f.name) + getattr(other, f.name))
+
+    def as_dict(self) -> dict[str, Any]:
+        data = asdict(self)
+        data["cost_usd"] = round(self.cost_usd, 4)
+        return data
+
+    @classmethod
+    def from_dict(cls, data: Optional[dict[str, Any]]) -> "Usage":
+        names = {f.name for f in fields(cls)}
+        return cls(**{k: v for k, v in (data or {}).items() if k in names})
+
+    def summary(self) -> str:
+        text = (
+            f"${self.cost_usd:.2f} — {self.calls} chiamate, {self.input_tokens} token input "
+            f"(+{self.cache_read_tokens} dalla cache, {self.cache_write_tokens} scritti), "
+            f"{self.output_tokens} output (~{self.thinking_tokens} thinking)"
+        )
+        if self.image_tokens:
+            text += f", ~{self.image_tokens} token immagine"
+        if self.runway_seconds:
+            text += f", Runway {self.runway_seconds:.0f}s"
+        return text
+
+
+def message_cost(model: str, usage: Usage) -> float:
+    # Unknown models are priced like the most expensive one, so budgets err on the safe side
+    price_in, price_out, price_write, price_read = MODEL_PRICES.get(model, max(MODEL_PRICES.values()))
+    return (
+        usage.input_tokens * price_in
+        + usage.output_tokens * price_out
+        + usage.cache_write_tokens * price_write
+        + usage.cache_read_tokens * price_read
+    ) / 1_000_000
+
+
+def _thinking_tokens(response: Any) -> int:
+    chars = 0
+    for block in getattr(response, "content", None) or []:
+        if getattr(block, "type", None) == "thinking":
+            chars += len(getattr(block, "thinking", "") or "")
+    return chars // _CHARS_PER_TOKEN
+
+
+# ── Budgets ────────────────────────────────────────────────────────────────────
+
+@dataclass
+class PostBudget:
+    max_cost_usd: Optional[float] = None
+    max_runway_seconds: Optional[float] = None
+
+
+def _env_float(name: str) -> Optional[float]:
+    value = os.getenv(name)
+    return float(value) if value else None
+
+
+def resolve_budget() -> PostBudget:
+    """Per-post budget from SOCIAL_AGENT_POST_BUDGET_USD / SOCIAL_AGENT_POST_RUNWAY_SECONDS."""
+    return PostBudget(
+        max_cost_usd=_env_float("SOCIAL_AGENT_POST_BUDGET_USD"),
+        max_runway_seconds=_env_float("SOCIAL_AGENT_POST_RUNWAY_SECONDS"),
+    )
+
+
+class PostAccount:
+    """Usage of one post, in total and per tool, checked against its budget."""
+
+    def __init__(self, post_id: str, budget: PostBudget, snapshot: Optional[dict[str, Any]] = None):
+        self.post_id = post_id
+        self.budget = budget
+        self._lock = threading.Lock()
+        snapshot = snapshot or {}
+        self.total = Usage.from_dict(snapshot.get("total"))
+        self.by_tool = {tool: Usage.from_dict(u) for tool, u in (snapshot.get("by_tool") or {}).items()}
+        self._fallback_announced = False
+
+    def add(self, usage: Usage, tool: Optional[str]) -> None:
+        with self._lock:
+            self.total.add(usage)
+            self.by_tool.setdefault(tool or "orchestrator", Usage()).add(usage)
+
+    def snapshot(self) -> dict[str, Any]:
+        """JSON form, checkpointed with the job so a resumed post keeps its spend."""
+        with self._lock:
+            return {
+                "total": self.total.as_dict(),
+                "by_tool": {tool: usage.as_dict() for tool, usage in self.by_tool.items()},
+            }
+
+    def _cost_share(self) -> float:
+        if not self.budget.max_cost_usd:
+            return 0.0
+        return self.total.cost_usd / self.budget.max_cost_usd
+
+    def degraded(self) -> bool:
+        """Claude calls should use the fallback model."""
+        return self._cost_share() >= FALLBACK_AT
+
+    def exhausted(self) -> bool:
+        """The orchestrator loop should stop."""
+        return self._cost_share() >= HARD_STOP_FACTOR
+
+    def runway_blocked(self, seconds: float) -> Optional[str]:
+        """Why a new Runway generation of `seconds` would break the budget, or None."""
+        limit = self.budget.max_runway_seconds
+        if limit is not None and self.total.runway_seconds + seconds > limit:
+            return f"limite Runway del post raggiunto ({self.total.runway_seconds:.0f}s su {limit:.0f}s)"
+        if self._cost_share() >= 1.0:
+            return f"budget del post esaurito (${self.total.cost_usd:.2f} su ${self.budget.max_cost_usd:.2f})"
+        return None
+
+    def print_summary(self) -> None:
+        print(f"  [Costi] Post {self.post_id}: {self.total.summary()}")
+        for tool, usage in sorted(self.by_tool.items(), key=lambda item: -item[1].cost_usd):
+            print(f"  [Costi]   {tool}: ${usage.cost_usd:.3f}")
+
+
+# ── Ledger ─────────────────────────────────────────────────────────────────────
+
+_post: contextvars.ContextVar[Optional[PostAccount]] = contextvars.ContextVar("social_agent_post", default=None)
+_tool: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("social_agent_tool", default=None)
+
+
+class UsageLedger:
+    """Process-wide totals per call label, model, tool and post."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.total = Usage()
+        self.by_label: dict[str, Usage] = {}
+        self.by_model: dict[str, Usage] = {}
+        self.by_tool: dict[str, Usage] = {}
+        self.posts: dict[str, PostAccount] = {}
+
+    def open_post(
+        self,
+        post_id: Optional[str],
+        budget: Optional[PostBudget] = None,
+        snapshot: Optional[dict[str, Any]] = None,
+    ) -> PostAccount:
+        account = PostAccount(post_id or uuid.uuid4().hex[:12], budget or resolve_budget(), snapshot)
+        with self._lock:
+            self.posts[account.post_id] = account
+        return account
+
+    def record(self, usage: Usage, label: str, model: Optional[str] = None) -> None:
+        """Add one call (or Runway task) to the run totals and to the current post and tool."""
+        tool = _tool.get()
+        with self._lock:
+            self.total.add(usage)
+            self.by_label.setdefault(label, Usage()).add(usage)
+            if model:
+                self.by_model.setdefault(model, Usage()).add(usage)
+            self.by_tool.setdefault(tool or "orchestrator", Usage()).add(usage)
+        account = _post.get()
+        if account is not None:
+            account.add(usage, tool)
+
+    def report(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "total": self.total.as_dict(),
+                "by_label": {k: v.as_dict() for k, v in self.by_label.items()},
+                "by_model": {k: v.as_dict() for k, v in self.by_model.items()},
+                "by_tool": {k: v.as_dict() for k, v in self.by_tool.items()},
+                "posts": {k: v.total.as_dict() for k, v in self.posts.items()},
+            }
+
+
+_default_ledger: Optional[UsageLedger] = None
+_default_lock = threading.Lock()
+
+
+def get_usage_ledger() -> UsageLedger:
+    """The process-wide ledger (one per run)."""
+    global _default_ledger
+    with _default_lock:
+        if _default_ledger is None:
+            _default_ledger = UsageLedger()
+        return _default_ledger
+
+
+@contextmanager
+def post_scope(account: PostAccount) -> Iterator[PostAccount]:
+    """Attribute the calls made inside the block (worker threads included) to `account`."""
+    token = _post.set(account)
+    try:
+        yield account
+    finally:
+        _post.reset(token)
+
+
+@contextmanager
+def tool_scope(tool_name: str) -> Iterator[None]:
+    token = _tool.set(tool_name)
+    try:
+        yield
+    finally:
+        _tool.reset(token)
+
+
+def current_post() -> Optional[PostAccount]:
+    return _post.get()
+
+
+# ── Recording ──────────────────────────────────────────────────────────────────
+
+def record_message(label: str, model: str, response: Any, image_tokens: int = 0) -> Usage:
+    """Account one messages.create response; returns its usage with the cost filled in."""
+    raw = response.usage
+    usage = Usage(
+        calls=1,
+        input_tokens=getattr(raw, "input_tokens", None) or 0,
+        output_tokens=getattr(raw, "output_tokens", None) or 0,
+        thinking_tokens=_thinking_tokens(response),
+        cache_read_tokens=getattr(raw, "cache_read_input_tokens", None) or 0,
+        cache_write_tokens=getattr(raw, "cache_creation_input_tokens", None) or 0,
+        image_tokens=image_tokens,
+    )
+    usage.cost_usd = message_cost(model, usage)
+    get_usage_ledger().record(usage, label, model)
+    return usage
+
+
+def record_runway_seconds(seconds: float) -> None:
+    """Account a Runway task, billed when it is created."""
+    get_usage_ledger().record(
+        Usage(runway_seconds=seconds, cost_usd=seconds * RUNWAY_USD_PER_SECOND), "Runway"
+    )
+
+
+def budget_request(request: dict[str, Any]) -> dict[str, Any]:
+    """
+    messages.create arguments adjusted to the current post's budget: the fallback
+    model, with thinking rewritten to a fixed smaller budget, once the post is degraded.
+    """
+    account = _post.get()
+    model = request.get("model")
+    if account is None or model not in FALLBACK_MODELS or not account.degraded():
+        return request
+    fallback = os.getenv("SOCIAL_AGENT_FALLBACK_MODEL") or FALLBACK_MODELS[model]
+    if not account._fallback_announced:
+        account._fallback_announced = True
+        print(
+            f"  [Budget] Post {account.post_id}: ${account.total.cost_usd:.2f} spesi — "
+            f"passaggio da {model} a {fallback}"
+        )
+    adjusted = {**request, "model": fallback}
+    thinking = request.get("thinking")
+    if isinstance(thinking, dict) and thinking.get("type") != "disabled":
+        # Adaptive thinking is Opus-only: the fallback gets a fixed, smaller budget
+        budget = min(thinking.get("budget_tokens") or FALLBACK_THINKING_BUDGET, FALLBACK_THINKING_BUDGET)
+        adjusted["thinking"] = {"type": "enabled", "budget_tokens": budget}
+    return adjusted
+
+
+def usage_report() -> dict[str, Any]:
+    return get_usage_ledger().report()
+
+
+def print_usage_report() -> None:
+    ledger = get_usage_ledger()
+    print(f"  [Costi] Totale: {ledger.total.summary()}")
+    for label, usage in sorted(ledger.report()["by_label"].items()):
+        print(f"  [Costi]   {label}: ${usage['cost_usd']:.3f} ({usage['calls']} chiamate)")
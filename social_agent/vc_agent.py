@@ -1,12 +1,12 @@
-import os
+from typing import Optional
 
 import anthropic
-from dotenv import load_dotenv
 
+from .clients import get_anthropic_client
+from .llm import cached_system, cached_tools
 from .models import VideoConcept
 from .prompts import VC_SYSTEM_PROMPT
-
-load_dotenv()
+from .response_cache import ResponseCache, get_response_cache, memoized_tool_call
 
 # ── VC tool definition ─────────────────────────────────────────────────────────
 
@@ -99,14 +99,20 @@ VC_TOOLS: list[dict] = [
 class VCAgent:
     """Video Creator — ex Pixar, crea concept video CGI per contenuti social plant-based."""
 
-    def __init__(self):
-        self.client = anthropic.Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY", ""))
+    def __init__(
+        self,
+        client: Optional[anthropic.Anthropic] = None,
+        cache: Optional[ResponseCache] = None,
+    ):
+        self.client = client or get_anthropic_client()
+        self.cache = cache or get_response_cache()
 
     def create_concept(
         self,
         platform: str,
         caption: str,
         content_theme: str,
+        bypass_cache: bool = False,
     ) -> VideoConcept:
         """
         Genera un concept video CGI per accompagnare il post social.
@@ -115,6 +121,7 @@ class VCAgent:
             platform: "instagram" o "facebook"
             caption: testo del post per cui creare il video
             content_theme: tema principale del contenuto (es. "ricetta bowl", "consigli proteici")
+            bypass_cache: ignora la cache delle risposte e forza una nuova chiamata
 
         Returns:
             VideoConcept con storyboard completo e note di produzione CGI
@@ -141,18 +148,17 @@ Usa il tuo stile CGI tipico: ingredienti che danzano, lighting cinematografico,
 
 Invia il concept usando il tool submit_video_concept."""
 
-        response = self.client.messages.create(
+        return memoized_tool_call(
+            self.client,
+            "VC",
+            lambda data: VideoConcept(**data),
+            cache=self.cache,
+            bypass_cache=bypass_cache,
             model="claude-opus-4-6",
             max_tokens=8000,
             thinking={"type": "adaptive", "budget_tokens": 4000},
-            system=VC_SYSTEM_PROMPT,
-            tools=VC_TOOLS,
+            system=cached_system(VC_SYSTEM_PROMPT),
+            tools=cached_tools(VC_TOOLS),
             tool_choice={"type": "tool", "name": "submit_video_concept"},
             messages=[{"role": "user", "content": user_message}],
         )
-
-        for block in response.content:
-            if hasattr(block, "type") and block.type == "tool_use":
-                return VideoConcept(**block.input)
-
-        raise ValueError("VCAgent: nessun tool_use trovato nella risposta")
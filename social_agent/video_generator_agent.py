@@ -1,59 +1,161 @@
+import asyncio
 import os
-import time
-from datetime import datetime
-from pathlib import Path
-from typing import Optional
+import threading
+from typing import Callable, Optional
+from urllib.parse import urlsplit
 
+import httpx
 import requests
-from dotenv import load_dotenv
 
+from .artifact_store import get_artifact_store
+from .clients import get_async_http_client, get_http_session
 from .models import VideoConcept, VideoGenerationResult
-
-load_dotenv()
+from .resilience import acall_with_retry, call_once, call_with_retry
+from .runway_poller import RunwayTaskPoller
+from .tracing import span
+from .usage import record_runway_seconds
 
 RUNWAY_API_BASE = "https://api.dev.runwayml.com/v1"
 RUNWAY_VERSION = "2024-11-06"
+_RUNWAY_HOST = urlsplit(RUNWAY_API_BASE).hostname
+RUNWAY_CLIP_SECONDS = 10
 
 # Ratio per platform (gen4.5 supporta solo questi due valori)
 _RATIO_9_16 = "720:1280"   # Instagram Reels (portrait)
 _RATIO_16_9 = "1280:720"   # Facebook Video (landscape)
 
+_POLL_TIMEOUT_SECONDS = 420
+# How long a caller waits on the poller: its own deadline fires first unless the poller is stuck
+RUNWAY_RESULT_TIMEOUT_SECONDS = _POLL_TIMEOUT_SECONDS + 30
+
 
 class RunwayAPIError(Exception):
     """Raised when Runway returns a FAILED task status."""
 
 
+def _runway_headers() -> dict:
+    return {
+        "Authorization": f"Bearer {os.getenv('RUNWAYML_API_SECRET', '')}",
+        "X-Runway-Version": RUNWAY_VERSION,
+        "Content-Type": "application/json",
+    }
+
+
+def _ratio_for(platform: str) -> str:
+    return _RATIO_9_16 if platform.lower() == "instagram" else _RATIO_16_9
+
+
+def _task_payload(prompt: str, ratio: str, duration: int) -> dict:
+    return {
+        "promptText": prompt,
+        "model": "gen4.5",
+        "duration": duration,
+        "ratio": ratio,
+    }
+
+
+def _task_output(task_id: str, data: dict) -> Optional[str]:
+    """
+    Interpret a Runway task status payload.
+    Returns the video URL on SUCCEEDED, raises RunwayAPIError on FAILED,
+    None while the task is still PENDING/RUNNING.
+    """
+    status = data.get("status", "")
+
+    if status == "SUCCEEDED":
+        output = data.get("output", [])
+        if not output:
+            raise RunwayAPIError(f"Task {task_id} SUCCEEDED ma output vuoto.")
+        return output[0]
+
+    if status == "FAILED":
+        failure_reason = data.get("failure", "unknown reason")
+        raise RunwayAPIError(
+            f"Task {task_id} fallita: {failure_reason}"
+        )
+
+    # PENDING or RUNNING — continue polling
+    return None
+
+
+def _fetch_task(task_id: str, attempt: int = 1) -> dict:
+    # One attempt per poll: on a transient failure the poller reschedules the task (RetryLater)
+    response = call_once("runway.poll", lambda: get_http_session(_RUNWAY_HOST).get(
+        f"{RUNWAY_API_BASE}/tasks/{task_id}",
+        headers=_runway_headers(),
+        timeout=30,
+    ), attempt)
+    response.raise_for_status()
+    return response.json()
+
+
+def _wait_timeout_message(task_id: str) -> str:
+    return f"Nessun esito dal poller per il task {task_id} entro {RUNWAY_RESULT_TIMEOUT_SECONDS} secondi."
+
+
+_poller: Optional[RunwayTaskPoller] = None
+_poller_lock = threading.Lock()
+
+
+def get_runway_poller() -> RunwayTaskPoller:
+    """The process-wide poller tracking every in-flight Runway task."""
+    global _poller
+    with _poller_lock:
+        if _poller is None:
+            _poller = RunwayTaskPoller(_fetch_task, _task_output, timeout_seconds=_POLL_TIMEOUT_SECONDS)
+        return _poller
+
+
+def print_runway_poller_stats() -> None:
+    """Polls, queue depth and time spent per task status, if any Runway task was tracked."""
+    if _poller is None:
+        return
+    metrics = _poller.metrics()
+    print(f"  [Runway] Poller: {metrics['polls']} poll, {metrics['queue_depth']} task in coda")
+    for status, entry in sorted(metrics["time_in_state"].items()):
+        print(
+            f"  [Runway] {status}: {entry['count']} task, "
+            f"media {entry['avg_seconds']:.1f}s, max {entry['max_seconds']:.1f}s"
+        )
+
+
 class VideoGeneratorAgent:
-    def __init__(self):
-        api_secret = os.getenv("RUNWAYML_API_SECRET", "")
-        self._session = requests.Session()
-        self._session.headers.update({
-            "Authorization": f"Bearer {api_secret}",
-            "X-Runway-Version": RUNWAY_VERSION,
-            "Content-Type": "application/json",
-        })
+    def __init__(self, session: Optional[requests.Session] = None):
+        # The shared session only ever talks to the Runway API host
+        self._session = session or get_http_session(_RUNWAY_HOST)
+        self._session.headers.update(_runway_headers())
 
     def generate(
         self,
         concept: VideoConcept,
         platform: str,
         additional_notes: Optional[str] = None,
+        task_id: Optional[str] = None,
+        on_task_created: Optional[Callable[[str], None]] = None,
     ) -> VideoGenerationResult:
         """
         Entry point. Always returns a VideoGenerationResult — never raises.
         Graceful degradation: any failure → status="failed".
         additional_notes: improvement instructions from Spielbierg for regeneration.
+        task_id: re-attach to a task created by an interrupted run instead of creating one.
+        on_task_created: called with the new task ID as soon as Runway accepts the task.
+        The result's local_path is pinned in the artifact store until the caller releases it.
         """
         try:
-            ratio = _RATIO_9_16 if platform.lower() == "instagram" else _RATIO_16_9
+            ratio = _ratio_for(platform)
             prompt = self._build_runway_prompt(concept, additional_notes)
 
-            print(f"\n  [Runway] Avvio generazione video con Gen-4.5...")
-            task_id = self._create_task(prompt, ratio, duration=10)
+            if task_id:
+                print(f"\n  [Runway] Ripresa del task {task_id[:8]}… di un'esecuzione interrotta")
+            else:
+                print(f"\n  [Runway] Avvio generazione video con Gen-4.5...")
+                task_id = self._create_task(prompt, ratio, duration=RUNWAY_CLIP_SECONDS)
+                if on_task_created:
+                    on_task_created(task_id)
             video_url = self._poll_task(task_id)
 
             print(f"\n  [Runway] Video generato: {video_url}")
-            local_path = self._save_video(video_url, platform)
+            local_path = self._save_video(video_url, platform, task_id)
             return VideoGenerationResult(
                 status="succeeded",
                 video_url=video_url,
@@ -140,75 +242,151 @@ class VideoGeneratorAgent:
         prompt = " | ".join(parts)
         return prompt[:1000]
 
-    def _save_video(self, video_url: str, platform: str) -> Optional[str]:
-        """Download video and save to videos/ directory. Returns local path or None on error."""
+    def _save_video(
+        self,
+        video_url: str,
+        platform: str,
+        task_id: Optional[str] = None,
+    ) -> Optional[str]:
+        """
+        Download video into the shared artifact store. Returns local path or None on error.
+        The path is pinned in the store: the caller releases it once done with the video.
+        """
         try:
-            videos_dir = Path(__file__).parent.parent / "videos"
-            videos_dir.mkdir(exist_ok=True)
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename = f"{timestamp}_{platform}.mp4"
-            local_path = videos_dir / filename
-            response = requests.get(video_url, timeout=120, stream=True)
-            response.raise_for_status()
-            with open(local_path, "wb") as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    f.write(chunk)
+            local_path = get_artifact_store().fetch(video_url, task_id=task_id)
             size_mb = local_path.stat().st_size / (1024 * 1024)
-            print(f"  [Runway] Video salvato: videos/{filename} ({size_mb:.1f} MB)")
+            print(f"  [Runway] Video salvato: videos/{local_path.name} ({platform}, {size_mb:.1f} MB)")
             return str(local_path)
         except Exception as exc:
             print(f"  [Runway] Salvataggio video fallito: {exc}")
             return None
 
     def _create_task(self, prompt: str, ratio: str, duration: int) -> str:
-        """POST to Runway text_to_video endpoint, return task ID."""
-        response = self._session.post(
+        """POST to Runway text_to_video endpoint, return task ID (retried only when safe)."""
+        response = call_with_retry("runway.create", lambda: self._session.post(
             f"{RUNWAY_API_BASE}/text_to_video",
-            json={
-                "promptText": prompt,
-                "model": "gen4.5",
-                "duration": duration,
-                "ratio": ratio,
-            },
-        )
+            json=_task_payload(prompt, ratio, duration),
+        ))
         response.raise_for_status()
         data = response.json()
+        record_runway_seconds(duration)
         return data["id"]
 
+    def _cancel_task(self, task_id: str) -> None:
+        """Cancel (or delete) a Runway task. Best effort: errors are only logged."""
+        try:
+            response = call_with_retry(
+                "runway.cancel",
+                lambda: self._session.delete(f"{RUNWAY_API_BASE}/tasks/{task_id}", timeout=15),
+            )
+            response.raise_for_status()
+        except Exception as exc:
+            print(f"  [Runway] Annullamento task {task_id[:8]}… fallito: {exc}")
+
     def _poll_task(self, task_id: str) -> str:
         """
-        Poll the task until SUCCEEDED, FAILED, or 420s timeout.
+        Wait for the task on the shared poller until SUCCEEDED, FAILED, or timeout.
         Returns the video URL on success.
         """
-        deadline = time.monotonic() + 420
-        poll_interval = 5
+        print(f"  [Runway] Generazione video in corso (task {task_id[:8]}…)")
+        poller = get_runway_poller()
+        with span("runway.wait", task_id=task_id):
+            try:
+                return poller.track(task_id).result(timeout=RUNWAY_RESULT_TIMEOUT_SECONDS)
+            except TimeoutError:
+                poller.untrack(task_id)
+                raise TimeoutError(_wait_timeout_message(task_id)) from None
+
+
+class AsyncVideoGeneratorAgent(VideoGeneratorAgent):
+    """asyncio counterpart of VideoGeneratorAgent: polling yields to the event loop."""
+
+    def __init__(self, client: Optional[httpx.AsyncClient] = None):
+        self._client = client or get_async_http_client(_RUNWAY_HOST)
+        # Sent per request: the pooled client is shared, and output files live
+        # on a CDN host that must never see the Runway secret
+        self._headers = _runway_headers()
+
+    async def generate(
+        self,
+        concept: VideoConcept,
+        platform: str,
+        additional_notes: Optional[str] = None,
+        task_id: Optional[str] = None,
+        on_task_created: Optional[Callable[[str], None]] = None,
+    ) -> VideoGenerationResult:
+        """Same contract as VideoGeneratorAgent.generate — never raises."""
+        try:
+            prompt = self._build_runway_prompt(concept, additional_notes)
 
-        while True:
-            elapsed = int(time.monotonic() - (deadline - 420))
-            print(f"  [Runway] Generazione video in corso... ({elapsed}s)", end="\r")
+            if task_id:
+                print(f"\n  [Runway] Ripresa del task {task_id[:8]}… di un'esecuzione interrotta")
+            else:
+                print(f"\n  [Runway] Avvio generazione video con Gen-4.5...")
+                task_id = await self._create_task(prompt, _ratio_for(platform), duration=RUNWAY_CLIP_SECONDS)
+                if on_task_created:
+                    on_task_created(task_id)
+            video_url = await self._poll_task(task_id)
 
-            if time.monotonic() >= deadline:
-                raise TimeoutError(
-                    f"Runway task {task_id} non completata entro 420 secondi."
-                )
+            print(f"\n  [Runway] Video generato: {video_url}")
+            local_path = await self._save_video(video_url, platform, task_id)
+            return VideoGenerationResult(
+                status="succeeded",
+                video_url=video_url,
+                task_id=task_id,
+                platform_format=concept.platform_format,
+                prompt_used=prompt,
+                local_path=local_path,
+            )
 
-            time.sleep(poll_interval)
+        except httpx.HTTPStatusError as exc:
+            error_msg = f"HTTP {exc.response.status_code}: {exc}"
+            print(f"\n  [Runway] Errore HTTP: {error_msg}")
+            return VideoGenerationResult(status="failed", error=error_msg)
 
-            response = self._session.get(f"{RUNWAY_API_BASE}/tasks/{task_id}")
-            response.raise_for_status()
-            data = response.json()
-            status = data.get("status", "")
-
-            if status == "SUCCEEDED":
-                output = data.get("output", [])
-                if not output:
-                    raise RunwayAPIError(f"Task {task_id} SUCCEEDED ma output vuoto.")
-                return output[0]
-
-            if status == "FAILED":
-                failure_reason = data.get("failure", "unknown reason")
-                raise RunwayAPIError(
-                    f"Task {task_id} fallita: {failure_reason}"
-                )
-
-            # PENDING or RUNNING — continue polling
+        except RunwayAPIError as exc:
+            error_msg = str(exc)
+            print(f"\n  [Runway] Generazione fallita: {error_msg}")
+            return VideoGenerationResult(status="failed", error=error_msg)
+
+        except TimeoutError as exc:
+            error_msg = str(exc)
+            print(f"\n  [Runway] Timeout: {error_msg}")
+            return VideoGenerationResult(status="failed", error=error_msg)
+
+        except Exception as exc:
+            error_msg = f"{type(exc).__name__}: {exc}"
+            print(f"\n  [Runway] Errore inatteso: {error_msg}")
+            return VideoGenerationResult(status="failed", error=error_msg)
+
+    async def _save_video(
+        self,
+        video_url: str,
+        platform: str,
+        task_id: Optional[str] = None,
+    ) -> Optional[str]:
+        """Store the video via the shared artifact store without blocking the loop."""
+        return await asyncio.to_thread(super()._save_video, video_url, platform, task_id)
+
+    async def _create_task(self, prompt: str, ratio: str, duration: int) -> str:
+        """POST to Runway text_to_video endpoint, return task ID (retried only when safe)."""
+        response = await acall_with_retry("runway.create", lambda: self._client.post(
+            f"{RUNWAY_API_BASE}/text_to_video",
+            json=_task_payload(prompt, ratio, duration),
+            headers=self._headers,
+        ))
+        response.raise_for_status()
+        task_id = response.json()["id"]
+        record_runway_seconds(duration)
+        return task_id
+
+    async def _poll_task(self, task_id: str) -> str:
+        """Await the task on the shared poller without blocking the loop."""
+        print(f"  [Runway] Generazione video in corso (task {task_id[:8]}…)")
+        poller = get_runway_poller()
+        with span("runway.wait", task_id=task_id):
+            try:
+                return await asyncio.wait_for(poller.wait(task_id), RUNWAY_RESULT_TIMEOUT_SECONDS)
+            except asyncio.TimeoutError:
+                poller.untrack(task_id)
+                raise TimeoutError(_wait_timeout_message(task_id)) from None